@@ -0,0 +1,9 @@
+"""Job handlers (see api/jobs.py)"""
+from api import jobs
+from .views import analyze_image_data
+
+
+@jobs.handler('ai_image_detection')
+def run_image_job(payload):
+    response = analyze_image_data(payload)
+    return response.data, response.status_code
@@ -1,3 +1,11 @@
 from django.db import models
 
-# Create your models here.
+from api.models import AnalysisResult
+
+
+class ImageAnalysis(AnalysisResult):
+    """An AI-generation analysis of an uploaded image"""
+    DETECTOR = 'ai_image_detection'
+
+    class Meta(AnalysisResult.Meta):
+        verbose_name_plural = 'image analyses'
@@ -0,0 +1,35 @@
+"""
+AI image detection prompt (see api/prompts.py). The instructions are the
+static, cacheable prefix; the image follows in the user message.
+"""
+from api import prompts
+
+IMAGE_AI_DETECTION = prompts.register(
+    'ai_image_detection',
+    prefix="""
+Analyze the provided image for AI generation detection. Look for common AI-generated image artifacts and patterns.
+
+Provide your analysis in this exact JSON format:
+{
+    "ai_likelihood_percentage": <number between 0-100>,
+    "ai_reasoning": "<brief explanation of AI detection analysis>",
+    "ai_confidence": "<high/medium/low>",
+    "detected_artifacts": ["<list of specific AI artifacts found>"],
+    "image_quality_score": <number between 0-100>,
+    "authenticity_score": <number between 0-100>
+}
+
+Focus on detecting:
+- Unnatural textures or smoothing
+- Inconsistent lighting or shadows
+- Anatomical inconsistencies (if humans present)
+- Repetitive patterns or artifacts
+- Digital compression anomalies typical of AI generation
+- Style inconsistencies
+- Watermarks or signatures that might indicate AI generation
+- Pixel-level artifacts common in diffusion models
+""",
+    suffix="""
+Analyze the attached image.
+""",
+)
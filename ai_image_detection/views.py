@@ -1,5 +1,6 @@
 from django.shortcuts import render
 from django.http import JsonResponse
+from django.conf import settings
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
@@ -10,6 +11,13 @@ import base64
 import logging
 import os
 
+from api import llm, results
+from api.bulkhead import bulkhead
+from api.model_json import parse_model_json
+from api.tokens import shorten
+from .models import ImageAnalysis
+from .prompts import IMAGE_AI_DETECTION
+
 logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
@@ -56,12 +64,21 @@ def analyze_image(request):
 
 
 @api_view(['POST'])
+@bulkhead('ai_image_detection')
 def analyze_image_ai(request):
     """
-    Analyze image for AI generation detection using OpenAI GPT-4o
+    Analyze image for AI generation detection with the ai_image_detection LLM route (vision models)
     Accepts base64 encoded images from frontend
     """
-    image_base64 = request.data.get('image_base64', '')
+    return analyze_image_data(request.data, timestamp=request.META.get('HTTP_DATE', ''))
+
+
+def analyze_image_data(data, timestamp=''):
+    """
+    analyze_image_ai for a request body (also run by ai_image_detection jobs);
+    returns the DRF Response
+    """
+    image_base64 = data.get('image_base64', '')
     
     if not image_base64:
         return Response(
@@ -84,101 +101,46 @@ def analyze_image_ai(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Initialize OpenAI client with API key from environment variables
-        try:
-            import os
-            import logging
-            from openai import OpenAI
-            
-            # Get API key from environment variables
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY environment variable is not set")
-            
-            # Log the API key for debugging (first few characters only)
-            logger.info(f"Initializing OpenAI client with API key: {api_key[:8]}...")
-            
-            # Create client configuration without any proxy settings
-            client_config = {
-                'api_key': api_key,
-            }
-            
-            # Initialize the client with explicit configuration
-            client = OpenAI(**client_config)
-        except Exception as init_error:
-            logger.error(f"Failed to initialize OpenAI client: {str(init_error)}")
-            return Response(
-                {
-                    'error': 'Failed to initialize AI service',
-                    'details': str(init_error)
-                },
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
-        
-        # Create comprehensive prompt for AI image detection
-        analysis_prompt = """
-Analyze the provided image for AI generation detection. Look for common AI-generated image artifacts and patterns.
-
-Provide your analysis in this exact JSON format:
-{
-    "ai_likelihood_percentage": <number between 0-100>,
-    "ai_reasoning": "<brief explanation of AI detection analysis>",
-    "ai_confidence": "<high/medium/low>",
-    "detected_artifacts": ["<list of specific AI artifacts found>"],
-    "image_quality_score": <number between 0-100>,
-    "authenticity_score": <number between 0-100>
-}
-
-Focus on detecting:
-- Unnatural textures or smoothing
-- Inconsistent lighting or shadows
-- Anatomical inconsistencies (if humans present)
-- Repetitive patterns or artifacts
-- Digital compression anomalies typical of AI generation
-- Style inconsistencies
-- Watermarks or signatures that might indicate AI generation
-- Pixel-level artifacts common in diffusion models
-"""
+        # The same image analysed recently is answered from the result store
+        key = results.input_hash(image_base64)
+        stored = results.lookup(ImageAnalysis, key)
+        if stored is not None:
+            return Response(results.reused_body(stored))
         
-        # Make request to OpenAI GPT-4o
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": analysis_prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
+        # Static instructions go first as the system prompt (cached by the provider), then the image
+        analysis_prompt = IMAGE_AI_DETECTION.render()
+        with llm.track_usage() as usage:
+            ai_content = llm.chat_routed(
+                'ai_image_detection',
+                [
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": analysis_prompt.user
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/jpeg;base64,{image_base64}"
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000
-        )
-        
-        ai_content = response.choices[0].message.content
+                        ]
+                    }
+                ],
+                system=analysis_prompt.system,
+                cache_system=analysis_prompt.cacheable,
+                max_tokens=1000,
+                # Vision calls take far longer than LLM_TIMEOUT allows
+                timeout=settings.AI_IMAGE_TIMEOUT
+            )
         
         # Try to parse the AI response as JSON
         try:
             # Extract JSON from the response if it's wrapped in markdown or other text
-            json_match = re.search(r'\{[^}]*"ai_likelihood_percentage"[^}]*"authenticity_score"[^}]*\}', ai_content, re.DOTALL)
-            if json_match:
-                analysis_data = json.loads(json_match.group())
-            else:
-                # Try to find JSON block in markdown
-                json_block_match = re.search(r'```json\s*(\{.*?\})\s*```', ai_content, re.DOTALL)
-                if json_block_match:
-                    analysis_data = json.loads(json_block_match.group(1))
-                else:
-                    raise ValueError("No valid JSON found in response")
-        except (json.JSONDecodeError, ValueError):
+            analysis_data = parse_model_json(ai_content, 'ai_image_detection')
+        except ValueError:
             # Fallback: parse manually or provide default analysis
             logger.warning(f"Could not parse AI response as JSON: {ai_content}")
             
@@ -191,7 +153,7 @@ Focus on detecting:
             
             analysis_data = {
                 "ai_likelihood_percentage": ai_percentage,
-                "ai_reasoning": ai_content[:200] + "..." if len(ai_content) > 200 else ai_content,
+                "ai_reasoning": shorten(ai_content, 200),
                 "ai_confidence": "medium",
                 "detected_artifacts": ["Analysis completed"],
                 "image_quality_score": quality_score,
@@ -211,15 +173,36 @@ Focus on detecting:
             'image_quality_score': analysis_data.get('image_quality_score', 70),
             'authenticity_score': analysis_data.get('authenticity_score', 50),
             # Metadata
-            'model_used': 'OpenAI GPT-4o',
+            'model_used': ai_content.model_used,
             'analysis_type': 'image_ai_detection',
-            'timestamp': request.META.get('HTTP_DATE', '')
+            'timestamp': timestamp,
+            'token_usage': usage
         }
+        result['result_id'] = results.save(ImageAnalysis, key, result)
         
         return Response(result)
         
+    except llm.LLMConfigurationError as e:
+        logger.error(f"No usable LLM provider for image analysis: {str(e)}")
+        return Response(
+            {
+                'error': 'Failed to initialize AI service',
+                'details': str(e)
+            },
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    except llm.LLMError as e:
+        logger.error(f"Image analysis LLM call failed: {str(e)}")
+        return Response(
+            {
+                'error': 'Failed to analyze image - AI service unavailable',
+                'details': str(e)
+            },
+            status=e.status_code,
+            headers=llm.error_headers(e)
+        )
     except Exception as e:
-        logger.error(f"Error calling OpenAI API: {str(e)}")
+        logger.error(f"Unexpected error in image analysis: {str(e)}")
         return Response(
             {
                 'error': 'Failed to analyze image - AI service unavailable',
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Register every app's prompt templates and job handlers once per process
+        # (api/prompts.py, api/jobs.py)
+        autodiscover_modules('prompts')
+        autodiscover_modules('jobs')
@@ -0,0 +1,281 @@
+"""
+Bulkheads: adaptive concurrency limits with bounded wait queues.
+
+Each upstream provider (on the runtime loop, see api/llm.py) and each
+detector view gets its own limit on concurrent calls, so one slow provider
+can tie up only its own share of worker threads and connections; the other
+detectors and /api/health/ keep answering. Callers over the limit wait in a
+short queue; when the queue is full, or the wait runs out, the call is shed
+at once with Overloaded, which views turn into 503 + Retry-After.
+
+Limits adapt AIMD-style: every call that finishes in reasonable time adds
+1/limit (about +1 per limit's worth of calls, while the limit is in use),
+and a failure or a call slower than BULKHEAD_LATENCY_TOLERANCE times the
+usual latency cuts the limit by BULKHEAD_DECREASE_FACTOR, at most once per
+usual latency. Limits stay between the configured min and max.
+
+Only calls that did the expensive work should teach a limit its usual
+latency: a detector request answered from the result store, by another
+request's in-flight call, or with a 4xx takes milliseconds, and counting it
+would make the next real 10-30s model call look slow. The provider gateway
+marks each request that got a provider slot (mark_upstream_call), and the
+bulkhead() decorator records only those. Async views that hold a permit
+themselves (the SSE stream) run their work in upstream_calls_context() to
+find out the same.
+
+State is per worker process and shared by threads and the runtime loop.
+"""
+import asyncio
+import contextvars
+import functools
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+
+# Weight of each new latency sample in the running "usual latency" average
+LATENCY_SMOOTHING = 0.1
+
+# Set by bulkhead() around its view: the upstream calls that request made
+_upstream_calls = contextvars.ContextVar('bulkhead_upstream_calls', default=None)
+
+
+class Overloaded(Exception):
+    """The bulkhead's limit and wait queue are full; try again after retry_after seconds"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is at capacity, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """A queued caller; grant() hands it a slot, from whichever thread releases one"""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(True))
+
+
+class Permit:
+    """
+    A slot held in a bulkhead; release it exactly once, saying whether the
+    call failed. Calls cut short by the caller (cancelled) pass record=False
+    so they don't count towards the limit either way.
+    """
+
+    def __init__(self, bulkhead):
+        self.bulkhead = bulkhead
+        self.started = time.monotonic()
+        self.released = False
+
+    def release(self, failed=False, record=True):
+        if not self.released:
+            self.released = True
+            self.bulkhead._release(time.monotonic() - self.started, failed, record)
+
+
+class Bulkhead:
+    def __init__(self, name, initial_limit, min_limit, max_limit, max_queue, max_wait):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._limit = float(min(max_limit, max(min_limit, initial_limit)))
+        self._in_flight = 0
+        self._waiters = deque()
+        self._latency = None
+        self._last_decrease = 0.0
+
+        metrics.register_gauge(f'bulkhead.{name}.in_flight', lambda: self._in_flight)
+        metrics.register_gauge(f'bulkhead.{name}.queued', lambda: len(self._waiters))
+        metrics.register_gauge(f'bulkhead.{name}.limit', lambda: round(self._limit, 2))
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def retry_after(self):
+        """Seconds a shed caller should wait: about one usual call"""
+        return max(1, math.ceil(self._latency or 1))
+
+    def _admit_or_enqueue(self, waiter):
+        """Under the lock: True if admitted now; queues waiter otherwise, or raises Overloaded"""
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            metrics.incr(f'bulkhead.{self.name}.shed')
+            raise Overloaded(self.name, self.retry_after())
+        self._waiters.append(waiter)
+        return False
+
+    def _abandon(self, waiter):
+        """Under the lock: drop a waiter that gave up; False if it was granted a slot meanwhile"""
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            return False
+        return True
+
+    def acquire(self, timeout=None):
+        """Wait (blocking this thread) for a slot; raises Overloaded"""
+        timeout = self.max_wait if timeout is None else timeout
+        waiter = _Waiter()
+        with self._lock:
+            admitted = self._admit_or_enqueue(waiter)
+        if not admitted and not waiter.event.wait(timeout):
+            with self._lock:
+                if self._abandon(waiter):
+                    metrics.incr(f'bulkhead.{self.name}.shed')
+                    raise Overloaded(self.name, self.retry_after())
+        metrics.incr(f'bulkhead.{self.name}.admitted')
+        return Permit(self)
+
+    async def acquire_async(self, timeout=None):
+        """Wait (without blocking the loop) for a slot; raises Overloaded"""
+        timeout = self.max_wait if timeout is None else timeout
+        waiter = _Waiter(asyncio.get_running_loop())
+        with self._lock:
+            admitted = self._admit_or_enqueue(waiter)
+        if not admitted:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except BaseException as e:
+                with self._lock:
+                    abandoned = self._abandon(waiter)
+                if not abandoned:
+                    # The slot was handed over just as we gave up
+                    if isinstance(e, asyncio.CancelledError):
+                        Permit(self).release(record=False)
+                        raise
+                elif isinstance(e, TimeoutError):
+                    metrics.incr(f'bulkhead.{self.name}.shed')
+                    raise Overloaded(self.name, self.retry_after()) from None
+                else:
+                    raise
+        metrics.incr(f'bulkhead.{self.name}.admitted')
+        return Permit(self)
+
+    def _release(self, latency, failed, record):
+        now = time.monotonic()
+        with self._lock:
+            usual = self._latency
+            slow = usual is not None and latency > usual * settings.BULKHEAD_LATENCY_TOLERANCE
+            if record and (failed or slow):
+                # Back off at most once per usual call, so one burst of failures counts once
+                if now - self._last_decrease >= (usual or 0):
+                    self._limit = max(self.min_limit, self._limit * settings.BULKHEAD_DECREASE_FACTOR)
+                    self._last_decrease = now
+                    metrics.incr(f'bulkhead.{self.name}.decreased')
+            elif record and self._in_flight >= self.limit:
+                # Only grow a limit that is actually being used
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            if record and not failed:
+                self._latency = latency if usual is None else usual + LATENCY_SMOOTHING * (latency - usual)
+
+            self._in_flight -= 1
+            while self._waiters and self._in_flight < self.limit:
+                self._in_flight += 1
+                self._waiters.popleft().grant()
+
+
+_bulkheads = {}
+_bulkheads_lock = threading.Lock()
+
+
+def get_bulkhead(kind, name):
+    """
+    The process-wide bulkhead for a 'provider' (LLM provider) or a
+    'detector' (view), configured from BULKHEAD_<KIND>_* settings
+    """
+    key = f'{kind}.{name}'
+    with _bulkheads_lock:
+        bulkhead = _bulkheads.get(key)
+        if bulkhead is None:
+            prefix = f'BULKHEAD_{kind.upper()}'
+            bulkhead = _bulkheads[key] = Bulkhead(
+                key,
+                initial_limit=getattr(settings, f'{prefix}_LIMIT'),
+                min_limit=getattr(settings, f'{prefix}_MIN_LIMIT'),
+                max_limit=getattr(settings, f'{prefix}_MAX_LIMIT'),
+                max_queue=getattr(settings, f'{prefix}_QUEUE'),
+                max_wait=getattr(settings, f'{prefix}_MAX_WAIT'),
+            )
+        return bulkhead
+
+
+def overloaded_response(e):
+    """503 with Retry-After for a shed request"""
+    return Response(
+        {'error': 'The service is busy, please try again shortly', 'retry_after': e.retry_after},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': str(e.retry_after)},
+    )
+
+
+def mark_upstream_call():
+    """Note that the current request got a provider slot (no-op outside a bulkhead() view)"""
+    calls = _upstream_calls.get()
+    if calls is not None:
+        calls.append(time.monotonic())
+
+
+def upstream_calls_context():
+    """
+    (context, calls): a copy of the current context in which provider slots
+    are noted in calls, for work run with context.run() (a coroutine
+    submitted to the runtime loop from there keeps the context)
+    """
+    calls = []
+    context = contextvars.copy_context()
+    context.run(_upstream_calls.set, calls)
+    return context, calls
+
+
+def bulkhead(name):
+    """
+    Limit concurrent requests to a (sync) DRF function view; goes under
+    @api_view. Responses of 500 and up count as failures for the limit;
+    requests that never reached a provider, and 4xx responses, aren't
+    recorded at all.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not settings.BULKHEAD_ENABLED:
+                return view(request, *args, **kwargs)
+            try:
+                permit = get_bulkhead('detector', name).acquire()
+            except Overloaded as e:
+                return overloaded_response(e)
+            calls = []
+            token = _upstream_calls.set(calls)
+            failed, client_error = True, False
+            try:
+                response = view(request, *args, **kwargs)
+                failed = response.status_code >= 500
+                client_error = 400 <= response.status_code < 500
+                return response
+            finally:
+                _upstream_calls.reset(token)
+                permit.release(failed, record=bool(calls) and not client_error)
+        return wrapped
+    return decorator
@@ -1,25 +1,62 @@
+import asyncio
+import json
+import logging
 import os
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import renderers, status
+from rest_framework.settings import api_settings
 from django.conf import settings
-import anthropic
+from django.http import StreamingHttpResponse
 from dotenv import load_dotenv
 
+from . import llm, metrics
+from .runtime import submit
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson',
+}
+
 # Load environment variables
 load_dotenv()
 
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """Lets DRF accept 'Accept: text/event-stream'; non-streamed bodies go out as one event"""
+    media_type = STREAM_FORMATS['sse']
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        event = 'error' if response is not None and response.status_code >= 400 else 'done'
+        return stream_frame('sse', event, data).encode()
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """Lets DRF accept 'Accept: application/x-ndjson'; non-streamed bodies go out as one line"""
+    media_type = STREAM_FORMATS['ndjson']
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data) + '\n').encode()
+
+
 class ClaudeAPIView(APIView):
     """
     API View to handle requests to Claude 3.5
+
+    DRF builds a new view instance per request, so the Anthropic client is
+    not kept here; the per-process client lives in the LLM gateway.
+
+    By default the whole reply comes back as one JSON body. With "stream":
+    "sse" (or true) or "ndjson" in the body, or an Accept header asking for
+    text/event-stream or application/x-ndjson, text deltas are forwarded as
+    they arrive, followed by a 'done' event with token usage (or 'error').
     """
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Initialize the Anthropic client with API key from environment variables
-        self.client = anthropic.Anthropic(
-            api_key=os.getenv("ANTHROPIC_API_KEY")
-        )
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [EventStreamRenderer, NDJSONRenderer]
     
     def post(self, request, *args, **kwargs):
         """
@@ -33,13 +70,14 @@ class ClaudeAPIView(APIView):
             "model": "claude-3-5-sonnet-20240620",
             "max_tokens": 1000,
             "temperature": 0.7,
-            "system": "You are a helpful AI assistant."
+            "system": "You are a helpful AI assistant.",
+            "stream": "sse"  // optional: "sse", "ndjson", true or false
         }
         """
         try:
             # Get the request data
             messages = request.data.get('messages', [])
-            model = request.data.get('model', 'claude-3-5-sonnet-20240620')
+            model = request.data.get('model', settings.ANTHROPIC_MODEL)
             max_tokens = request.data.get('max_tokens', 1000)
             temperature = request.data.get('temperature', 0.7)
             system = request.data.get('system', 'You are a helpful AI assistant.')
@@ -51,41 +89,121 @@ class ClaudeAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Make the API call to Claude
-            with self.client.messages.stream(
+            stream_format = self.stream_format(request)
+            if stream_format:
+                # Fail before the 200 and the stream's headers go out
+                if not llm.is_configured(llm.ANTHROPIC):
+                    raise llm.LLMConfigurationError(
+                        "The anthropic package or ANTHROPIC_API_KEY is missing", llm.ANTHROPIC
+                    )
+                options = dict(model=model, max_tokens=max_tokens, temperature=temperature, system=system)
+                response = StreamingHttpResponse(
+                    claude_events(messages, options, stream_format), content_type=STREAM_FORMATS[stream_format]
+                )
+                response['Cache-Control'] = 'no-cache'
+                # Stop nginx-style proxies from buffering the stream
+                response['X-Accel-Buffering'] = 'no'
+                return response
+            
+            # Make the API call to Claude through the shared gateway
+            full_response = llm.chat(
+                messages,
+                provider=llm.ANTHROPIC,
                 model=model,
                 max_tokens=max_tokens,
                 temperature=temperature,
-                system=system,
-                messages=messages
-            ) as stream:
-                full_response = ""
-                for text in stream.text_stream:
-                    full_response += text
-                
-                # Return the full response
-                return Response({
-                    "response": full_response,
-                    "model": model
-                }, status=status.HTTP_200_OK)
-                
-        except anthropic.APIConnectionError as e:
-            return Response(
-                {"error": f"Connection error: {str(e)}"},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
+                system=system
             )
-        except anthropic.RateLimitError as e:
+            
+            # Return the full response
+            return Response({
+                "response": full_response,
+                "model": model
+            }, status=status.HTTP_200_OK)
+                
+        except llm.LLMRateLimitError as e:
             return Response(
                 {"error": "Rate limit exceeded. Please try again later."},
                 status=status.HTTP_429_TOO_MANY_REQUESTS
             )
-        except anthropic.APIStatusError as e:
+        except llm.LLMTimeoutError as e:
+            return Response(
+                {"error": f"Connection error: {str(e)}"},
+                status=status.HTTP_504_GATEWAY_TIMEOUT
+            )
+        except llm.LLMError as e:
             return Response(
                 {"error": f"API error: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status=e.status_code,
+                headers=llm.error_headers(e)
             )
         except Exception as e:
             return Response(
                 {"error": f"An unexpected error occurred: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    @staticmethod
+    def stream_format(request):
+        """'sse', 'ndjson' or None (buffered JSON), from the body's "stream" or the Accept header"""
+        stream = request.data.get('stream')
+        if stream is True or stream == 'sse':
+            return 'sse'
+        if stream == 'ndjson':
+            return 'ndjson'
+        if stream is None:
+            accept = request.headers.get('Accept', '')
+            for stream_format, content_type in STREAM_FORMATS.items():
+                if content_type in accept:
+                    return stream_format
+        return None
+
+
+def stream_frame(stream_format, event, data):
+    if stream_format == 'ndjson':
+        return json.dumps({'type': event, **data}) + '\n'
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def claude_events(messages, options, stream_format):
+    """
+    Run the stream on the shared runtime loop (where the Anthropic client
+    lives) and relay its deltas to this (server) loop as frames
+    """
+    loop = asyncio.get_running_loop()
+    deltas = asyncio.Queue()
+    
+    def on_text(text):
+        # Called on the runtime loop's thread
+        loop.call_soon_threadsafe(deltas.put_nowait, text)
+    
+    stream = asyncio.wrap_future(submit(llm.stream_async(messages, on_text, provider=llm.ANTHROPIC, **options)))
+    # Deltas are queued before the future resolves, so this marker comes last
+    stream.add_done_callback(lambda _: deltas.put_nowait(None))
+    metrics.incr('claude.stream.opened')
+    
+    try:
+        while True:
+            text = await deltas.get()
+            if text is None:
+                break
+            yield stream_frame(stream_format, 'delta', {'text': text})
+        
+        try:
+            result = stream.result()
+        except llm.LLMError as e:
+            logger.warning(f"Claude stream failed: {str(e)}")
+            yield stream_frame(stream_format, 'error', {'error': f"API error: {str(e)}", 'http_status': e.status_code})
+        except Exception as e:
+            logger.exception(f"Claude stream failed: {str(e)}")
+            yield stream_frame(stream_format, 'error', {
+                'error': f"An unexpected error occurred: {str(e)}",
+                'http_status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+            })
+        else:
+            yield stream_frame(stream_format, 'done', result)
+    finally:
+        # Client went away: stop generating tokens for it
+        if not stream.done():
+            stream.cancel()
+            metrics.incr('claude.stream.cancelled')
@@ -0,0 +1,331 @@
+"""
+Asynchronous jobs for long analyses.
+
+POST /api/jobs/ stores a Job row and answers 202 with its id straight away;
+a job worker runs the detector and the client polls /api/jobs/<id>/ or gets
+the result POSTed to its webhook_url. Handlers are the detectors' own
+functions, registered per app in a jobs.py module:
+
+    @jobs.handler('text_ai_detection')
+    def run_text_job(payload):
+        return body, http_status
+
+Workers are threads that claim jobs from the database, highest priority
+first, so any number of processes can work the same queue: each web process
+runs JOBS_IN_PROCESS_WORKERS of them (started on first use), and
+`manage.py run_jobs` runs a dedicated worker process. A claim is a
+conditional UPDATE, so only one worker gets each job.
+
+Jobs whose detector fails with a retryable status (429, 5xx) or raises are
+retried with backoff up to max_attempts; jobs still queued at expires_at
+expire instead of running; running jobs whose lease ran out (their worker
+died) are queued again. Finished jobs are deleted after JOBS_RESULT_TTL.
+
+Webhook URLs come from anonymous clients, so the server must not be usable
+to reach its own network: a webhook host has to resolve to public addresses
+only (unless it is listed in JOBS_WEBHOOK_ALLOWED_HOSTS). This is checked
+when the job is submitted and again before each delivery, since DNS answers
+can change in between, and redirects are not followed.
+"""
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .models import Job
+from .resilience import RETRYABLE_STATUS_CODES, backoff_delay
+from .runtime import get_http_client, run_sync
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def handler(kind):
+    """Register fn(payload) -> (response_data, http_status) as the runner of jobs of this kind"""
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def kinds():
+    return sorted(_handlers)
+
+
+def submit(kind, payload, priority=0, webhook_url='', max_attempts=None, ttl=None):
+    """Queue a job and wake this process's workers; returns the Job"""
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job type: {kind}")
+    now = timezone.now()
+    job = Job.objects.create(
+        kind=kind,
+        payload=payload,
+        priority=priority,
+        webhook_url=webhook_url,
+        max_attempts=settings.JOBS_MAX_ATTEMPTS if max_attempts is None else max_attempts,
+        run_after=now,
+        expires_at=now + timedelta(seconds=settings.JOBS_TTL if ttl is None else ttl),
+    )
+    metrics.incr(f'jobs.{kind}.submitted')
+    ensure_workers()
+    _wakeup.set()
+    return job
+
+
+def cancel(job_id):
+    """Cancel a job that hasn't started; True if it was cancelled"""
+    return Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+        status=Job.CANCELLED, finished_at=timezone.now()
+    ) == 1
+
+
+def queued_count():
+    return Job.objects.filter(status=Job.QUEUED).count()
+
+
+def as_dict(job):
+    """Public representation of a job (status endpoint and webhook body)"""
+    return {
+        'job_id': str(job.id),
+        'type': job.kind,
+        'status': job.status,
+        'priority': job.priority,
+        'attempts': job.attempts,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'expires_at': job.expires_at,
+        'http_status': job.http_status,
+        'result': job.result,
+        'error': job.error,
+        'webhook_status': job.webhook_status,
+    }
+
+
+def _recover_lost_jobs(now):
+    """Queue again (or fail, out of attempts) running jobs whose worker died"""
+    lost = Job.objects.filter(status=Job.RUNNING, lease_until__lt=now)
+    failed = lost.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=now, error='The worker running this job stopped'
+    )
+    requeued = lost.update(status=Job.QUEUED, lease_until=None)
+    if failed or requeued:
+        logger.warning(f"Recovered {requeued} lost jobs, failed {failed} out of attempts")
+
+
+def claim_next():
+    """Take the next runnable job for this worker, or None"""
+    now = timezone.now()
+    _recover_lost_jobs(now)
+    while True:
+        job_id = (
+            Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+            .order_by('-priority', 'created_at')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        claimed = Job.objects.filter(id=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            started_at=now,
+            lease_until=now + timedelta(seconds=settings.JOBS_LEASE_SECONDS),
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+        # Another worker got it first
+
+
+def execute(job):
+    """Run a claimed job and record the outcome (queued again for a retry, or finished)"""
+    now = timezone.now()
+    if job.expires_at <= now:
+        _finish(job, Job.EXPIRED, error='The job expired before a worker could run it')
+        return
+
+    started = time.monotonic()
+    try:
+        result, http_status = _handlers[job.kind](job.payload)
+        error = result.get('error', '') if http_status >= 400 and isinstance(result, dict) else ''
+    except Exception as e:
+        logger.exception(f"Job {job.id} ({job.kind}) raised: {str(e)}")
+        result, http_status, error = None, 500, str(e)
+    metrics.observe(f'jobs.{job.kind}.seconds', time.monotonic() - started)
+
+    retryable = http_status >= 500 or http_status in RETRYABLE_STATUS_CODES
+    if retryable and job.attempts < job.max_attempts:
+        delay = max(1.0, backoff_delay(job.attempts - 1, settings.JOBS_RETRY_BASE_DELAY, settings.JOBS_RETRY_MAX_DELAY))
+        Job.objects.filter(id=job.id, status=Job.RUNNING).update(
+            status=Job.QUEUED, run_after=timezone.now() + timedelta(seconds=delay), lease_until=None,
+            result=result, http_status=http_status, error=str(error)
+        )
+        metrics.incr(f'jobs.{job.kind}.retried')
+        logger.info(f"Job {job.id} ({job.kind}) got HTTP {http_status}, retry {job.attempts}/{job.max_attempts - 1} in {delay:.0f}s")
+        return
+
+    job.result, job.http_status = result, http_status
+    _finish(job, Job.SUCCEEDED if http_status < 400 else Job.FAILED, error=str(error))
+
+
+def _finish(job, status, error=''):
+    job.status, job.error, job.finished_at, job.lease_until = status, error, timezone.now(), None
+    # A cancelled (or lost and re-run) job keeps the status it already has
+    updated = Job.objects.filter(id=job.id, status__in=(Job.RUNNING, Job.QUEUED)).update(
+        status=job.status, error=job.error, finished_at=job.finished_at, lease_until=None,
+        result=job.result, http_status=job.http_status,
+    )
+    if not updated:
+        return
+    metrics.incr(f'jobs.{job.kind}.{status}')
+    if job.webhook_url:
+        job.webhook_status = deliver_webhook(job)
+        Job.objects.filter(id=job.id).update(webhook_status=job.webhook_status)
+
+
+def check_webhook_url(url):
+    """
+    Raise ValueError unless url is http(s) and its host resolves only to
+    public addresses, or is one of JOBS_WEBHOOK_ALLOWED_HOSTS
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('webhook_url must be an http(s) URL')
+    host = parts.hostname.lower()
+    if host in settings.JOBS_WEBHOOK_ALLOWED_HOSTS:
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f'webhook_url host {host} could not be resolved') from e
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+        ip = getattr(ip, 'ipv4_mapped', None) or ip
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f'webhook_url host {host} is not a public address')
+
+
+def webhook_signature(body):
+    """X-NoCap-Signature value for a webhook body, when JOBS_WEBHOOK_SECRET is set"""
+    digest = hmac.new(settings.JOBS_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return f'sha256={digest}'
+
+
+def deliver_webhook(job):
+    """POST the finished job to its webhook_url, with retries; returns a status note"""
+    body = json.dumps(as_dict(job), default=str).encode()
+    headers = {'Content-Type': 'application/json'}
+    if settings.JOBS_WEBHOOK_SECRET:
+        headers['X-NoCap-Signature'] = webhook_signature(body)
+
+    async def post():
+        response = await get_http_client().post(
+            job.webhook_url, content=body, headers=headers, timeout=settings.JOBS_WEBHOOK_TIMEOUT,
+            follow_redirects=False,
+        )
+        return response.status_code
+
+    outcome = ''
+    for attempt in range(settings.JOBS_WEBHOOK_ATTEMPTS):
+        try:
+            check_webhook_url(job.webhook_url)
+        except ValueError as e:
+            metrics.incr('jobs.webhook.refused')
+            logger.warning(f"Not delivering webhook for job {job.id}: {str(e)}")
+            return f'refused: {str(e)}'[:200]
+        try:
+            status_code = run_sync(post(), timeout=settings.JOBS_WEBHOOK_TIMEOUT + 5)
+            if status_code < 400:
+                metrics.incr('jobs.webhook.delivered')
+                return f'delivered ({status_code})'
+            outcome = f'HTTP {status_code}'
+            if status_code < 500 and status_code != 429:
+                break
+        except Exception as e:
+            outcome = str(e) or type(e).__name__
+        if attempt + 1 < settings.JOBS_WEBHOOK_ATTEMPTS:
+            time.sleep(backoff_delay(attempt, 1, 10))
+    metrics.incr('jobs.webhook.failed')
+    logger.warning(f"Webhook for job {job.id} failed: {outcome}")
+    return f'failed: {outcome}'[:200]
+
+
+def prune():
+    """Delete finished jobs older than JOBS_RESULT_TTL; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_RESULT_TTL)
+    deleted, _ = Job.objects.filter(status__in=Job.FINISHED, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+_wakeup = threading.Event()
+_workers_lock = threading.Lock()
+_workers_pid = None
+
+
+def work(stop, name):
+    """Worker loop: claim and run jobs until stop is set"""
+    next_prune = 0
+    while not stop.is_set():
+        try:
+            close_old_connections()
+            if time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + settings.JOBS_PRUNE_INTERVAL
+                pruned = prune()
+                if pruned:
+                    logger.info(f"{name}: pruned {pruned} finished jobs")
+            job = claim_next()
+        except Exception as e:
+            logger.exception(f"{name}: could not claim a job: {str(e)}")
+            job = None
+        if job is None:
+            _wakeup.wait(settings.JOBS_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+        logger.info(f"{name}: running job {job.id} ({job.kind}, attempt {job.attempts})")
+        try:
+            execute(job)
+        except Exception as e:
+            logger.exception(f"{name}: job {job.id} could not be recorded: {str(e)}")
+        finally:
+            close_old_connections()
+
+
+def start_workers(count, stop=None, daemon=True):
+    """Start count worker threads; returns (stop event, threads)"""
+    stop = stop or threading.Event()
+    threads = []
+    for index in range(count):
+        name = f'nocap-job-worker-{os.getpid()}-{index}'
+        thread = threading.Thread(target=work, args=(stop, name), name=name, daemon=daemon)
+        thread.start()
+        threads.append(thread)
+    metrics.register_gauge('jobs.workers', lambda: sum(thread.is_alive() for thread in threads))
+    return stop, threads
+
+
+def ensure_workers():
+    """Start this web process's JOBS_IN_PROCESS_WORKERS worker threads, once per process"""
+    global _workers_pid
+    if settings.JOBS_IN_PROCESS_WORKERS <= 0:
+        return
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+    start_workers(settings.JOBS_IN_PROCESS_WORKERS)
+    metrics.register_gauge('jobs.queued', queued_count)
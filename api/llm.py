@@ -0,0 +1,739 @@
+"""
+Gateway for calls to language model providers.
+
+Every detector goes through chat_async (or chat from sync code) instead of
+building its own client. Each worker process keeps one pooled httpx client
+on the runtime loop (HTTP/2 when the h2 package is installed) and one SDK
+client per provider on top of it, so connections are reused across requests
+and API keys are read once.
+
+Calls get the same treatment whichever provider they go to: one timeout that
+bounds the whole call including retries, retries with jittered backoff for
+timeouts, dropped connections, 429 and 5xx (honouring Retry-After), and
+provider errors mapped onto the LLMError hierarchy below.
+
+Token usage, including prompt tokens served from the provider's prefix cache,
+is counted per provider in metrics and, inside track_usage(), per request.
+
+Detectors call chat_routed_async with a route: an ordered list of providers
+(LLM_ROUTES). The first provider gets the request; if it is still running
+after its rolling p95 latency on that route a hedged request goes to the
+next one, and on connection errors or 5xx the next one takes over. The
+first good reply wins and the other request is cancelled. A route of one
+provider never hedges: a second identical request to the same provider
+only doubles the cost of a call that is slow by nature (vision calls).
+Latency is kept per route and provider, since one provider serves both
+quick text checks and 20-60s vision calls, and only from good replies: a
+call that failed, timed out or lost a hedge race has no latency to record.
+Providers whose circuit is open after repeated failures are skipped until
+it closes.
+
+Each attempt holds a slot in its provider's bulkhead (api/bulkhead.py), so a
+slow provider gets a bounded number of calls in flight; when its queue is
+full the call fails fast with LLMOverloadedError, and routed calls move on
+to the next provider.
+
+Providers:
+- 'hackclub': Hack Club AI, OpenAI-style chat completions without a key
+- 'openai': OpenAI SDK (OPENAI_API_KEY)
+- 'anthropic': Anthropic SDK (ANTHROPIC_API_KEY), optional dependency
+"""
+import asyncio
+import contextlib
+import contextvars
+import importlib.util
+import logging
+import math
+import os
+import threading
+import time
+
+import httpx
+from django.conf import settings
+
+from . import metrics
+from .bulkhead import Overloaded, get_bulkhead, mark_upstream_call
+from .prompts import Prompt
+from .resilience import (
+    RETRYABLE_STATUS_CODES, CircuitBreaker, Deadline, backoff_delay, retry_after_seconds, status_code_of,
+)
+from .runtime import in_runtime_thread, on_shutdown, run_sync
+
+try:
+    import openai
+except ImportError:  # pragma: no cover - openai is in requirements.txt
+    openai = None
+
+try:
+    import anthropic
+except ImportError:
+    anthropic = None
+
+logger = logging.getLogger(__name__)
+
+HACKCLUB = 'hackclub'
+OPENAI = 'openai'
+ANTHROPIC = 'anthropic'
+PROVIDERS = (HACKCLUB, OPENAI, ANTHROPIC)
+# How responses name each provider in their model_used field
+PROVIDER_NAMES = {HACKCLUB: 'Hack Club AI Service', OPENAI: 'OpenAI', ANTHROPIC: 'Anthropic'}
+
+# Extra time run_sync waits beyond the call's own timeout before giving up on the loop
+SYNC_GRACE_SECONDS = 5
+
+
+class Reply(str):
+    """A model's reply text; also says which provider and model wrote it (model None: the provider's default)"""
+
+    def __new__(cls, text, provider, model=None):
+        reply = super().__new__(cls, text)
+        reply.provider = provider
+        reply.model = model
+        return reply
+
+    def __getnewargs__(self):
+        return str(self), self.provider, self.model
+
+    @property
+    def model_used(self):
+        """'<provider name> <model>', as detector responses report it"""
+        name = PROVIDER_NAMES[self.provider]
+        return f'{name} {self.model}' if self.model else name
+
+
+class LLMError(Exception):
+    """A provider call failed; status_code is the HTTP status a view should answer with"""
+    status_code = 503
+
+    def __init__(self, message, provider=None, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.provider = provider
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(LLMError, TimeoutError):
+    """The call did not finish within its timeout"""
+    status_code = 504
+
+
+class LLMRateLimitError(LLMError):
+    """The provider is throttling us"""
+    status_code = 429
+
+
+class LLMOverloadedError(LLMError):
+    """Too many calls to this provider are already in flight or waiting"""
+    status_code = 503
+
+
+class LLMConfigurationError(LLMError):
+    """The provider can't be used here: missing API key or SDK"""
+    status_code = 503
+
+
+_clients = {}
+_clients_loop = None
+
+# Usage totals of the request being served, see track_usage()
+_usage = contextvars.ContextVar('llm_usage', default=None)
+_usage_gauges = set()
+
+
+def empty_usage():
+    """
+    Per-request totals: provider-reported prompt/cached/completion tokens,
+    plus input_tokens as measured before sending and input_tokens_dropped
+    by budgeting (api/tokens.py)
+    """
+    return {
+        'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0,
+        'input_tokens': 0, 'input_tokens_dropped': 0,
+    }
+
+
+@contextlib.contextmanager
+def track_usage():
+    """
+    Collect token usage of every call made inside the block, including ones
+    made on the runtime loop through run_sync/submit and in tasks they start
+    (they inherit the caller's context). Yields the totals dict.
+    """
+    usage = empty_usage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def error_headers(error):
+    """Response headers for an LLMError: Retry-After when the provider or a bulkhead gave one"""
+    if error.retry_after is None:
+        return None
+    return {'Retry-After': str(max(1, math.ceil(error.retry_after)))}
+
+
+def _record_usage(provider, prompt_tokens, cached_tokens, completion_tokens):
+    prompt_tokens, cached_tokens, completion_tokens = prompt_tokens or 0, cached_tokens or 0, completion_tokens or 0
+    metrics.incr(f'llm.{provider}.prompt_tokens', prompt_tokens)
+    metrics.incr(f'llm.{provider}.cached_tokens', cached_tokens)
+    metrics.incr(f'llm.{provider}.completion_tokens', completion_tokens)
+    if provider not in _usage_gauges:
+        _usage_gauges.add(provider)
+
+        def cached_ratio():
+            prompt = metrics.get(f'llm.{provider}.prompt_tokens')
+            return round(metrics.get(f'llm.{provider}.cached_tokens') / prompt, 3) if prompt else None
+
+        metrics.register_gauge(f'llm.{provider}.cached_token_ratio', cached_ratio)
+
+    usage = _usage.get()
+    if usage is not None:
+        usage['calls'] += 1
+        usage['prompt_tokens'] += prompt_tokens
+        usage['cached_tokens'] += cached_tokens
+        usage['completion_tokens'] += completion_tokens
+
+
+def record_input_tokens(sent, dropped):
+    """Count a prompt as measured locally before sending, and what budgeting cut from it"""
+    metrics.incr('llm.input_tokens', sent)
+    metrics.incr('llm.input_tokens_dropped', dropped)
+    usage = _usage.get()
+    if usage is not None:
+        usage['input_tokens'] += sent
+        usage['input_tokens_dropped'] += dropped
+
+
+def http2_available():
+    return importlib.util.find_spec('h2') is not None
+
+
+def _get_clients():
+    """Per-process clients, bound to the runtime loop they were created on"""
+    global _clients_loop
+    if not in_runtime_thread():
+        raise RuntimeError("LLM clients must be used from a coroutine on the async runtime loop")
+    loop = asyncio.get_running_loop()
+    if _clients_loop is not loop:
+        # A new loop (first use, or a forked worker) can't reuse the old loop's connections
+        _clients.clear()
+        _clients_loop = loop
+    if 'http' not in _clients or _clients['http'].is_closed:
+        _clients.clear()
+        _clients['http'] = httpx.AsyncClient(
+            http2=http2_available(),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _clients
+
+
+def _sdk_client(provider):
+    clients = _get_clients()
+    if provider in clients:
+        return clients[provider]
+
+    if provider == OPENAI:
+        if openai is None:
+            raise LLMConfigurationError("The openai package is not installed", provider)
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            raise LLMConfigurationError("OPENAI_API_KEY environment variable is not set", provider)
+        # Retries are done here, consistently for every provider
+        client = openai.AsyncOpenAI(
+            api_key=api_key, timeout=settings.LLM_TIMEOUT, max_retries=0, http_client=clients['http']
+        )
+    elif provider == ANTHROPIC:
+        if anthropic is None:
+            raise LLMConfigurationError("The anthropic package is not installed", provider)
+        api_key = os.getenv('ANTHROPIC_API_KEY')
+        if not api_key:
+            raise LLMConfigurationError("ANTHROPIC_API_KEY environment variable is not set", provider)
+        client = anthropic.AsyncAnthropic(
+            api_key=api_key, timeout=settings.LLM_TIMEOUT, max_retries=0, http_client=clients['http']
+        )
+    else:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    logger.info(f"Created {provider} client for process {os.getpid()}")
+    clients[provider] = client
+    return client
+
+
+@on_shutdown
+async def _close_clients():
+    http_client = _clients.get('http')
+    if http_client is not None and not http_client.is_closed:
+        await http_client.aclose()
+
+
+def _sdk_error_types(name):
+    return tuple(getattr(sdk, name) for sdk in (openai, anthropic) if sdk is not None)
+
+
+def map_error(provider, exc):
+    """Translate a provider, SDK or transport exception into an LLMError"""
+    if isinstance(exc, LLMError):
+        return exc
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException) + _sdk_error_types('APITimeoutError')):
+        return LLMTimeoutError(f"{provider} call timed out", provider, retryable=True)
+    if isinstance(exc, (httpx.TransportError,) + _sdk_error_types('APIConnectionError')):
+        return LLMError(f"Could not reach {provider}: {str(exc)}", provider, retryable=True)
+
+    status_code = getattr(exc, 'status_code', None) or status_code_of(exc)
+    if status_code == 429:
+        return LLMRateLimitError(
+            f"{provider} rate limit exceeded", provider, retryable=True, retry_after=retry_after_seconds(exc)
+        )
+    if status_code in (401, 403):
+        return LLMConfigurationError(f"{provider} rejected the API key ({status_code})", provider)
+    if status_code is not None:
+        error = LLMError(
+            f"{provider} returned HTTP {status_code}", provider,
+            retryable=status_code in RETRYABLE_STATUS_CODES, retry_after=retry_after_seconds(exc),
+        )
+        # A request the provider refuses is our fault, not an outage
+        error.status_code = 502 if status_code >= 500 or status_code in RETRYABLE_STATUS_CODES else 400
+        return error
+    return LLMError(f"{provider} call failed: {str(exc)}", provider)
+
+
+@contextlib.asynccontextmanager
+async def _provider_slot(provider, deadline):
+    """Hold a slot in the provider's bulkhead for one attempt; failures shrink its limit"""
+    if not settings.BULKHEAD_ENABLED:
+        yield
+        return
+    try:
+        permit = await get_bulkhead('provider', provider).acquire_async(
+            min(settings.BULKHEAD_PROVIDER_MAX_WAIT, deadline.remaining())
+        )
+    except Overloaded as e:
+        raise LLMOverloadedError(str(e), provider, retry_after=e.retry_after) from e
+    mark_upstream_call()
+    failed, record = False, True
+    try:
+        yield
+    except asyncio.CancelledError:
+        # A hedge loser or a caller that went away says nothing about the provider
+        record = False
+        raise
+    except Exception as e:
+        failed = map_error(provider, e).retryable
+        raise
+    finally:
+        permit.release(failed, record)
+
+
+def _user_messages(messages):
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return list(messages)
+
+
+async def _hackclub_chat(messages, model, system, cache_system, max_tokens, temperature, timeout):
+    # OpenAI-compatible providers cache identical prompt prefixes on their own
+    if system:
+        messages = [{"role": "system", "content": system}] + messages
+    payload = {"messages": messages}
+    if model:
+        payload['model'] = model
+    if max_tokens is not None:
+        payload['max_tokens'] = max_tokens
+    if temperature is not None:
+        payload['temperature'] = temperature
+    response = await _get_clients()['http'].post(
+        settings.HACKCLUB_AI_URL, headers={"Content-Type": "application/json"}, json=payload, timeout=timeout
+    )
+    response.raise_for_status()
+    ai_response = response.json()
+    usage = ai_response.get('usage') or {}
+    _record_usage(
+        HACKCLUB, usage.get('prompt_tokens'), (usage.get('prompt_tokens_details') or {}).get('cached_tokens'),
+        usage.get('completion_tokens'),
+    )
+    return ai_response.get('choices', [{}])[0].get('message', {}).get('content', '') or ''
+
+
+async def _openai_chat(messages, model, system, cache_system, max_tokens, temperature, timeout):
+    # Prefixes of 1024+ tokens are cached automatically; nothing to mark
+    if system:
+        messages = [{"role": "system", "content": system}] + messages
+    options = {}
+    if max_tokens is not None:
+        options['max_tokens'] = max_tokens
+    if temperature is not None:
+        options['temperature'] = temperature
+    response = await _sdk_client(OPENAI).chat.completions.create(
+        model=model or settings.OPENAI_MODEL, messages=messages, timeout=timeout, **options
+    )
+    usage = response.usage
+    if usage is not None:
+        details = getattr(usage, 'prompt_tokens_details', None)
+        _record_usage(
+            OPENAI, usage.prompt_tokens, getattr(details, 'cached_tokens', 0), usage.completion_tokens
+        )
+    return response.choices[0].message.content or ''
+
+
+async def _anthropic_chat(messages, model, system, cache_system, max_tokens, temperature, timeout):
+    options = {}
+    if system and cache_system:
+        options['system'] = [{'type': 'text', 'text': system, 'cache_control': {'type': 'ephemeral'}}]
+    elif system:
+        options['system'] = system
+    if temperature is not None:
+        options['temperature'] = temperature
+    response = await _sdk_client(ANTHROPIC).messages.create(
+        model=model or settings.ANTHROPIC_MODEL,
+        max_tokens=max_tokens or settings.LLM_DEFAULT_MAX_TOKENS,
+        messages=messages,
+        timeout=timeout,
+        **options
+    )
+    usage = response.usage
+    cached = getattr(usage, 'cache_read_input_tokens', 0) or 0
+    written = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+    _record_usage(ANTHROPIC, usage.input_tokens + cached + written, cached, usage.output_tokens)
+    return ''.join(block.text for block in response.content if getattr(block, 'type', None) == 'text')
+
+
+def _default_model(provider):
+    """The model a provider's calls use when none is given (None: the service picks)"""
+    return {OPENAI: settings.OPENAI_MODEL, ANTHROPIC: settings.ANTHROPIC_MODEL}.get(provider)
+
+
+_CALLS = {
+    HACKCLUB: _hackclub_chat,
+    OPENAI: _openai_chat,
+    ANTHROPIC: _anthropic_chat,
+}
+
+
+async def chat_async(messages, provider=HACKCLUB, model=None, system=None, max_tokens=None,
+                     temperature=None, timeout=None, max_retries=None, cache_system=False):
+    """
+    Send a chat to a provider and return the reply text, as a Reply naming
+    the provider and model.
+
+    messages is a prompt string, a list of chat messages or a registered
+    Prompt (api/prompts.py), whose static part becomes the system prompt.
+    cache_system marks the system prompt for providers that cache only
+    marked blocks. timeout bounds the whole call, retries included (default
+    LLM_TIMEOUT). Raises LLMError; LLMTimeoutError is also a TimeoutError.
+    """
+    if provider not in _CALLS:
+        raise ValueError(f"Unknown LLM provider: {provider}")
+    call = _CALLS[provider]
+    if isinstance(messages, Prompt):
+        system, cache_system, messages = messages.system, messages.cacheable, messages.user
+    messages = _user_messages(messages)
+    deadline = Deadline(settings.LLM_TIMEOUT if timeout is None else timeout)
+    max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+
+    metrics.incr(f'llm.{provider}.calls')
+    attempt = 0
+    while True:
+        try:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise LLMTimeoutError(f"{provider} call timed out", provider)
+            async with _provider_slot(provider, deadline):
+                started = time.monotonic()
+                reply = await asyncio.wait_for(
+                    call(messages, model, system, cache_system, max_tokens, temperature, deadline.remaining()),
+                    deadline.remaining(),
+                )
+            metrics.observe(f'llm.{provider}.latency', time.monotonic() - started)
+            return Reply(reply, provider, model or _default_model(provider))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = map_error(provider, e)
+            delay = (
+                error.retry_after if error.retry_after is not None
+                else backoff_delay(attempt, settings.LLM_RETRY_BASE_DELAY, settings.LLM_RETRY_MAX_DELAY)
+            )
+            if not error.retryable or attempt >= max_retries or delay >= deadline.remaining():
+                metrics.incr(f'llm.{provider}.errors')
+                if error is not e:
+                    raise error from e
+                raise
+            attempt += 1
+            metrics.incr(f'llm.{provider}.retries')
+            logger.warning(f"{provider} call failed ({str(error)}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def chat(messages, provider=HACKCLUB, **kwargs):
+    """chat_async for sync views: runs the call on the runtime loop and waits for it"""
+    timeout = kwargs.get('timeout')
+    timeout = settings.LLM_TIMEOUT if timeout is None else timeout
+    return run_sync(chat_async(messages, provider=provider, **kwargs), timeout=timeout + SYNC_GRACE_SECONDS)
+
+
+async def _anthropic_stream(messages, model, system, cache_system, max_tokens, temperature, timeout, on_text):
+    options = {}
+    if system and cache_system:
+        options['system'] = [{'type': 'text', 'text': system, 'cache_control': {'type': 'ephemeral'}}]
+    elif system:
+        options['system'] = system
+    if temperature is not None:
+        options['temperature'] = temperature
+    async with _sdk_client(ANTHROPIC).messages.stream(
+        model=model or settings.ANTHROPIC_MODEL,
+        max_tokens=max_tokens or settings.LLM_DEFAULT_MAX_TOKENS,
+        messages=messages,
+        timeout=timeout,
+        **options
+    ) as stream:
+        async for text in stream.text_stream:
+            on_text(text)
+        message = await stream.get_final_message()
+    usage = message.usage
+    cached = getattr(usage, 'cache_read_input_tokens', 0) or 0
+    written = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+    _record_usage(ANTHROPIC, usage.input_tokens + cached + written, cached, usage.output_tokens)
+    return {
+        'model': message.model,
+        'stop_reason': message.stop_reason,
+        'usage': {
+            'input_tokens': usage.input_tokens + cached + written,
+            'cached_tokens': cached,
+            'output_tokens': usage.output_tokens,
+        },
+    }
+
+
+_STREAMS = {
+    ANTHROPIC: _anthropic_stream,
+}
+
+
+async def stream_async(messages, on_text, provider=ANTHROPIC, model=None, system=None, max_tokens=None,
+                       temperature=None, timeout=None, idle_timeout=None, max_retries=None, cache_system=False):
+    """
+    Stream a chat reply, calling on_text(text) with each text delta as it
+    arrives. Returns {'model', 'stop_reason', 'usage'} once the reply is
+    complete. timeout bounds the whole stream (default LLM_STREAM_TIMEOUT),
+    idle_timeout the wait for each chunk (default LLM_TIMEOUT). Failures are
+    retried like chat_async, but only until the first delta has been passed on.
+    """
+    if provider not in _STREAMS:
+        raise ValueError(f"Streaming is not supported for LLM provider: {provider}")
+    call = _STREAMS[provider]
+    if isinstance(messages, Prompt):
+        system, cache_system, messages = messages.system, messages.cacheable, messages.user
+    messages = _user_messages(messages)
+    deadline = Deadline(settings.LLM_STREAM_TIMEOUT if timeout is None else timeout)
+    idle_timeout = settings.LLM_TIMEOUT if idle_timeout is None else idle_timeout
+    max_retries = settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+    started = False
+
+    def relay(text):
+        nonlocal started
+        started = True
+        on_text(text)
+
+    metrics.incr(f'llm.{provider}.streams')
+    attempt = 0
+    while True:
+        try:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise LLMTimeoutError(f"{provider} stream timed out", provider)
+            async with _provider_slot(provider, deadline):
+                return await asyncio.wait_for(
+                    call(messages, model, system, cache_system, max_tokens, temperature,
+                         min(idle_timeout, deadline.remaining()), relay),
+                    deadline.remaining(),
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = map_error(provider, e)
+            delay = (
+                error.retry_after if error.retry_after is not None
+                else backoff_delay(attempt, settings.LLM_RETRY_BASE_DELAY, settings.LLM_RETRY_MAX_DELAY)
+            )
+            # Text already passed on can't be taken back
+            if started or not error.retryable or attempt >= max_retries or delay >= deadline.remaining():
+                metrics.incr(f'llm.{provider}.errors')
+                if error is not e:
+                    raise error from e
+                raise
+            attempt += 1
+            metrics.incr(f'llm.{provider}.retries')
+            logger.warning(f"{provider} stream failed ({str(error)}), retry {attempt}/{max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+_breakers = None
+_breakers_lock = threading.Lock()
+
+
+def _get_breakers():
+    """Per-provider circuit breakers shared by every request in this worker"""
+    global _breakers
+    with _breakers_lock:
+        if _breakers is None:
+            _breakers = CircuitBreaker(
+                settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_COOLDOWN, settings.LLM_BREAKER_MAX_COOLDOWN
+            )
+            metrics.register_gauge('llm.open_circuits', _breakers.open_keys)
+        return _breakers
+
+
+def is_configured(provider):
+    """False when a provider can't be called here (SDK or API key missing)"""
+    if provider == OPENAI:
+        return openai is not None and bool(os.getenv('OPENAI_API_KEY'))
+    if provider == ANTHROPIC:
+        return anthropic is not None and bool(os.getenv('ANTHROPIC_API_KEY'))
+    return provider in _CALLS
+
+
+def resolve_route(route):
+    """
+    [(provider, model)] for a route: a name in LLM_ROUTES, or a list of
+    'provider' / 'provider:model' entries. Unconfigured providers are left
+    out, and so are those with an open circuit unless that would leave none.
+    Only looks at the circuits: a half-open provider's probe is claimed when
+    chat_routed_async actually calls it.
+    """
+    entries = settings.LLM_ROUTES[route] if isinstance(route, str) else route
+    candidates, unconfigured = [], []
+    for entry in entries:
+        provider, _, model = entry.strip().partition(':')
+        if provider not in _CALLS:
+            raise ValueError(f"Unknown LLM provider in route {route!r}: {provider}")
+        if is_configured(provider):
+            candidates.append((provider, model or None))
+        else:
+            unconfigured.append(provider)
+    if not candidates:
+        raise LLMConfigurationError(
+            f"No provider of route {route!r} is configured ({', '.join(unconfigured)}: SDK or API key missing)"
+        )
+    breakers = _get_breakers()
+    return [candidate for candidate in candidates if not breakers.is_open(candidate[0])] or candidates[:1]
+
+
+def _route_latency_key(route, provider):
+    name = route if isinstance(route, str) else ','.join(route)
+    return f'llm.route.{name}.{provider}.latency'
+
+
+def hedge_delay(route, provider):
+    """
+    Seconds to wait for provider on route before hedging: the rolling
+    LLM_HEDGE_QUANTILE latency of its good replies on that route
+    """
+    latency = metrics.quantile(
+        _route_latency_key(route, provider), settings.LLM_HEDGE_QUANTILE, min_samples=settings.LLM_HEDGE_MIN_SAMPLES
+    )
+    if latency is None:
+        return settings.LLM_HEDGE_DEFAULT_DELAY
+    return max(settings.LLM_HEDGE_MIN_DELAY, latency)
+
+
+def _fails_over(error):
+    """Errors another provider may not have: outages, timeouts, throttling, overload, missing configuration"""
+    return error.retryable or isinstance(error, (LLMConfigurationError, LLMOverloadedError))
+
+
+async def chat_routed_async(route, messages, timeout=None, hedge=None, **kwargs):
+    """
+    chat_async over an ordered route of providers (see resolve_route), with
+    hedging (routes of two or more providers) and failover. timeout bounds
+    the whole exchange. Other keyword arguments go to chat_async;
+    model comes from the route. Returns the winning Reply, whose provider
+    and model say who answered. Raises the first provider's LLMError if
+    every provider fails, LLMTimeoutError if time runs out.
+    """
+    candidates = resolve_route(route)
+    hedge = settings.LLM_HEDGE_ENABLED if hedge is None else hedge
+    deadline = Deadline(settings.LLM_TIMEOUT if timeout is None else timeout)
+    breakers = _get_breakers()
+    backups = candidates[1:]
+    tasks = {}
+    errors = []
+
+    def start(role, provider, model):
+        """Call provider, or the next backup if its circuit won't take a call now (its probe went elsewhere)"""
+        while not breakers.allow(provider) and backups:
+            provider, model = backups.pop(0)
+        # With a provider left to fall back on, don't spend the deadline retrying this one
+        task = asyncio.ensure_future(chat_async(
+            messages, provider=provider, model=model, timeout=deadline.remaining(),
+            max_retries=0 if backups else None, **kwargs
+        ))
+        tasks[task] = (role, provider, time.monotonic())
+        return provider, model
+
+    primary, _ = start('primary', *candidates[0])
+    hedge_at = time.monotonic() + hedge_delay(route, primary) if hedge and backups else None
+    try:
+        while tasks:
+            wait = deadline.remaining()
+            if hedge_at is not None:
+                wait = min(wait, max(0, hedge_at - time.monotonic()))
+            done, _ = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                if deadline.expired:
+                    running = ', '.join(provider for _, provider, _ in tasks.values())
+                    raise LLMTimeoutError(f"No reply from {running} in time", primary)
+                # The first request is slower than usual: race a second one
+                hedge_at = None
+                if not backups:
+                    continue
+                provider, model = backups.pop(0)
+                metrics.incr('llm.hedged')
+                logger.info(f"{primary} call is slower than its p95, hedging to {provider}")
+                start('hedge', provider, model)
+                continue
+
+            for task in done:
+                role, provider, started = tasks.pop(task)
+                try:
+                    reply = task.result()
+                except LLMError as e:
+                    if e.retryable:
+                        breakers.record_failure(provider)
+                    if not _fails_over(e):
+                        raise
+                    errors.append(e)
+                    continue
+                breakers.record_success(provider)
+                metrics.observe(_route_latency_key(route, provider), time.monotonic() - started)
+                if role != 'primary':
+                    metrics.incr(f'llm.{role}_wins')
+                return reply
+
+            if not tasks and backups and not deadline.expired:
+                provider, model = backups.pop(0)
+                hedge_at = None
+                metrics.incr('llm.failovers')
+                logger.warning(f"Failing over to {provider}: {str(errors[-1])}")
+                start('failover', provider, model)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    raise errors[0]
+
+
+def chat_routed(route, messages, **kwargs):
+    """chat_routed_async for sync views"""
+    timeout = kwargs.get('timeout')
+    timeout = settings.LLM_TIMEOUT if timeout is None else timeout
+    return run_sync(chat_routed_async(route, messages, **kwargs), timeout=timeout + SYNC_GRACE_SECONDS)
@@ -0,0 +1,94 @@
+import json
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.model_json import SCHEMAS, parse_model_json
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / 'fixtures' / 'model_responses.jsonl'
+
+# The per-detector regexes the views used before api/model_json.py: (object regex, also try ```json blocks)
+LEGACY_PATTERNS = {
+    'text_ai_detection': (r'\{[^}]*"ai_likelihood_percentage"[^}]*"credibility_score"[^}]*\}', False),
+    'ai_image_detection': (r'\{[^}]*"ai_likelihood_percentage"[^}]*"authenticity_score"[^}]*\}', True),
+    'scam_detection': (r'\{[^}]*"scam_likelihood_percentage"[^}]*"analysis_summary"[^}]*\}', True),
+    'fake_news_detection': (r'\{[^}]*"credibility_score"[^}]*"recommendation"[^}]*\}', False),
+    'fake_news_chunk': (r'\{[^}]*"credibility_score"[^}]*"summary"[^}]*\}', False),
+}
+LEGACY_FALLBACKS = (r'AI.*?(\d+)%', r'fake.*?(\d+)%', r'credibility.*?(\d+)%', r'quality.*?(\d+)%', r'scam.*?(\d+)%')
+
+
+def legacy_parse(text, schema):
+    """The old cascade: field-anchored flat-object regex, then ```json block, then percentage regexes"""
+    pattern, try_block = LEGACY_PATTERNS[schema]
+    try:
+        match = re.search(pattern, text, re.DOTALL)
+        if match:
+            return json.loads(match.group()), True
+        if try_block:
+            block = re.search(r'```json\s*(\{.*?\})\s*```', text, re.DOTALL)
+            if block:
+                return json.loads(block.group(1)), True
+        raise ValueError("No valid JSON found in response")
+    except ValueError:
+        return [re.search(fallback, text, re.IGNORECASE) for fallback in LEGACY_FALLBACKS], False
+
+
+def new_parse(text, schema):
+    try:
+        return parse_model_json(text, schema), True
+    except ValueError:
+        return None, False
+
+
+class Command(BaseCommand):
+    help = "Compare the shared model-response JSON parser against the old per-detector regex cascade"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', nargs='?', default=str(DEFAULT_CORPUS),
+                            help="JSON lines of {\"schema\": ..., \"response\": ...}; lines starting with # are skipped")
+        parser.add_argument('--repeat', type=int, default=200, help="Timed passes over the corpus")
+
+    def handle(self, *args, **options):
+        path = Path(options['corpus'])
+        if not path.is_file():
+            raise CommandError(f"No such file: {path}")
+        rows = [
+            json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()
+            if line.strip() and not line.startswith('#')
+        ]
+        unknown = {row['schema'] for row in rows} - set(SCHEMAS)
+        if unknown:
+            raise CommandError(f"Unknown schemas in corpus: {', '.join(sorted(unknown))}")
+        repeat = max(1, options['repeat'])
+
+        by_schema = defaultdict(list)
+        for row in rows:
+            by_schema[row['schema']].append(row['response'])
+
+        totals = {'legacy': [0.0, 0], 'new': [0.0, 0]}
+        for schema, responses in sorted(by_schema.items()):
+            line = f"{schema:20s} {len(responses):3d} responses"
+            for name, parse in (('legacy', legacy_parse), ('new', new_parse)):
+                parsed = sum(parse(response, schema)[1] for response in responses)
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    for response in responses:
+                        parse(response, schema)
+                elapsed = (time.perf_counter() - started) / repeat
+                totals[name][0] += elapsed
+                totals[name][1] += parsed
+                line += f"  {name}: {parsed:3d} parsed {elapsed / len(responses) * 1e6:8.1f} us/response"
+            self.stdout.write(line)
+
+        self.stdout.write("")
+        for name, (elapsed, parsed) in totals.items():
+            self.stdout.write(
+                f"{name:6s} {parsed}/{len(rows)} parsed as JSON ({len(rows) - parsed} fell back), "
+                f"{elapsed * 1000:.2f} ms per pass"
+            )
+        legacy, new = totals['legacy'][0], totals['new'][0]
+        self.stdout.write(f"new parser is {legacy / new if new else 0:.2f}x the speed of the legacy cascade")
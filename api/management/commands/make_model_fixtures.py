@@ -0,0 +1,377 @@
+"""
+Writes api/fixtures/model_responses.jsonl, the corpus for bench_json_parsing.
+
+The replies are SYNTHETIC: no provider output could be captured when the
+corpus was made. Each payload is generated from one score band so that its
+reasoning, lists, verdicts and labels agree with its numbers, and is then
+rendered in one of the styles below. The styles are the shapes the parser has
+to handle, not a measured mix of real traffic; run with
+MODEL_JSON_CAPTURE_PATH set to collect real replies in the same format.
+
+    bare            pretty-printed object and nothing else
+    compact         one-line object and nothing else
+    fence           object in a ```json fence
+    fence_plain     object in a ``` fence with no language tag
+    intro_fence     a line of prose, then a ```json fence
+    fence_outro     a ```json fence, then a line of prose
+    intro_bare      a line of prose, then the bare object
+    trailing_comma  bare object with a comma after its last member
+    truncated       ```json fence cut off part-way (output token limit)
+    string_numbers  fenced object whose percentages are strings ("87", "87%")
+    refusal         prose only, no JSON; the caller has to fall back
+"""
+import json
+import random
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+DEFAULT_OUTPUT = Path(__file__).resolve().parents[2] / 'fixtures' / 'model_responses.jsonl'
+
+HEADER = """\
+# SYNTHETIC model replies for bench_json_parsing, written by `manage.py make_model_fixtures`.
+# These are not captured provider output. Each payload is internally consistent (reasoning, lists and
+# labels follow its scores); "style" names the malformation class, described in make_model_fixtures.py.
+# Set MODEL_JSON_CAPTURE_PATH to collect real replies in this format. Lines starting with # are skipped.
+"""
+
+
+def band(score, high, low):
+    """'high' at or above high, 'low' below low, else 'mid'"""
+    return 'high' if score >= high else 'low' if score < low else 'mid'
+
+
+# Fact-check payloads, keyed by credibility band
+SOUND_CLAIMS = [
+    "The city council approved a $2.1 billion budget for the 2025 fiscal year on Tuesday.",
+    "Unemployment fell to 3.9% in March, according to the Bureau of Labor Statistics.",
+    "The vaccine was tested on more than 40,000 participants across six countries.",
+    "Officials said the bridge will reopen to traffic by the end of the month.",
+    "The company reported a quarterly profit of $4.2 billion, up 18% from a year earlier.",
+    "The governor signed the bill into law on Friday afternoon.",
+    "The wildfire has burned more than 12,000 acres and is 40% contained.",
+    "The study followed 2,300 adults over a period of ten years.",
+    "The central bank raised interest rates by a quarter of a percentage point.",
+]
+SHAKY_CLAIMS = [
+    "Scientists found microplastics in 87% of the tap water samples they tested.",
+    "Average rents in the region have doubled since 2019.",
+    "Local hospitals reported a 30% increase in admissions over the holiday weekend.",
+]
+FALSE_CLAIMS = {
+    "Doctors are hiding a simple cure that big pharma doesn't want you to know about.":
+        "No such cure has been described in any study or by any health agency.",
+    "The election results in three counties were changed overnight by hacked voting machines.":
+        "State election officials audited the counties and found no evidence of this.",
+}
+FACT_CHECK = {
+    'high': {
+        'reasoning': [
+            "The article reports on a local government decision and quotes named council members and the city's published budget documents. Figures are consistent with the official release, and the piece separates reporting from opinion. The author and publication date are present.",
+            "This appears to be straightforward wire-service reporting: attributed quotes, specific dates and figures that match the agency's own release. There is little editorializing.",
+        ],
+        'red_flags': ["No author is named", "Publication date is missing from the extracted content"],
+        'reliability': ('reliable', 'reliable', 'mixed'),
+    },
+    'mid': {
+        'reasoning': [
+            "Most of the factual content matches reporting from established outlets, but the article adds speculation about motives that is presented as fact. The source is a partisan blog with a mixed accuracy record.",
+            "The content is a mix of accurate background information and one unsupported central claim. The study figures are correct, but the conclusion attributed to the researchers goes beyond what the paper says.",
+        ],
+        'red_flags': [
+            "Several quotes are not attributed to a named source",
+            "Sensational headline not supported by the body text",
+            "Statistics are given without a link to the underlying data",
+            "Article appears to be a press release republished without editing",
+        ],
+        'reliability': ('mixed',),
+    },
+    'low': {
+        'reasoning': [
+            "The article relies on an anonymous 'insider' and makes claims about election tampering that have been investigated and rejected by state officials. The language is highly emotional and the site is known for misinformation.",
+            "The piece makes strong health claims without citing any studies, and the only expert quoted is not identified by institution. The headline is far more alarming than the body text, and the central claim is contradicted by health agencies.",
+        ],
+        'red_flags': [
+            "Relies on a single anonymous source",
+            "Emotionally charged language (\"shocking\", \"they don't want you to know\")",
+            "Claims contradict figures published by the cited agency",
+            "Domain has a history of publishing false stories presented as news",
+        ],
+        'reliability': ('unreliable', 'unreliable', 'mixed'),
+    },
+}
+EXPLANATIONS = {
+    'supported': ["Matches the official release.", "Consistent with the agency's published figures.", "Confirmed by multiple outlets."],
+    'disputed': ["Other reporting gives a lower figure.", "The agency's own data shows a smaller change.", "Experts quoted elsewhere disagree."],
+    'unverifiable': ["No public source for this figure could be found.", "Too recent to confirm."],
+}
+
+
+def claim_verdict(rng, claim, level):
+    if claim in FALSE_CLAIMS:
+        return {'claim': claim, 'verdict': 'false', 'explanation': FALSE_CLAIMS[claim]}
+    if claim in SHAKY_CLAIMS:
+        verdict = rng.choice(('disputed', 'unverifiable'))
+    else:
+        verdict = 'supported' if level != 'low' or rng.random() < 0.5 else 'unverifiable'
+    return {'claim': claim, 'verdict': verdict, 'explanation': rng.choice(EXPLANATIONS[verdict])}
+
+
+def fact_check(rng, chunk=False):
+    credibility = rng.choice((rng.randint(72, 95), rng.randint(40, 68), rng.randint(5, 35)))
+    likelihood = max(0, min(100, 100 - credibility + rng.randint(-8, 8)))
+    level = band(credibility, 70, 40)
+    pool = FACT_CHECK[level]
+    claims = rng.sample(SOUND_CLAIMS, rng.randint(1, 3))
+    if level == 'mid':
+        claims.append(rng.choice(SHAKY_CLAIMS))
+    if level == 'low':
+        claims.insert(0, rng.choice(list(FALSE_CLAIMS)))
+    red_flags = rng.sample(pool['red_flags'], {'high': rng.randint(0, 1), 'mid': rng.randint(1, 3), 'low': rng.randint(2, 4)}[level])
+    verdicts = [claim_verdict(rng, claim, level) for claim in claims[:rng.randint(1, len(claims))]]
+    reasoning = rng.choice(pool['reasoning'])
+    if chunk:
+        return {
+            'credibility_score': credibility,
+            'fake_news_likelihood_percentage': likelihood,
+            'summary': reasoning.split('. ')[0] + '.',
+            'key_claims': claims,
+            'red_flags': red_flags,
+            'claim_verdicts': verdicts,
+        }
+    return {
+        'credibility_score': credibility,
+        'fake_news_likelihood_percentage': likelihood,
+        'fact_check_reasoning': reasoning,
+        'confidence': rng.choice(('high', 'medium', 'medium', 'low')),
+        'key_claims': claims,
+        'red_flags': red_flags,
+        'recommendation': {'high': 'trustworthy', 'mid': 'questionable', 'low': 'likely_false'}[level],
+        'source_reliability': rng.choice(pool['reliability']),
+        'claim_verdicts': verdicts,
+    }
+
+
+# Text payloads, keyed by AI-likelihood and fake-news bands
+AI_REASONING = {
+    'high': [
+        "The text has very uniform sentence length, generic transitions (\"Moreover\", \"In conclusion\") and no personal details or concrete specifics, which is typical of model-generated prose.",
+        "Repeated rhetorical patterns and perfectly parallel lists are characteristic of large language model output.",
+    ],
+    'mid': [
+        "Balanced, list-like structure and hedged phrasing suggest AI assistance, but the specific local references point to some human editing.",
+        "Too short to judge reliably. The phrasing is ordinary and could have been written by either.",
+    ],
+    'low': [
+        "Casual tone with typos, slang and an abrupt ending; the structure reads like a quickly written personal comment rather than generated text.",
+    ],
+}
+FAKE_REASONING = {
+    'high': [
+        "Claims a miracle cure with no sources, and urges readers to share before it is 'taken down', a common misinformation pattern.",
+        "States a widely debunked conspiracy theory about vaccines as fact.",
+    ],
+    'mid': ["Mixes an accurate quote with an invented statistic that does not appear in the cited report."],
+    'low': [
+        "The text makes no verifiable factual claims; it is an opinion.",
+        "The figures mentioned match publicly reported statistics.",
+    ],
+}
+
+
+def text_analysis(rng):
+    ai = rng.choice((rng.randint(5, 30), rng.randint(65, 95), rng.randint(40, 60)))
+    fake = rng.choice((rng.randint(2, 25), rng.randint(40, 60), rng.randint(70, 92)))
+    return {
+        'ai_likelihood_percentage': ai,
+        'ai_reasoning': rng.choice(AI_REASONING[band(ai, 65, 35)]),
+        'ai_confidence': 'medium' if band(ai, 65, 35) == 'mid' else rng.choice(('high', 'medium')),
+        'fake_news_likelihood_percentage': fake,
+        'fake_news_reasoning': rng.choice(FAKE_REASONING[band(fake, 65, 35)]),
+        'fake_news_confidence': 'medium' if band(fake, 65, 35) == 'mid' else rng.choice(('high', 'medium')),
+        'credibility_score': max(0, min(100, 100 - fake + rng.randint(-8, 8))),
+    }
+
+
+# Image payloads: reasoning paired with the artifacts it describes
+IMAGE = {
+    'high': [
+        ("The skin texture is unnaturally smooth and the background bokeh has swirling patterns; the left hand shows six fingers.",
+         ["Overly smooth skin texture", "Unnatural bokeh", "Extra or fused fingers"]),
+        ("The text on the storefront signs is garbled and the reflections in the window do not match the street scene, both common in generated images.",
+         ["Garbled text on signs", "Reflections that don't match the scene"]),
+    ],
+    'mid': [
+        ("The image is heavily compressed and low resolution, which hides most of the cues; some edges look oversharpened but that is also common in edited photos.",
+         []),
+        ("Hair strands merge into the background and the earrings differ in shape, suggesting generation, although lighting and composition are plausible.",
+         ["Mismatched earrings"]),
+    ],
+    'low': [
+        ("Lighting, shadows and sensor noise are consistent across the frame, and the compression pattern looks like a phone camera. No typical diffusion artifacts are visible.",
+         []),
+    ],
+}
+
+
+def image_analysis(rng):
+    ai = rng.choice((rng.randint(3, 25), rng.randint(40, 60), rng.randint(70, 97)))
+    reasoning, artifacts = rng.choice(IMAGE[band(ai, 65, 35)])
+    return {
+        'ai_likelihood_percentage': ai,
+        'ai_reasoning': reasoning,
+        'ai_confidence': 'low' if band(ai, 65, 35) == 'mid' else rng.choice(('high', 'medium')),
+        'detected_artifacts': artifacts,
+        'image_quality_score': rng.randint(30, 95),
+        'authenticity_score': max(0, min(100, 100 - ai + rng.randint(-6, 6))),
+    }
+
+
+# Scam payloads: (summary, scam_type, red flags, legitimate indicators), keyed by likelihood band
+SCAMS = {
+    'high': [
+        ("A text claiming a failed package delivery that links to a look-alike domain and asks for a small redelivery fee; classic smishing.",
+         'package delivery phishing',
+         ["Shortened link to an unknown domain (bit.ly)", "Claims to be from USPS but links to a non-USPS domain",
+          "Urgent deadline: 'within 24 hours'"], []),
+        ("An email impersonating the user's bank with a threat of account suspension and a link to 'verify' credentials.",
+         'bank impersonation',
+         ["Threatens account suspension", "Greeting does not use the recipient's name", "Spelling mistakes ('recieve', 'acount')"], []),
+        ("A social media DM promising guaranteed returns on a crypto investment if the user sends funds to a wallet address.",
+         'cryptocurrency investment scam',
+         ["Offer is too good to be true (guaranteed 20% a week)", "Asks for payment to a personal wallet"], []),
+    ],
+    'mid': [
+        ("A WhatsApp message from an unknown number offering a remote job and asking to move the conversation to Telegram; no payment requested yet.",
+         'fake job offer',
+         ["Sender number is a personal mobile, not a short code", "Offer is vague about the employer"],
+         ["No links or requests for information"]),
+        ("A missed-call notice asking the user to ring back about a parcel, with no link; it could be a courier or a callback scam.",
+         'unknown',
+         ["Greeting does not use the recipient's name"], ["No links or requests for information"]),
+    ],
+    'low': [
+        ("An ordinary appointment reminder with no links or requests for information.",
+         'none', [], ["Message comes from a known short code", "No links or requests for information"]),
+        ("An order confirmation that refers to an order number and directs the user to the official app.",
+         'none', [], ["Refers to an order number the user recognises", "Directs the user to the official app rather than a link"]),
+    ],
+}
+RISK = {'high': ('high', 'critical'), 'mid': ('medium',), 'low': ('low',)}
+ACTION = {
+    'high': "Do not click the link or reply. Delete the message and report it as spam.",
+    'mid': "Verify the sender through the organisation's official website or phone number before acting.",
+    'low': "No action needed; the message appears legitimate.",
+}
+
+
+def scam_analysis(rng):
+    likelihood = rng.choice((rng.randint(2, 20), rng.randint(35, 55), rng.randint(70, 98)))
+    level = band(likelihood, 60, 30)
+    summary, scam_type, red_flags, legitimate = rng.choice(SCAMS[level])
+    return {
+        'scam_likelihood_percentage': likelihood,
+        'scam_confidence': 'medium' if level == 'mid' else rng.choice(('high', 'medium')),
+        'scam_type': scam_type,
+        'red_flags': red_flags,
+        'legitimate_indicators': legitimate,
+        'risk_level': RISK[level][likelihood >= 85] if level == 'high' else RISK[level][0],
+        'recommended_action': ACTION[level],
+        'analysis_summary': summary,
+    }
+
+
+INTROS = {
+    'fact_check': ["Here is the fact-check analysis of the article:", "Here's my assessment:"],
+    'text': ["Here's the analysis of the provided text:", "Sure! Here is my analysis:"],
+    'image': ["Here's the analysis of the image:", "Based on my examination of the image, here is the analysis:"],
+    'scam': ["Here's the analysis of the screenshot:", "Based on the screenshot, here is my analysis:"],
+}
+OUTROS = {
+    'fact_check': ["Let me know if you want the claims checked in more detail."],
+    'text': ["Note: AI detection from text alone is not fully reliable, especially for short texts.",
+             "Let me know if you'd like a more detailed breakdown."],
+    'image': ["Please note that this analysis is based on visual inspection and cannot be definitive.",
+              "Keep in mind that heavy compression can hide or mimic AI artifacts."],
+    'scam': ["If in doubt, contact the organization directly using official contact details.",
+             "Stay safe, and never share one-time codes with anyone."],
+}
+REFUSALS = {
+    'image': "I'm sorry, but I can't determine with certainty whether this image was generated by AI. The image appears to be a photograph of a street at night; to assess it properly, a higher-resolution version would help.",
+    'scam': "I'm unable to read the text in this screenshot because it is too blurry. Please upload a clearer image so I can analyze it for scam indicators.",
+    'text': "I can't provide an analysis of this text because it appears to be empty or contains only a link.",
+}
+
+# (schema, payload factory, intro/outro pool, styles). The fact-check prompts ask for JSON only; the others
+# ask for "this exact JSON format", so fenced replies and prose around them are weighted up there
+PLAN = [
+    ('fake_news_detection', fact_check, 'fact_check',
+     ['bare'] * 8 + ['compact', 'fence', 'fence', 'intro_bare', 'trailing_comma', 'truncated', 'string_numbers']),
+    ('fake_news_chunk', lambda rng: fact_check(rng, chunk=True), 'fact_check',
+     ['bare'] * 9 + ['compact', 'fence', 'fence_plain', 'intro_fence', 'trailing_comma', 'truncated']),
+    ('text_ai_detection', text_analysis, 'text',
+     ['fence'] * 6 + ['bare', 'bare', 'fence_plain', 'intro_fence', 'fence_outro', 'fence_outro', 'string_numbers',
+                      'trailing_comma', 'refusal']),
+    ('ai_image_detection', image_analysis, 'image',
+     ['fence'] * 6 + ['bare', 'intro_fence', 'intro_fence', 'fence_outro', 'fence_outro', 'string_numbers',
+                      'truncated', 'compact', 'refusal']),
+    ('scam_detection', scam_analysis, 'scam',
+     ['fence'] * 6 + ['bare', 'bare', 'intro_fence', 'fence_outro', 'fence_outro', 'string_numbers', 'trailing_comma',
+                      'truncated', 'refusal']),
+]
+
+
+def render(rng, payload, style, intro, outro):
+    """payload as a model reply in the given style"""
+    pretty = json.dumps(payload, indent=rng.choice((2, 4)), ensure_ascii=False)
+    if style == 'bare':
+        return pretty
+    if style == 'compact':
+        return json.dumps(payload, ensure_ascii=False)
+    if style == 'fence':
+        return f"```json\n{pretty}\n```"
+    if style == 'fence_plain':
+        return f"```\n{pretty}\n```"
+    if style == 'intro_fence':
+        return f"{intro}\n\n```json\n{pretty}\n```"
+    if style == 'fence_outro':
+        return f"```json\n{pretty}\n```\n\n{outro}"
+    if style == 'intro_bare':
+        return f"{intro}\n\n{pretty}"
+    if style == 'trailing_comma':
+        end = pretty.rfind('\n}')
+        return pretty[:end] + ',' + pretty[end:]
+    if style == 'truncated':
+        return f"```json\n{pretty[:int(len(pretty) * rng.uniform(0.75, 0.92))]}"
+    if style == 'string_numbers':
+        payload = {
+            key: (f"{value}%" if rng.random() < 0.5 else str(value)) if isinstance(value, int) else value
+            for key, value in payload.items()
+        }
+        return f"```json\n{json.dumps(payload, indent=2, ensure_ascii=False)}\n```"
+    raise ValueError(f"Unknown style: {style}")
+
+
+class Command(BaseCommand):
+    help = "Write the synthetic model-reply corpus used by bench_json_parsing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default=str(DEFAULT_OUTPUT))
+        parser.add_argument('--seed', type=int, default=17)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = []
+        for schema, factory, kind, styles in PLAN:
+            for style in styles:
+                if style == 'refusal':
+                    response = REFUSALS[kind]
+                else:
+                    response = render(rng, factory(rng), style, rng.choice(INTROS[kind]), rng.choice(OUTROS[kind]))
+                rows.append({'schema': schema, 'style': style, 'response': response})
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            f.write(HEADER)
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.stdout.write(f"Wrote {len(rows)} synthetic replies to {options['output']}")
@@ -0,0 +1,31 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = "Run job workers (see api/jobs.py) in this process until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Jobs run at the same time")
+
+    def handle(self, *args, **options):
+        stop, threads = jobs.start_workers(options['threads'], daemon=False)
+        # SIGTERM (deploy/restart) lets running jobs finish; the rest stay queued
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        self.stdout.write(
+            f"Running {options['threads']} job workers for: {', '.join(jobs.kinds())} "
+            f"(polling every {settings.JOBS_POLL_INTERVAL}s)"
+        )
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(1)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write("Job workers stopped")
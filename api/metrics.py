@@ -0,0 +1,106 @@
+"""
+In-process metrics registry.
+
+Counters are integers keyed by dotted name; gauges are callables evaluated
+when a snapshot is taken; histograms keep a rolling window of recent samples
+(latencies) for quantiles. Values are per worker process and are exposed at
+/api/metrics/.
+"""
+import math
+import os
+import threading
+from collections import defaultdict, deque
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+_histograms = {}
+_histogram_counts = defaultdict(int)
+
+# Samples kept per histogram; quantiles describe roughly the last HISTOGRAM_WINDOW observations
+HISTOGRAM_WINDOW = 1000
+
+
+def incr(name, value=1):
+    """Increment a counter"""
+    with _lock:
+        _counters[name] += value
+
+
+def get(name):
+    """Current value of a counter"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def observe(name, value):
+    """Add a sample to a histogram"""
+    with _lock:
+        window = _histograms.get(name)
+        if window is None:
+            window = _histograms[name] = deque(maxlen=HISTOGRAM_WINDOW)
+        window.append(value)
+        _histogram_counts[name] += 1
+
+
+def quantile(name, q, min_samples=1):
+    """q-quantile (0..1) of a histogram's recent samples, or None with fewer than min_samples"""
+    with _lock:
+        samples = sorted(_histograms.get(name, ()))
+    if not samples or len(samples) < min_samples:
+        return None
+    return samples[min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))]
+
+
+def register_gauge(name, fn):
+    """Register a callable returning the current value of a gauge"""
+    with _lock:
+        _gauges[name] = fn
+
+
+def peak_rss_kb():
+    """
+    Peak resident set size of this process since it started, in KB (None
+    where unsupported); a process-level gauge, it can't attribute memory to
+    any one request
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def snapshot():
+    """Return all counters and gauges for this process"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {name: (sorted(window), _histogram_counts[name]) for name, window in _histograms.items()}
+
+    gauge_values = {}
+    for name, fn in gauges.items():
+        try:
+            gauge_values[name] = fn()
+        except Exception as e:
+            gauge_values[name] = f"error: {e}"
+
+    return {
+        'pid': os.getpid(),
+        'counters': dict(sorted(counters.items())),
+        'gauges': dict(sorted(gauge_values.items())),
+        'histograms': {
+            name: {
+                'count': count,
+                **{label: round(samples[min(len(samples) - 1, math.ceil(q * len(samples)) - 1)], 4)
+                   for label, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+            }
+            for name, (samples, count) in sorted(histograms.items())
+        },
+    }
+
+
+register_gauge('process.peak_rss_kb', peak_rss_kb)
@@ -0,0 +1,347 @@
+"""
+Tolerant extraction of JSON objects from model responses.
+
+Models wrap the JSON we ask for in markdown fences or prose, leave trailing
+commas, or get cut off at the token limit. parse_model_json looks inside
+fences first and tries each region whole; failing that, one linear,
+brace-balanced scan that skips over string literals finds the individual
+objects, so nested arrays and objects (key_claims, red_flags,
+claim_verdicts) are handled. Trailing commas and truncation are repaired,
+then the result is checked against the calling detector's schema.
+parse_model_json_items does the same for replies covering several inputs,
+one object per item id (text_ai_detection/batching.py).
+
+Most replies are one bare object, so parse_model_json tries json.loads on
+the stripped text before any of that.
+
+python manage.py bench_json_parsing compares this with the old regexes over
+api/fixtures/model_responses.jsonl, a synthetic corpus written by
+make_model_fixtures. Setting MODEL_JSON_CAPTURE_PATH appends
+every response parse_model_json sees to a file in the same format, to
+benchmark against real traffic.
+
+Outcomes are counted per schema as llm.json.<schema>.parsed, .repaired and
+.fallback; a fallback means the caller dropped into its regex heuristics.
+"""
+import json
+import logging
+import re
+import threading
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# A string literal (escapes included) or a structural character
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\],]', re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r'"(?:[^"\\]|\\.)*"|,(\s*[}\]])', re.DOTALL)
+_FENCE = '```'
+_PERCENT_RE = re.compile(r'-?\d+(?:\.\d+)?')
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+# Field kinds: 'percent' (0-100 int), 'str', 'list', or a tuple of allowed lowercase values
+CONFIDENCE = ('high', 'medium', 'low')
+
+SCHEMAS = {
+    'text_ai_detection': {
+        'required': ('ai_likelihood_percentage', 'fake_news_likelihood_percentage'),
+        'fields': {
+            'ai_likelihood_percentage': 'percent',
+            'ai_reasoning': 'str',
+            'ai_confidence': CONFIDENCE,
+            'fake_news_likelihood_percentage': 'percent',
+            'fake_news_reasoning': 'str',
+            'fake_news_confidence': CONFIDENCE,
+            'credibility_score': 'percent',
+        },
+    },
+    'ai_image_detection': {
+        'required': ('ai_likelihood_percentage',),
+        'fields': {
+            'ai_likelihood_percentage': 'percent',
+            'ai_reasoning': 'str',
+            'ai_confidence': CONFIDENCE,
+            'detected_artifacts': 'list',
+            'image_quality_score': 'percent',
+            'authenticity_score': 'percent',
+        },
+    },
+    'scam_detection': {
+        'required': ('scam_likelihood_percentage',),
+        'fields': {
+            'scam_likelihood_percentage': 'percent',
+            'scam_confidence': CONFIDENCE,
+            'scam_type': 'str',
+            'red_flags': 'list',
+            'legitimate_indicators': 'list',
+            'risk_level': ('low', 'medium', 'high', 'critical'),
+            'recommended_action': 'str',
+            'analysis_summary': 'str',
+        },
+    },
+    'fake_news_detection': {
+        'required': ('credibility_score', 'fake_news_likelihood_percentage'),
+        'fields': {
+            'credibility_score': 'percent',
+            'fake_news_likelihood_percentage': 'percent',
+            'fact_check_reasoning': 'str',
+            'confidence': CONFIDENCE,
+            'key_claims': 'list',
+            'red_flags': 'list',
+            'recommendation': ('trustworthy', 'questionable', 'likely_false'),
+            'source_reliability': ('reliable', 'mixed', 'unreliable'),
+            'claim_verdicts': 'list',
+        },
+    },
+    # One part of a long article (fake_news_detection/chunked_fact_check.py)
+    'fake_news_chunk': {
+        'required': ('credibility_score', 'fake_news_likelihood_percentage'),
+        'fields': {
+            'credibility_score': 'percent',
+            'fake_news_likelihood_percentage': 'percent',
+            'summary': 'str',
+            'key_claims': 'list',
+            'red_flags': 'list',
+            'claim_verdicts': 'list',
+        },
+    },
+}
+
+_registered = set()
+_registered_lock = threading.Lock()
+_capture_lock = threading.Lock()
+
+
+def _register(schema):
+    if schema in _registered:
+        return
+    with _registered_lock:
+        if schema in _registered:
+            return
+        _registered.add(schema)
+
+    def fallback_rate():
+        fallbacks = metrics.get(f'llm.json.{schema}.fallback')
+        total = fallbacks + metrics.get(f'llm.json.{schema}.parsed')
+        return round(fallbacks / total, 3) if total else None
+
+    metrics.register_gauge(f'llm.json.{schema}.fallback_rate', fallback_rate)
+
+
+def _capture(text, schema):
+    """Append a response to MODEL_JSON_CAPTURE_PATH as a bench_json_parsing corpus line"""
+    line = json.dumps({'schema': schema, 'response': text}, ensure_ascii=False) + '\n'
+    try:
+        with _capture_lock, open(settings.MODEL_JSON_CAPTURE_PATH, 'a', encoding='utf-8') as f:
+            f.write(line)
+    except OSError as e:
+        logger.warning(f"Could not capture model response to {settings.MODEL_JSON_CAPTURE_PATH}: {e}")
+
+
+def _object_spans(text, start=0, end=None):
+    """
+    Yield (begin, end, truncated) for each top-level JSON object in
+    text[start:end]. A truncated object is returned up to its last complete
+    member, with the brackets still open appended as `end`'s closing suffix.
+    """
+    end = len(text) if end is None else end
+    stack = []
+    begin = None
+    last_comma = None
+    for match in _TOKEN_RE.finditer(text, start, end):
+        token = match.group()
+        if not stack:
+            if token == '{':
+                begin = match.start()
+                stack.append('{')
+            continue
+        if token in _CLOSERS:
+            stack.append(token)
+        elif token in ('}', ']'):
+            stack.pop()
+            if not stack:
+                yield begin, match.end(), None
+                last_comma = None
+        elif token == ',':
+            last_comma = (match.start(), ''.join(_CLOSERS[b] for b in reversed(stack)))
+    if stack and last_comma is not None:
+        # Cut off mid-object (usually the token limit): keep what was complete
+        yield begin, last_comma[0], last_comma[1]
+
+
+def _loads(candidate):
+    try:
+        return json.loads(candidate), False
+    except ValueError:
+        pass
+    repaired = _TRAILING_COMMA_RE.sub(lambda m: m.group(1) if m.group(1) is not None else m.group(), candidate)
+    return json.loads(repaired), True
+
+
+def iter_json_objects(text):
+    """
+    Yield (object, repaired) for every JSON object that can be recovered from
+    text: fenced blocks first, then the whole text
+    """
+    regions = []
+    fence = text.find(_FENCE)
+    while fence != -1:
+        body = text.find('\n', fence)
+        close = text.find(_FENCE, body) if body != -1 else -1
+        if close == -1:
+            # An unclosed fence (truncated reply) runs to the end
+            regions.append((body + 1 if body != -1 else fence + 3, len(text)))
+            break
+        regions.append((body + 1, close))
+        fence = text.find(_FENCE, close + 3)
+    regions.append((0, len(text)))
+
+    for start, end in regions:
+        # Usually the region holds exactly one object: try it whole before scanning
+        begin, close = text.find('{', start, end), text.rfind('}', start, end)
+        if begin != -1 and close > begin:
+            try:
+                value, repaired = _loads(text[begin:close + 1])
+            except ValueError:
+                pass
+            else:
+                if isinstance(value, dict):
+                    yield value, repaired
+                    continue
+        for begin, span_end, suffix in _object_spans(text, start, end):
+            candidate = text[begin:span_end] + (suffix or '')
+            try:
+                value, repaired = _loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                yield value, repaired or suffix is not None
+
+
+def _fits(value, kind):
+    """True if value already has the field's kind (the usual case), so _coerce can be skipped"""
+    if kind == 'percent':
+        return type(value) is int and 0 <= value <= 100
+    if kind == 'str':
+        return type(value) is str
+    if kind == 'list':
+        return type(value) is list
+    return type(value) is str and value in kind
+
+
+def _coerce(value, kind):
+    """Value converted to the field's kind, or None if it can't be"""
+    if kind == 'percent':
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, str):
+            match = _PERCENT_RE.search(value)
+            if not match:
+                return None
+            value = float(match.group())
+        if isinstance(value, (int, float)):
+            return max(0, min(100, round(value)))
+        return None
+    if kind == 'str':
+        return value if isinstance(value, str) else None if value is None else str(value)
+    if kind == 'list':
+        if isinstance(value, list):
+            return value
+        return [value] if isinstance(value, str) and value else None
+    # Enumerations
+    value = str(value).strip().lower() if value is not None else ''
+    return value if value in kind else None
+
+
+def validate(data, schema):
+    """
+    Coerce known fields to their kinds, dropping ones that don't fit so
+    callers fall back to their defaults. Raises ValueError if a required
+    field is missing or unusable.
+    """
+    spec = SCHEMAS[schema]
+    result = dict(data)
+    for field, kind in spec['fields'].items():
+        if field not in result or _fits(result[field], kind):
+            continue
+        value = _coerce(result[field], kind)
+        if value is None:
+            del result[field]
+        else:
+            result[field] = value
+    missing = [field for field in spec['required'] if field not in result]
+    if missing:
+        raise ValueError(f"Response JSON is missing {', '.join(missing)}")
+    return result
+
+
+def parse_model_json(text, schema):
+    """
+    The first JSON object in a model response that satisfies schema, as a
+    validated dict. Raises ValueError if there is none.
+    """
+    _register(schema)
+    text = text or ''
+    if settings.MODEL_JSON_CAPTURE_PATH:
+        _capture(text, schema)
+
+    error = None
+    stripped = text.strip()
+    if stripped.startswith('{') and stripped.endswith('}'):
+        # The usual reply: one bare, valid object
+        try:
+            value = json.loads(stripped)
+        except ValueError:
+            value = None
+        if isinstance(value, dict):
+            try:
+                result = validate(value, schema)
+            except ValueError as e:
+                error = e
+            else:
+                metrics.incr(f'llm.json.{schema}.parsed')
+                return result
+
+    for value, repaired in iter_json_objects(text):
+        try:
+            result = validate(value, schema)
+        except ValueError as e:
+            error = e
+            continue
+        metrics.incr(f'llm.json.{schema}.parsed')
+        if repaired:
+            metrics.incr(f'llm.json.{schema}.repaired')
+        return result
+    metrics.incr(f'llm.json.{schema}.fallback')
+    raise error or ValueError("No valid JSON found in response")
+
+
+def parse_model_json_items(text, schema, key='id'):
+    """
+    The per-item objects of a model response that answers for several inputs
+    at once (a JSON list of objects, bare or inside a wrapper object), as
+    {str(item[key]): validated dict}. Items that are missing, repeated or
+    fail the schema are left out; the caller decides what to do about them.
+    """
+    _register(schema)
+    items = {}
+    for value, repaired in iter_json_objects(text or ''):
+        if key in value:
+            candidates = [value]
+        else:
+            candidates = [item for field in value.values() if isinstance(field, list) for item in field if isinstance(item, dict)]
+        for candidate in candidates:
+            item_id = str(candidate.get(key, '')).strip()
+            if not item_id or item_id in items:
+                continue
+            try:
+                items[item_id] = validate(candidate, schema)
+            except ValueError:
+                continue
+            metrics.incr(f'llm.json.{schema}.parsed')
+            if repaired:
+                metrics.incr(f'llm.json.{schema}.repaired')
+    return items
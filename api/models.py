@@ -1,3 +1,86 @@
+import uuid
+
 from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """
+    A detector run requested through /api/jobs/ and executed by a job worker
+    (api/jobs.py) instead of inside the HTTP request
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    EXPIRED = 'expired'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (EXPIRED, 'Expired'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    FINISHED = (SUCCEEDED, FAILED, EXPIRED, CANCELLED)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Handler name, e.g. 'fake_news_detection' (see api.jobs.handler)
+    kind = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    # Higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # Not picked up before this (retry backoff); expired instead of run after expires_at
+    run_after = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    # A job still running after this is taken to have lost its worker and is queued again
+    lease_until = models.DateTimeField(null=True, blank=True)
+    # Response body and HTTP status the detector's endpoint would have sent
+    result = models.JSONField(null=True, blank=True)
+    http_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    webhook_url = models.URLField(max_length=2000, blank=True)
+    webhook_status = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'priority', 'created_at']),
+            models.Index(fields=['finished_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
+
+class AnalysisResult(models.Model):
+    """
+    A finished detector analysis, kept so history can be browsed and a
+    repeated input can be answered from the store (see api/results.py).
+    Each detector app has a concrete subclass setting DETECTOR.
+    """
+    DETECTOR = None
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    detector = models.CharField(max_length=64, db_index=True)
+    # sha256 of the detector's normalised input (api.results.input_hash)
+    input_hash = models.CharField(max_length=64, db_index=True)
+    # Site the analysed content came from, when there is one
+    domain = models.CharField(max_length=255, blank=True, db_index=True)
+    # Response body the detector's endpoint sent
+    result = models.JSONField()
+    # When the analysis ran (rows are written in batches a little later)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['-created_at']
 
-# Create your models here.
+    def __str__(self):
+        return f"{self.detector} {self.id} ({self.created_at:%Y-%m-%d %H:%M})"
@@ -0,0 +1,79 @@
+"""
+Prompt template registry.
+
+Providers cache prompt prefixes: OpenAI (and OpenAI-compatible gateways) reuse
+any identical leading run of at least 1024 tokens automatically, and Anthropic
+reuses blocks marked with cache_control. Both only help if the long
+instructions and output format come first and never change, and the
+per-request data (article, user text) comes after them.
+
+Each detector registers its prompts in its app's prompts.py as a static
+prefix, sent as the system message and marked cacheable where the provider
+supports it, and a variable suffix, sent as the user message, with {field}
+placeholders. The modules are imported (and the templates checked) once, when
+the api app is ready. Cached-token counts come back through
+api.llm.track_usage.
+"""
+import string
+import textwrap
+import threading
+
+_lock = threading.Lock()
+_templates = {}
+
+
+class Prompt:
+    """A rendered prompt: static system prefix plus the request's user message"""
+
+    __slots__ = ('name', 'system', 'user', 'cacheable')
+
+    def __init__(self, name, system, user, cacheable):
+        self.name = name
+        self.system = system
+        self.user = user
+        self.cacheable = cacheable
+
+
+class PromptTemplate:
+    def __init__(self, name, prefix, suffix, cacheable=True):
+        self.name = name
+        # Normalised once so every request sends a byte-identical prefix
+        self.prefix = textwrap.dedent(prefix).strip() + '\n'
+        self.suffix = textwrap.dedent(suffix).strip('\n') + '\n'
+        self.cacheable = cacheable
+        self.fields = frozenset(
+            field.split('.')[0].split('[')[0]
+            for _, field, _, _ in string.Formatter().parse(self.suffix) if field
+        )
+        if not self.prefix.strip():
+            raise ValueError(f"Prompt {name} has an empty static prefix")
+
+    def render(self, **values):
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt {self.name} is missing {', '.join(sorted(missing))}")
+        return Prompt(self.name, self.prefix, self.suffix.format(**values), self.cacheable)
+
+
+def register(name, prefix, suffix, cacheable=True):
+    """Compile and register a template; returns it"""
+    template = PromptTemplate(name, prefix, suffix, cacheable)
+    with _lock:
+        if name in _templates and _templates[name].prefix != template.prefix:
+            raise ValueError(f"Prompt {name} is already registered with a different prefix")
+        _templates[name] = template
+    return template
+
+
+def get(name):
+    with _lock:
+        return _templates[name]
+
+
+def render(name, **values):
+    return get(name).render(**values)
+
+
+def registered():
+    with _lock:
+        return sorted(_templates)
@@ -0,0 +1,199 @@
+"""
+Failure handling for outbound calls: retry classification, backoff with
+jitter, per-host circuit breakers, a negative cache and request deadlines.
+
+State lives in the worker process and is guarded by a lock, so every request
+thread (and the shared event loop) sees the same view of which hosts are
+failing. Nothing here sleeps or does I/O; callers decide how to wait.
+"""
+import email.utils
+import random
+import threading
+import time
+
+import httpx
+
+# Statuses worth another attempt; anything else in 4xx will fail the same way again
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def status_code_of(exc):
+    """HTTP status carried by an exception, if any"""
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def is_retryable(exc):
+    """True for timeouts, dropped connections, 5xx and 429"""
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)):
+        return True
+    return status_code_of(exc) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(exc):
+    """Delay requested by a Retry-After header (seconds or HTTP date), or None"""
+    response = getattr(exc, 'response', None)
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def backoff_delay(attempt, base, cap):
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Per-key (usually per-host) circuit breaker.
+
+    After `failure_threshold` consecutive failures a key is opened for
+    `cooldown` seconds; calls are rejected until then. The first call after
+    the cooldown is let through as a probe (half-open): success closes the
+    circuit, failure re-opens it with the cooldown doubled, up to
+    `max_cooldown`.
+    """
+
+    def __init__(self, failure_threshold, cooldown, max_cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def allow(self, key):
+        """True if a call to key may go ahead"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._state.get(key)
+            if entry is None or entry['open_until'] is None:
+                return True
+            if now < entry['open_until']:
+                return False
+            # Half-open: one probe at a time, and a probe that never reported
+            # back frees its slot after another cooldown period
+            if entry['probe_started'] is not None and now - entry['probe_started'] < entry['cooldown']:
+                return False
+            entry['probe_started'] = now
+            return True
+
+    def is_open(self, key):
+        """True if allow(key) would refuse a call now; unlike allow(), never claims the probe"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._state.get(key)
+            if entry is None or entry['open_until'] is None:
+                return False
+            if now < entry['open_until']:
+                return True
+            return entry['probe_started'] is not None and now - entry['probe_started'] < entry['cooldown']
+
+    def retry_in(self, key):
+        """Seconds until an open circuit accepts a probe (0 if closed)"""
+        with self._lock:
+            entry = self._state.get(key)
+            if entry is None or entry['open_until'] is None:
+                return 0
+            return max(0, entry['open_until'] - time.monotonic())
+
+    def record_success(self, key):
+        with self._lock:
+            self._state.pop(key, None)
+
+    def record_failure(self, key):
+        """Count a failure; returns True if this failure opened the circuit"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._state.setdefault(
+                key, {'failures': 0, 'open_until': None, 'probe_started': None, 'cooldown': 0}
+            )
+            entry['failures'] += 1
+            half_open = entry['probe_started'] is not None
+            if not half_open and entry['failures'] < self.failure_threshold:
+                return False
+            entry['cooldown'] = min(self.max_cooldown, entry['cooldown'] * 2 if half_open else self.cooldown)
+            entry['open_until'] = now + entry['cooldown']
+            entry['probe_started'] = None
+            return True
+
+    def open_keys(self):
+        """Map of open keys -> seconds until they accept a probe"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                key: round(max(0, entry['open_until'] - now), 1)
+                for key, entry in self._state.items() if entry['open_until'] is not None
+            }
+
+
+class NegativeCache:
+    """Keys known to fail permanently (e.g. sites that block us), each with an expiry"""
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def add(self, key, value=True):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+    def get(self, key):
+        """The stored value while the entry is live, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[0]:
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for expires, _ in self._entries.values() if expires > now)
+
+
+class Deadline:
+    """
+    One end-to-end time budget shared by every stage of a request. Stages ask
+    it for their timeout instead of using fixed ones, so retries and slow
+    calls early on leave less time for later stages rather than overrunning.
+    """
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, cap):
+        """A stage timeout: cap, or whatever is left of the budget if less"""
+        return min(cap, self.remaining())
+
+    def reserve(self, seconds):
+        """A Deadline ending `seconds` earlier, keeping that time back for later stages"""
+        child = Deadline(0)
+        child.expires_at = self.expires_at - seconds
+        return child
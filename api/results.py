@@ -0,0 +1,219 @@
+"""
+Analysis result store.
+
+Every successful detector analysis is kept in that detector's result table
+(an AnalysisResult subclass in the app's models.py), keyed by a hash of its
+normalised input. A repeated input within RESULTS_REUSE_TTL is answered from
+the store instead of being analysed again, /api/results/ lists the history,
+and rows older than RESULTS_TTL are pruned.
+
+Writes stay off the request's critical path: save() only puts the row on an
+in-memory queue and returns its id, and a writer thread per process inserts
+queued rows in batches (up to RESULTS_WRITE_BATCH rows, or whatever arrived
+within RESULTS_WRITE_INTERVAL seconds) with one bulk INSERT per table. When
+the queue is full, or the database is unavailable, rows are dropped with a
+warning; the analysis itself is never held up by the store.
+"""
+import atexit
+import copy
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import llm, metrics
+from .models import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+_queue = None
+_writer_lock = threading.Lock()
+_writer_pid = None
+
+
+def input_hash(*parts):
+    """sha256 of a detector's normalised input parts (str or bytes)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def result_models():
+    """The concrete result model of each detector, by detector name"""
+    return {
+        model.DETECTOR: model
+        for model in apps.get_models()
+        if issubclass(model, AnalysisResult) and model.DETECTOR
+    }
+
+
+def lookup(model, key):
+    """The newest stored result for this input within RESULTS_REUSE_TTL, or None"""
+    if not settings.RESULTS_STORE_ENABLED or settings.RESULTS_REUSE_TTL <= 0:
+        return None
+    cutoff = timezone.now() - timedelta(seconds=settings.RESULTS_REUSE_TTL)
+    try:
+        row = model.objects.filter(input_hash=key, created_at__gte=cutoff).order_by('-created_at').first()
+    except DatabaseError as e:
+        logger.warning(f"Result store lookup failed: {str(e)}")
+        return None
+    metrics.incr(f'results.{model.DETECTOR}.{"reused" if row else "missed"}')
+    return row
+
+
+def lookup_many(model, keys):
+    """{input hash: newest stored row within RESULTS_REUSE_TTL} for those of keys that have one"""
+    if not settings.RESULTS_STORE_ENABLED or settings.RESULTS_REUSE_TTL <= 0:
+        return {}
+    keys = set(keys)
+    cutoff = timezone.now() - timedelta(seconds=settings.RESULTS_REUSE_TTL)
+    try:
+        # Oldest first, so the newest row for each input wins
+        rows = {
+            row.input_hash: row
+            for row in model.objects.filter(input_hash__in=keys, created_at__gte=cutoff).order_by('created_at')
+        }
+    except DatabaseError as e:
+        logger.warning(f"Result store lookup failed: {str(e)}")
+        return {}
+    metrics.incr(f'results.{model.DETECTOR}.reused', len(rows))
+    metrics.incr(f'results.{model.DETECTOR}.missed', len(keys) - len(rows))
+    return rows
+
+
+def reused_body(row):
+    """Response body for a stored result served again: nothing was spent on it"""
+    return {
+        **row.result,
+        'result_id': str(row.id),
+        'reused_result_from': row.created_at.isoformat(),
+        'token_usage': llm.empty_usage(),
+    }
+
+
+def save(model, key, result, domain='', **fields):
+    """
+    Queue a finished analysis for the batched writer; returns the id the row
+    will have (None when the store is disabled or the queue is full)
+    """
+    if not settings.RESULTS_STORE_ENABLED:
+        return None
+    _ensure_writer()
+    row = model(
+        detector=model.DETECTOR,
+        input_hash=key,
+        domain=(domain or '')[:255],
+        # The caller may keep changing its response body
+        result=copy.deepcopy(result),
+        **fields,
+    )
+    try:
+        _queue.put_nowait(row)
+    except queue.Full:
+        metrics.incr('results.dropped')
+        logger.warning(f"Result store queue is full, not storing {model.DETECTOR} result")
+        return None
+    return str(row.id)
+
+
+def write_batch(rows):
+    """Insert rows with one bulk INSERT per table; returns how many were written"""
+    by_model = {}
+    for row in rows:
+        by_model.setdefault(type(row), []).append(row)
+    written = 0
+    for model, model_rows in by_model.items():
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(model_rows, batch_size=settings.RESULTS_WRITE_BATCH)
+            written += len(model_rows)
+        except DatabaseError as e:
+            metrics.incr('results.dropped', len(model_rows))
+            logger.warning(f"Could not store {len(model_rows)} {model.DETECTOR} results: {str(e)}")
+    metrics.incr('results.written', written)
+    return written
+
+
+def prune():
+    """Delete stored results older than RESULTS_TTL; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=settings.RESULTS_TTL)
+    deleted = 0
+    for model in result_models().values():
+        count, _ = model.objects.filter(created_at__lt=cutoff).delete()
+        deleted += count
+    return deleted
+
+
+def _next_batch(timeout):
+    """Block up to timeout for a first row, then collect up to RESULTS_WRITE_BATCH within RESULTS_WRITE_INTERVAL"""
+    try:
+        batch = [_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    until = time.monotonic() + settings.RESULTS_WRITE_INTERVAL
+    while len(batch) < settings.RESULTS_WRITE_BATCH:
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_loop():
+    next_prune = 0
+    while True:
+        batch = _next_batch(timeout=max(1.0, next_prune - time.monotonic()))
+        try:
+            close_old_connections()
+            if batch:
+                write_batch(batch)
+            if time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + settings.RESULTS_PRUNE_INTERVAL
+                pruned = prune()
+                if pruned:
+                    logger.info(f"Pruned {pruned} expired analysis results")
+        except Exception as e:
+            logger.exception(f"Result writer failed: {str(e)}")
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def flush(timeout=5):
+    """Wait (up to timeout seconds) for queued rows to be written; True if they were"""
+    if _queue is None or _writer_pid != os.getpid():
+        return True
+    until = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < until:
+        time.sleep(0.05)
+    return not _queue.unfinished_tasks
+
+
+def _ensure_writer():
+    """Start this process's writer thread, once per process"""
+    global _queue, _writer_pid
+    if _writer_pid == os.getpid():
+        return
+    with _writer_lock:
+        if _writer_pid == os.getpid():
+            return
+        # A forked worker doesn't inherit the parent's thread, so it starts afresh
+        _queue = queue.Queue(maxsize=settings.RESULTS_WRITE_QUEUE)
+        threading.Thread(target=_write_loop, name=f'nocap-result-writer-{os.getpid()}', daemon=True).start()
+        metrics.register_gauge('results.queued', lambda: _queue.qsize())
+        # Rows still queued at exit are written before the process goes
+        atexit.register(flush)
+        _writer_pid = os.getpid()
@@ -0,0 +1,135 @@
+"""
+Per-process asyncio runtime shared by the detectors.
+
+Sync views submit coroutines to one long-lived event loop running in a daemon
+thread, so every gunicorn worker keeps a single loop and a single pooled
+httpx client for its whole lifetime instead of building both per request.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_loop = None
+_thread = None
+_pid = None
+_http_client = None
+_shutdown_hooks = []
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop():
+    """
+    Return the background event loop, starting it on first use in this process
+    """
+    global _loop, _thread, _pid, _http_client
+    with _lock:
+        if _loop is None or _pid != os.getpid() or not _thread.is_alive():
+            # A loop inherited from the gunicorn master has no thread behind it
+            # after the fork, so every worker process starts its own
+            _loop = asyncio.new_event_loop()
+            # Blocking work handed off with asyncio.to_thread (parsing, sync SDK calls)
+            _loop.set_default_executor(ThreadPoolExecutor(
+                max_workers=settings.ASYNC_RUNTIME_THREADS, thread_name_prefix='nocap-runtime-worker'
+            ))
+            _thread = threading.Thread(
+                target=_run_loop, args=(_loop,), name='nocap-async-runtime', daemon=True
+            )
+            _thread.start()
+            _pid = os.getpid()
+            _http_client = None
+            logger.debug("Started async runtime loop in process %s", _pid)
+        return _loop
+
+
+def in_runtime_thread():
+    """True when called from the background loop's own thread"""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit(coro):
+    """
+    Schedule a coroutine on the background loop and return a concurrent future
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro, timeout=None):
+    """
+    Run a coroutine on the background loop and block the calling thread until
+    it finishes. Must not be called from the loop thread itself.
+    """
+    if in_runtime_thread():
+        coro.close()
+        raise RuntimeError("run_sync() called from the async runtime thread; await the coroutine instead")
+
+    future = submit(coro)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def get_http_client():
+    """
+    Return the shared httpx.AsyncClient for this process.
+
+    The client is bound to the background loop, so it may only be used from
+    coroutines running there (i.e. ones passed to run_sync/submit).
+    """
+    global _http_client
+    if not in_runtime_thread():
+        raise RuntimeError("get_http_client() must be called from a coroutine on the async runtime loop")
+
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(settings.HTTP_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _http_client
+
+
+def on_shutdown(hook):
+    """
+    Register a coroutine function to await on the loop at process exit, for
+    other loop-bound clients that need closing
+    """
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+@atexit.register
+def _shutdown():
+    loop = _loop
+    if loop is None or _pid != os.getpid() or not loop.is_running():
+        return
+
+    async def _close():
+        if _http_client is not None and not _http_client.is_closed:
+            await _http_client.aclose()
+        for hook in _shutdown_hooks:
+            await hook()
+
+    try:
+        asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout=5)
+    except Exception as e:
+        logger.debug("Error closing shared HTTP client: %s", e)
+    loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,157 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+When many identical requests arrive together (a link going viral), only the
+first one (the leader) calls upstream; the others (followers) wait for the
+leader's result instead of starting their own LLM calls. Requests are keyed
+on a hash of the detector name and its normalised input.
+
+Within a worker process followers wait on the leader's future. With
+SINGLE_FLIGHT_CROSS_WORKER the leader also takes a lock in the shared cache
+(SINGLE_FLIGHT_CACHE) and publishes its result there, so requests landing on
+other workers on the same host wait on it too. The result stays published for
+SINGLE_FLIGHT_RESULT_GRACE seconds after the lock is released, so a follower
+that polls just after the leader finished still finds it; a follower that
+finds neither lock nor result (the leader failed or died) runs the call
+itself at once. The lock is best-effort: if two workers both become leader,
+the only cost is one extra upstream call.
+
+Clients may send an Idempotency-Key header. Retries with the same key and
+input attach to the running computation, and once it finishes they get its
+stored result for SINGLE_FLIGHT_IDEMPOTENCY_TTL seconds.
+"""
+import copy
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .resilience import Deadline
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def idempotency_key(request):
+    """The client's Idempotency-Key header, if any"""
+    return request.headers.get('Idempotency-Key', '').strip() or None
+
+
+def request_key(detector, normalized_input, idempotency_key=None):
+    """
+    Coalescing key for a detector call. An idempotency key is combined with
+    the input, so reusing a key for different input never returns the wrong
+    result.
+    """
+    digest = hashlib.sha1(f'{detector}\0{normalized_input}'.encode('utf-8')).hexdigest()
+    if idempotency_key:
+        digest = hashlib.sha1(f'{digest}\0{idempotency_key}'.encode('utf-8')).hexdigest()
+    return f'{detector}:{digest}'
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        metrics.register_gauge(f'singleflight.{name}.in_flight', lambda: len(self._calls))
+
+    def do(self, key, fn, timeout=None, remember=False, should_remember=None):
+        """
+        Run fn() unless an identical call is already in flight, and return
+        (result, shared). shared is True when the result came from another
+        caller. Followers wait at most timeout seconds (TimeoutError).
+
+        With remember (set for idempotency-keyed requests) the result is also
+        kept for SINGLE_FLIGHT_IDEMPOTENCY_TTL seconds if
+        should_remember(result) allows it.
+        """
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return fn(), False
+
+        cache = caches[settings.SINGLE_FLIGHT_CACHE]
+        done_key = f'singleflight:{self.name}:{key}:done'
+        if remember:
+            stored = cache.get(done_key, _MISSING)
+            if stored is not _MISSING:
+                metrics.incr(f'singleflight.{self.name}.idempotent_replay')
+                return stored, True
+
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            metrics.incr(f'singleflight.{self.name}.follower')
+            # Every caller gets its own copy, so one response can't alter another's
+            return copy.deepcopy(future.result(timeout)), True
+
+        metrics.incr(f'singleflight.{self.name}.leader')
+        try:
+            if settings.SINGLE_FLIGHT_CROSS_WORKER:
+                result, shared = self._lead_across_workers(cache, key, fn, timeout)
+            else:
+                result, shared = fn(), False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            if remember and (should_remember is None or should_remember(result)):
+                cache.set(done_key, result, settings.SINGLE_FLIGHT_IDEMPOTENCY_TTL)
+            return copy.deepcopy(result), shared
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _lead_across_workers(self, cache, key, fn, timeout):
+        lock_key = f'singleflight:{self.name}:{key}:lock'
+        result_key = f'singleflight:{self.name}:{key}:result'
+        if cache.add(lock_key, uuid.uuid4().hex, settings.SINGLE_FLIGHT_LOCK_TTL):
+            try:
+                result = fn()
+                # Published before the lock goes, and kept a little after it, for followers between polls
+                cache.set(result_key, result, settings.SINGLE_FLIGHT_RESULT_GRACE)
+                return result, False
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker is leading: wait for it to publish, or take over if it goes away
+        deadline = Deadline(settings.SINGLE_FLIGHT_LOCK_TTL if timeout is None else timeout)
+        while not deadline.expired:
+            # Checked before the result, so a leader finishing in between is still seen to have published
+            leading = cache.get(lock_key) is not None
+            result = cache.get(result_key, _MISSING)
+            if result is not _MISSING:
+                metrics.incr(f'singleflight.{self.name}.cross_worker_follower')
+                return result, True
+            if not leading:
+                break
+            time.sleep(min(settings.SINGLE_FLIGHT_POLL_INTERVAL, deadline.remaining()))
+
+        logger.info(f"Single-flight leader for {self.name} did not publish a result; running the call here")
+        return fn(), False
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name):
+    """The process-wide SingleFlight group for a detector"""
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
@@ -1,3 +1,760 @@
-from django.test import TestCase
+import asyncio
+import copy
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from rest_framework import status
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from . import bulkhead as bulkhead_module
+from . import claude, jobs, llm, metrics, prompts, resilience, runtime, tokens
+from .bulkhead import Bulkhead, Overloaded, bulkhead, mark_upstream_call
+from .model_json import parse_model_json, parse_model_json_items
+from .resilience import CircuitBreaker, Deadline, NegativeCache
+from .singleflight import SingleFlight
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@override_settings(BULKHEAD_LATENCY_TOLERANCE=3.0, BULKHEAD_DECREASE_FACTOR=0.7)
+class BulkheadTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(bulkhead_module.time, 'monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make(self, limit=4, max_queue=0, max_wait=0.01, name='test'):
+        return Bulkhead(name, initial_limit=limit, min_limit=1, max_limit=16, max_queue=max_queue, max_wait=max_wait)
+
+    def run_calls(self, bulkhead, count, seconds, failed=False, record=True):
+        """count calls, all in flight at once, each taking seconds"""
+        permits = [bulkhead.acquire() for _ in range(count)]
+        self.clock.now += seconds
+        for permit in permits:
+            permit.release(failed, record)
+
+    def test_limit_grows_while_in_use(self):
+        bulkhead = self.make(limit=4)
+        for _ in range(8):
+            self.run_calls(bulkhead, bulkhead.limit, 2.0)
+        self.assertGreater(bulkhead.limit, 4)
+
+    def test_limit_stays_when_unused(self):
+        bulkhead = self.make(limit=4)
+        for _ in range(20):
+            self.run_calls(bulkhead, 1, 2.0)
+        self.assertEqual(bulkhead.limit, 4)
+
+    def test_failure_cuts_limit_once_per_usual_latency(self):
+        bulkhead = self.make(limit=10)
+        self.run_calls(bulkhead, 1, 2.0)
+        self.run_calls(bulkhead, 3, 0.1, failed=True)
+        self.assertEqual(bulkhead.limit, 7)
+        self.clock.now += 2.0
+        self.run_calls(bulkhead, 1, 0.1, failed=True)
+        self.assertEqual(bulkhead.limit, 4)
+
+    def test_slow_call_cuts_limit(self):
+        bulkhead = self.make(limit=10)
+        self.run_calls(bulkhead, 1, 2.0)
+        self.run_calls(bulkhead, 1, 10.0)
+        self.assertEqual(bulkhead.limit, 7)
+
+    def test_limit_never_below_min(self):
+        bulkhead = self.make(limit=2)
+        for _ in range(10):
+            self.clock.now += 100
+            self.run_calls(bulkhead, 1, 0.1, failed=True)
+        self.assertEqual(bulkhead.limit, 1)
+
+    def test_unrecorded_calls_leave_limit_and_latency_alone(self):
+        bulkhead = self.make(limit=4)
+        self.run_calls(bulkhead, 4, 0.001, failed=True, record=False)
+        self.assertEqual(bulkhead.limit, 4)
+        self.assertIsNone(bulkhead._latency)
+
+    def test_sheds_when_full_with_retry_after(self):
+        bulkhead = self.make(limit=1, max_queue=0)
+        self.run_calls(bulkhead, 1, 4.2)
+        permits = [bulkhead.acquire() for _ in range(bulkhead.limit)]
+        with self.assertRaises(Overloaded) as caught:
+            bulkhead.acquire()
+        self.assertEqual(caught.exception.retry_after, 5)
+        permits.pop().release()
+        bulkhead.acquire().release()
+
+    def test_sheds_queued_caller_after_max_wait(self):
+        bulkhead = self.make(limit=1, max_queue=1, max_wait=0.01)
+        permit = bulkhead.acquire()
+        with self.assertRaises(Overloaded):
+            bulkhead.acquire()
+        self.assertEqual(len(bulkhead._waiters), 0)
+        permit.release()
+
+
+@override_settings(
+    BULKHEAD_ENABLED=True, BULKHEAD_LATENCY_TOLERANCE=3.0, BULKHEAD_DECREASE_FACTOR=0.7,
+    BULKHEAD_DETECTOR_LIMIT=4, BULKHEAD_DETECTOR_MIN_LIMIT=1, BULKHEAD_DETECTOR_MAX_LIMIT=16,
+    BULKHEAD_DETECTOR_QUEUE=0, BULKHEAD_DETECTOR_MAX_WAIT=0.01,
+)
+class BulkheadViewTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(bulkhead_module.time, 'monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = APIRequestFactory()
+
+    def make_view(self, name):
+        @api_view(['POST'])
+        @bulkhead(name)
+        def view(request):
+            kind = request.data['kind']
+            if kind == 'invalid':
+                self.clock.now += 0.001
+                return Response({'error': 'bad input'}, status=status.HTTP_400_BAD_REQUEST)
+            if kind == 'model':
+                mark_upstream_call()
+                self.clock.now += 20.0
+            else:
+                # Answered from the result store or another request's call
+                self.clock.now += 0.002
+            return Response({'kind': kind})
+        return view
+
+    def call(self, view, kind):
+        return view(self.factory.post('/', {'kind': kind}, format='json'))
+
+    def test_cached_and_invalid_requests_dont_collapse_limit(self):
+        view = self.make_view('mixed')
+        for _ in range(10):
+            for _ in range(20):
+                self.call(view, 'cached')
+            self.call(view, 'invalid')
+            self.call(view, 'model')
+        detector = bulkhead_module.get_bulkhead('detector', 'mixed')
+        self.assertEqual(detector.limit, 4)
+        self.assertAlmostEqual(detector._latency, 20.0)
+
+    def test_shed_request_gets_503_with_retry_after(self):
+        view = self.make_view('shed')
+        detector = bulkhead_module.get_bulkhead('detector', 'shed')
+        permits = [detector.acquire() for _ in range(detector.limit)]
+        response = self.call(view, 'model')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        for permit in permits:
+            permit.release(record=False)
+        self.assertEqual(self.call(view, 'model').status_code, status.HTTP_200_OK)
+
+
+class RuntimeTests(SimpleTestCase):
+    def test_requests_share_one_loop_and_one_client(self):
+        async def current():
+            return asyncio.get_running_loop(), runtime.get_http_client()
+
+        first, second = runtime.run_sync(current()), runtime.run_sync(current())
+        self.assertIs(first[0], runtime.get_loop())
+        self.assertEqual(first, second)
+        self.assertFalse(first[1].is_closed)
+
+    def test_client_is_only_handed_out_on_the_loop(self):
+        with self.assertRaises(RuntimeError):
+            runtime.get_http_client()
+
+    def test_run_sync_refuses_to_block_the_loop(self):
+        async def nested():
+            coro = asyncio.sleep(0)
+            with self.assertRaises(RuntimeError):
+                runtime.run_sync(coro)
+            return True
+
+        self.assertTrue(runtime.run_sync(nested(), timeout=5))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(resilience.time, 'monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_is_open_leaves_half_open_probe_for_allow(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=10, max_cooldown=60)
+        breaker.record_failure('hackclub')
+        breaker.record_failure('hackclub')
+        self.assertTrue(breaker.is_open('hackclub'))
+        self.clock.now += 10
+        for _ in range(3):
+            self.assertFalse(breaker.is_open('hackclub'))
+        self.assertTrue(breaker.allow('hackclub'))
+        self.assertTrue(breaker.is_open('hackclub'))
+        self.assertFalse(breaker.allow('hackclub'))
+
+    def test_failed_probes_double_the_cooldown_and_success_closes(self):
+        breaker = CircuitBreaker(failure_threshold=3, cooldown=10, max_cooldown=25)
+        self.assertFalse(breaker.record_failure('news.example.com'))
+        self.assertFalse(breaker.record_failure('news.example.com'))
+        self.assertTrue(breaker.allow('news.example.com'))
+        self.assertTrue(breaker.record_failure('news.example.com'))
+        self.assertEqual(breaker.open_keys(), {'news.example.com': 10})
+        self.assertFalse(breaker.allow('news.example.com'))
+        self.assertTrue(breaker.allow('other.example.com'))
+
+        for cooldown in (20, 25, 25):
+            self.clock.now += breaker.retry_in('news.example.com')
+            self.assertTrue(breaker.allow('news.example.com'))
+            self.assertTrue(breaker.record_failure('news.example.com'))
+            self.assertEqual(breaker.retry_in('news.example.com'), cooldown)
+
+        self.clock.now += 25
+        self.assertTrue(breaker.allow('news.example.com'))
+        breaker.record_success('news.example.com')
+        self.assertEqual(breaker.open_keys(), {})
+        # Closed again: it takes the full threshold to reopen
+        self.assertFalse(breaker.record_failure('news.example.com'))
+
+    def test_probe_that_never_reports_frees_its_slot_after_a_cooldown(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=10, max_cooldown=60)
+        breaker.record_failure('news.example.com')
+        self.clock.now += 10
+        self.assertTrue(breaker.allow('news.example.com'))
+        self.clock.now += 5
+        self.assertFalse(breaker.allow('news.example.com'))
+        self.clock.now += 5
+        self.assertTrue(breaker.allow('news.example.com'))
+
+
+class DeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(resilience.time, 'monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stage_timeouts_shrink_with_the_budget(self):
+        deadline = Deadline(90)
+        self.assertEqual(deadline.timeout(30), 30)
+        self.clock.now += 75
+        self.assertEqual(deadline.timeout(30), 15)
+        self.clock.now += 20
+        self.assertEqual((deadline.timeout(30), deadline.expired), (0, True))
+
+    def test_reserve_keeps_time_back_for_later_stages(self):
+        deadline = Deadline(90)
+        fetching = deadline.reserve(35)
+        self.assertEqual(fetching.remaining(), 55)
+        self.clock.now += 55
+        self.assertTrue(fetching.expired)
+        self.assertEqual(deadline.remaining(), 35)
+
+
+class NegativeCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(resilience.time, 'monotonic', self.clock.monotonic)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = NegativeCache(ttl=60)
+        cache.add('blocked.example.com')
+        self.clock.now += 59
+        self.assertTrue(cache.get('blocked.example.com'))
+        self.assertEqual(len(cache), 1)
+        self.clock.now += 1
+        self.assertIsNone(cache.get('blocked.example.com'))
+        self.assertEqual(len(cache), 0)
+
+    def test_oldest_entries_are_evicted_first(self):
+        cache = NegativeCache(ttl=60, max_entries=2)
+        for host in ('a.example.com', 'b.example.com', 'c.example.com'):
+            cache.add(host)
+        self.assertIsNone(cache.get('a.example.com'))
+        self.assertTrue(cache.get('c.example.com'))
+        cache.discard('c.example.com')
+        self.assertIsNone(cache.get('c.example.com'))
+
+
+@override_settings(
+    LLM_HEDGE_ENABLED=True, LLM_HEDGE_DEFAULT_DELAY=0.05, LLM_HEDGE_MIN_DELAY=0.01, LLM_HEDGE_MIN_SAMPLES=3,
+    LLM_HEDGE_QUANTILE=0.95, LLM_BREAKER_FAILURES=2, LLM_BREAKER_COOLDOWN=30, LLM_BREAKER_MAX_COOLDOWN=60,
+)
+class RoutedChatTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+        self.cancelled = []
+        # provider -> (seconds, reply text or LLMError)
+        self.behaviour = {}
+        llm._breakers = None
+        self.addCleanup(setattr, llm, '_breakers', None)
+        for target, value in (('is_configured', lambda provider: True), ('chat_async', self.fake_chat)):
+            patcher = mock.patch.object(llm, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def fake_chat(self, messages, provider, model=None, timeout=None, max_retries=None, **kwargs):
+        self.calls.append(provider)
+        seconds, outcome = self.behaviour[provider]
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            self.cancelled.append(provider)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return llm.Reply(outcome, provider, model)
+
+    def chat(self, route, timeout=5):
+        return asyncio.run(llm.chat_routed_async(route, 'prompt', timeout=timeout))
+
+    def test_slow_primary_is_hedged_and_the_loser_cancelled(self):
+        self.behaviour = {llm.HACKCLUB: (2, 'slow'), llm.OPENAI: (0.01, 'fast')}
+        hedged = metrics.get('llm.hedged')
+        reply = self.chat(['hackclub:hedge-test', 'openai'])
+        self.assertEqual((reply, reply.provider), ('fast', llm.OPENAI))
+        self.assertEqual(self.calls, [llm.HACKCLUB, llm.OPENAI])
+        self.assertEqual(self.cancelled, [llm.HACKCLUB])
+        self.assertEqual(metrics.get('llm.hedged'), hedged + 1)
+
+    def test_single_provider_route_is_not_hedged(self):
+        self.behaviour = {llm.OPENAI: (0.2, 'vision reply')}
+        self.assertEqual(self.chat(['openai:single-test']), 'vision reply')
+        self.assertEqual(self.calls, [llm.OPENAI])
+
+    def test_hedge_delay_follows_the_routes_own_latency(self):
+        route = ['hackclub:latency-test', 'openai']
+        self.assertEqual(llm.hedge_delay(route, llm.HACKCLUB), 0.05)
+        self.behaviour = {llm.HACKCLUB: (0.02, 'ok')}
+        for _ in range(3):
+            self.chat(route)
+        self.assertGreaterEqual(llm.hedge_delay(route, llm.HACKCLUB), 0.02)
+        # Other routes through the same provider keep their own figures
+        self.assertEqual(llm.hedge_delay(['hackclub:other-route', 'openai'], llm.HACKCLUB), 0.05)
+
+    def test_outage_fails_over_to_the_next_provider(self):
+        self.behaviour = {
+            llm.HACKCLUB: (0, llm.LLMError('HTTP 502', llm.HACKCLUB, retryable=True)), llm.OPENAI: (0, 'backup'),
+        }
+        with self.assertLogs('api.llm', 'WARNING'):
+            self.assertEqual(self.chat(['hackclub:failover-test', 'openai']).provider, llm.OPENAI)
+
+    def test_request_errors_do_not_fail_over(self):
+        self.behaviour = {llm.HACKCLUB: (0, llm.LLMError('HTTP 400', llm.HACKCLUB)), llm.OPENAI: (0, 'backup')}
+        with self.assertRaisesMessage(llm.LLMError, 'HTTP 400'):
+            self.chat(['hackclub:error-test', 'openai'])
+        self.assertEqual(self.calls, [llm.HACKCLUB])
+
+    def test_repeated_failures_open_the_providers_circuit(self):
+        route = ['hackclub:breaker-test', 'openai']
+        self.behaviour = {
+            llm.HACKCLUB: (0, llm.LLMError('HTTP 503', llm.HACKCLUB, retryable=True)), llm.OPENAI: (0, 'backup'),
+        }
+        with self.assertLogs('api.llm', 'WARNING'):
+            for _ in range(2):
+                self.chat(route)
+        self.assertEqual(llm.resolve_route(route), [(llm.OPENAI, None)])
+        self.calls.clear()
+        self.chat(route)
+        self.assertEqual(self.calls, [llm.OPENAI])
+
+    def test_every_provider_failing_raises_the_first_error(self):
+        self.behaviour = {
+            llm.HACKCLUB: (0, llm.LLMError('hackclub down', llm.HACKCLUB, retryable=True)),
+            llm.OPENAI: (0, llm.LLMError('openai down', llm.OPENAI, retryable=True)),
+        }
+        with self.assertRaisesMessage(llm.LLMError, 'hackclub down'), self.assertLogs('api.llm', 'WARNING'):
+            self.chat(['hackclub:all-down-test', 'openai'])
+
+
+DONE = {'model': 'claude-3-5-sonnet-20240620', 'stop_reason': 'end_turn',
+        'usage': {'input_tokens': 12, 'cached_tokens': 0, 'output_tokens': 2}}
+
+
+class ClaudeStreamTests(SimpleTestCase):
+    messages = [{'role': 'user', 'content': 'Hello'}]
+
+    def events(self, stream, stream_format='sse'):
+        """Frames claude_events yields with llm.stream_async replaced by stream"""
+        async def run():
+            return [frame async for frame in claude.claude_events(self.messages, {'model': 'm'}, stream_format)]
+
+        with mock.patch.object(llm, 'stream_async', stream):
+            return asyncio.run(run())
+
+    async def reply(self, messages, on_text, provider, **options):
+        for text in ('Hel', 'lo'):
+            on_text(text)
+            await asyncio.sleep(0)
+        return DONE
+
+    def test_sse_framing(self):
+        self.assertEqual(self.events(self.reply), [
+            'event: delta\ndata: {"text": "Hel"}\n\n',
+            'event: delta\ndata: {"text": "lo"}\n\n',
+            f'event: done\ndata: {json.dumps(DONE)}\n\n',
+        ])
+
+    def test_ndjson_framing(self):
+        lines = self.events(self.reply, 'ndjson')
+        self.assertTrue(all(line.endswith('\n') and line.count('\n') == 1 for line in lines))
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'type': 'delta', 'text': 'Hel'}, {'type': 'delta', 'text': 'lo'}, {'type': 'done', **DONE},
+        ])
+
+    def test_failure_after_deltas_ends_with_an_error_event(self):
+        async def failing(messages, on_text, provider, **options):
+            on_text('Hel')
+            raise llm.LLMRateLimitError('anthropic rate limit exceeded', llm.ANTHROPIC)
+
+        with self.assertLogs('api.claude', 'WARNING'):
+            frames = self.events(failing, 'ndjson')
+        self.assertEqual([json.loads(frame) for frame in frames], [
+            {'type': 'delta', 'text': 'Hel'},
+            {'type': 'error', 'error': 'API error: anthropic rate limit exceeded', 'http_status': 429},
+        ])
+
+    def test_client_disconnect_cancels_the_upstream_stream(self):
+        cancelled = threading.Event()
+
+        async def hanging(messages, on_text, provider, **options):
+            on_text('Hel')
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def run():
+            events = claude.claude_events(self.messages, {}, 'sse')
+            first = await events.__anext__()
+            await events.aclose()
+            return first
+
+        before = metrics.get('claude.stream.cancelled')
+        with mock.patch.object(llm, 'stream_async', hanging):
+            self.assertEqual(asyncio.run(run()), 'event: delta\ndata: {"text": "Hel"}\n\n')
+            self.assertTrue(cancelled.wait(5))
+        self.assertEqual(metrics.get('claude.stream.cancelled'), before + 1)
+
+    @override_settings(LLM_RETRY_BASE_DELAY=0, LLM_RETRY_MAX_DELAY=0, LLM_MAX_RETRIES=2)
+    def test_stream_is_retried_only_until_the_first_delta(self):
+        def provider(fail_after_delta):
+            attempts = []
+
+            async def call(messages, model, system, cache_system, max_tokens, temperature, timeout, on_text):
+                attempts.append(timeout)
+                if len(attempts) == 1 and not fail_after_delta:
+                    raise llm.LLMOverloadedError('overloaded', llm.ANTHROPIC, retryable=True)
+                on_text('Hel')
+                if fail_after_delta:
+                    raise llm.LLMOverloadedError('overloaded', llm.ANTHROPIC, retryable=True)
+                return DONE
+            return call, attempts
+
+        call, attempts = provider(fail_after_delta=False)
+        with mock.patch.dict(llm._STREAMS, {llm.ANTHROPIC: call}), self.assertLogs('api.llm', 'WARNING'):
+            self.assertEqual(asyncio.run(llm.stream_async(self.messages, lambda text: None, timeout=5)), DONE)
+        self.assertEqual(len(attempts), 2)
+
+        call, attempts = provider(fail_after_delta=True)
+        with mock.patch.dict(llm._STREAMS, {llm.ANTHROPIC: call}), self.assertRaises(llm.LLMOverloadedError):
+            asyncio.run(llm.stream_async(self.messages, lambda text: None, timeout=5))
+        self.assertEqual(len(attempts), 1)
+
+    def test_view_negotiates_the_stream_format(self):
+        factory = APIRequestFactory()
+        view = claude.ClaudeAPIView.as_view()
+
+        def post(data, **headers):
+            return view(factory.post('/api/claude/', data, format='json', **headers))
+
+        with mock.patch.object(llm, 'is_configured', return_value=True), \
+                mock.patch.object(llm, 'stream_async', self.reply):
+            response = post({'messages': self.messages}, HTTP_ACCEPT='application/x-ndjson')
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+            async def body():
+                return ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+            self.assertEqual(json.loads(asyncio.run(body()).splitlines()[-1])['type'], 'done')
+            self.assertEqual(post({'messages': self.messages, 'stream': True})['Content-Type'], 'text/event-stream')
+
+        # Errors before the stream starts are one frame in the requested format
+        response = post({'messages': []}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.render().content, b'event: error\ndata: {"error": "Messages are required"}\n\n')
+
+        with mock.patch.object(llm, 'is_configured', return_value=False):
+            self.assertEqual(post({'messages': self.messages, 'stream': 'sse'}).status_code, 503)
+
+
+class ReplyTests(SimpleTestCase):
+    def test_reply_names_provider_and_model(self):
+        self.assertEqual(llm.Reply('{}', llm.OPENAI, 'gpt-4o').model_used, 'OpenAI gpt-4o')
+        self.assertEqual(llm.Reply('{}', llm.HACKCLUB).model_used, 'Hack Club AI Service')
+
+    def test_reply_survives_copy_and_pickle(self):
+        reply = llm.Reply('text', llm.ANTHROPIC, 'claude')
+        for copied in (copy.deepcopy(reply), pickle.loads(pickle.dumps(reply))):
+            self.assertEqual(copied, 'text')
+            self.assertEqual(copied.model_used, 'Anthropic claude')
+
+
+IMAGE_REPLY = {
+    'ai_likelihood_percentage': 82,
+    'ai_reasoning': 'Garbled text on the signs and six fingers on one hand.',
+    'ai_confidence': 'high',
+    'detected_artifacts': ['Garbled text on signs', 'Extra fingers'],
+    'image_quality_score': 64,
+    'authenticity_score': 20,
+}
+
+
+class ModelJSONTests(SimpleTestCase):
+    def parse(self, text, schema='ai_image_detection'):
+        return parse_model_json(text, schema)
+
+    def test_bare_object(self):
+        self.assertEqual(self.parse(f'  {json.dumps(IMAGE_REPLY, indent=2)}\n'), IMAGE_REPLY)
+
+    def test_fenced_object_with_prose_around_it(self):
+        text = f"Here's the analysis of the image:\n\n```json\n{json.dumps(IMAGE_REPLY, indent=2)}\n```\n\nNote: {{not definitive}}."
+        self.assertEqual(self.parse(text), IMAGE_REPLY)
+
+    def test_trailing_commas_are_repaired(self):
+        text = '{"ai_likelihood_percentage": 40, "detected_artifacts": ["Warped lines",], "ai_confidence": "low",}'
+        self.assertEqual(
+            self.parse(text),
+            {'ai_likelihood_percentage': 40, 'detected_artifacts': ['Warped lines'], 'ai_confidence': 'low'},
+        )
+
+    def test_truncated_reply_keeps_complete_members(self):
+        text = '```json\n{"credibility_score": 35, "fake_news_likelihood_percentage": 70, "key_claims": ["A", "B"], "red_flags": ["No auth'
+        self.assertEqual(
+            self.parse(text, 'fake_news_detection'),
+            {'credibility_score': 35, 'fake_news_likelihood_percentage': 70, 'key_claims': ['A', 'B']},
+        )
+
+    def test_fields_are_coerced_or_dropped(self):
+        text = '{"ai_likelihood_percentage": "87%", "ai_confidence": " High ", "image_quality_score": true, "authenticity_score": 140}'
+        self.assertEqual(
+            self.parse(text),
+            {'ai_likelihood_percentage': 87, 'ai_confidence': 'high', 'authenticity_score': 100},
+        )
+
+    def test_first_object_that_fits_the_schema_wins(self):
+        text = 'Format: {"example": true}\n{"ai_likelihood_percentage": 12}'
+        self.assertEqual(self.parse(text), {'ai_likelihood_percentage': 12})
+
+    def test_no_usable_object_raises(self):
+        for text in ("I'm sorry, I can't analyze this image.", '{"ai_reasoning": "unsure"}', ''):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                self.parse(text)
+
+    def test_items_reply(self):
+        text = '```json\n[{"id": "1", "ai_likelihood_percentage": 10, "fake_news_likelihood_percentage": 5},\n {"id": "2", "ai_likelihood_percentage": 90}]\n```'
+        self.assertEqual(list(parse_model_json_items(text, 'text_ai_detection')), ['1'])
+
+    def test_capture_appends_corpus_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'captured.jsonl')
+            with override_settings(MODEL_JSON_CAPTURE_PATH=path):
+                self.parse('{"ai_likelihood_percentage": 12}')
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(
+                    json.loads(f.read()),
+                    {'schema': 'ai_image_detection', 'response': '{"ai_likelihood_percentage": 12}'},
+                )
+
+    def test_fixture_corpus_parses_by_style(self):
+        with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'model_responses.jsonl'), encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip() and not line.startswith('#')]
+        for row in rows:
+            with self.subTest(schema=row['schema'], style=row['style']):
+                if row['style'] == 'refusal':
+                    with self.assertRaises(ValueError):
+                        parse_model_json(row['response'], row['schema'])
+                    continue
+                result = parse_model_json(row['response'], row['schema'])
+                if row['schema'] == 'fake_news_detection' and 'recommendation' in result:
+                    score = result['credibility_score']
+                    expected = 'trustworthy' if score >= 70 else 'questionable' if score >= 40 else 'likely_false'
+                    self.assertEqual(result['recommendation'], expected)
+
+
+SENTENCES = [f'Sentence number {i} of the article says something. ' for i in range(200)]
+
+
+@override_settings(TOKEN_BUDGET_HEAD_SHARE=0.7, LLM_CONTEXT_TOKENS={'default': 8192, 'openai': 128000, 'gpt-4o': 120000})
+class TokenBudgetTests(SimpleTestCase):
+    def setUp(self):
+        # The heuristic counter, so counts don't depend on whether tiktoken is installed
+        patcher = mock.patch.object(tokens, 'tiktoken', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_heuristic_counts(self):
+        self.assertEqual(tokens.count_tokens(''), 0)
+        self.assertEqual(tokens.count_tokens('abcd' * 10), 10)
+        # Multi-byte characters cost about a token each
+        self.assertGreaterEqual(tokens.count_tokens('日本語のテキスト'), 8)
+
+    def test_text_within_budget_is_unchanged(self):
+        text = ''.join(SENTENCES[:5])
+        self.assertEqual(tokens.fit_text(text, 1000), (text, tokens.count_tokens(text), tokens.count_tokens(text)))
+
+    def test_long_text_keeps_whole_sentences_from_both_ends(self):
+        text = ''.join(SENTENCES)
+        fitted, original, kept = tokens.fit_text(text, 300)
+        self.assertEqual(original, tokens.count_tokens(text))
+        self.assertLessEqual(kept, 300)
+        self.assertEqual(kept, tokens.count_tokens(fitted))
+        self.assertTrue(fitted.startswith(SENTENCES[0]))
+        self.assertTrue(fitted.endswith(SENTENCES[-1]))
+        self.assertIn('sentences omitted', fitted)
+        head, tail = fitted.split('sentences omitted')
+        # About head_share of the kept text comes from the start
+        self.assertGreater(len(head), len(tail))
+
+    def test_one_enormous_sentence_is_cut_at_a_word(self):
+        text = 'word ' * 2000
+        fitted, _, kept = tokens.fit_text(text, 100)
+        self.assertLessEqual(kept, 100)
+        self.assertTrue(fitted.startswith('word word'))
+
+    def test_context_window_uses_longest_model_prefix(self):
+        self.assertEqual(tokens.context_window('openai', 'gpt-4o-mini'), 120000)
+        self.assertEqual(tokens.context_window('openai', 'o1'), 128000)
+        self.assertEqual(tokens.context_window('unknown'), 8192)
+
+    def test_fit_prompt_fits_the_window_and_records_usage(self):
+        template = prompts.PromptTemplate('test_budget', prefix='Instructions. ' * 50, suffix='Text:\n{text}')
+        text = ''.join(SENTENCES)
+        with llm.track_usage() as usage:
+            prompt = tokens.fit_prompt(template, 'text', text, provider='default-provider', output_tokens=8000)
+        sent = tokens.count_tokens(prompt.system) + tokens.count_tokens(prompt.user)
+        self.assertLessEqual(sent, 8192 - 8000)
+        self.assertEqual(usage['input_tokens'], sent)
+        self.assertEqual(usage['input_tokens'] + usage['input_tokens_dropped'], tokens.count_tokens(prompt.system)
+                         + tokens.count_tokens(template.render(text='').user) + tokens.count_tokens(text))
+
+    def test_fit_prompt_respects_max_input_tokens(self):
+        template = prompts.PromptTemplate('test_budget', prefix='Instructions.', suffix='{text}')
+        prompt = tokens.fit_prompt(template, 'text', ''.join(SENTENCES), provider='openai', max_input_tokens=200)
+        self.assertLessEqual(tokens.count_tokens(prompt.user), 200)
+
+    def test_shorten_cuts_at_a_sentence(self):
+        self.assertEqual(tokens.shorten('First sentence here. Second one is longer.', 30), 'First sentence here. ...')
+        self.assertEqual(tokens.shorten('short', 30), 'short')
+
+
+class WebhookURLTests(SimpleTestCase):
+    def test_internal_addresses_are_refused(self):
+        for url in (
+            'http://127.0.0.1:8000/hook', 'http://10.1.2.3/hook', 'http://192.168.0.5/hook',
+            'http://169.254.169.254/latest/meta-data/', 'http://[::1]/hook', 'http://[::ffff:10.0.0.1]/hook',
+            'http://0.0.0.0/hook', 'ftp://8.8.8.8/hook',
+        ):
+            with self.subTest(url=url), self.assertRaises(ValueError):
+                jobs.check_webhook_url(url)
+
+    def test_public_address_is_accepted(self):
+        jobs.check_webhook_url('https://8.8.8.8/hook')
+
+    @override_settings(JOBS_WEBHOOK_ALLOWED_HOSTS=['127.0.0.1'])
+    def test_allowed_hosts_are_exempt(self):
+        jobs.check_webhook_url('http://127.0.0.1:8000/hook')
+
+
+@override_settings(SINGLE_FLIGHT_ENABLED=True, SINGLE_FLIGHT_CROSS_WORKER=False, SINGLE_FLIGHT_CACHE='default')
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.flight = SingleFlight('test')
+        self.calls = 0
+
+    def work(self, value='result', release=None):
+        def fn():
+            self.calls += 1
+            if release is not None:
+                release.wait(5)
+            return {'value': value}
+        return fn
+
+    def test_followers_share_the_leaders_call(self):
+        release = threading.Event()
+        outcomes = []
+
+        def call():
+            outcomes.append(self.flight.do('key', self.work(release=release), timeout=5))
+
+        followers = metrics.get('singleflight.test.follower')
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while metrics.get('singleflight.test.follower') < followers + 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(shared for _, shared in outcomes), [False, True, True, True, True])
+        self.assertTrue(all(result == {'value': 'result'} for result, _ in outcomes))
+        # Each caller gets its own copy
+        self.assertEqual(len({id(result) for result, _ in outcomes}), 5)
+
+    def test_leader_error_reaches_followers_and_is_not_kept(self):
+        def fail():
+            self.calls += 1
+            raise RuntimeError('upstream failed')
+
+        with self.assertRaises(RuntimeError):
+            self.flight.do('key', fail)
+        self.assertEqual(self.flight.do('key', self.work()), ({'value': 'result'}, False))
+        self.assertEqual(self.calls, 2)
+
+    def test_remembered_key_is_replayed(self):
+        self.flight.do('key', self.work('first'), remember=True)
+        result, shared = self.flight.do('key', self.work('second'), remember=True)
+        self.assertEqual((result, shared, self.calls), ({'value': 'first'}, True, 1))
+
+    def test_unremembered_result_is_not_replayed(self):
+        self.flight.do('key', self.work('first'), remember=True, should_remember=lambda result: False)
+        self.flight.do('key', self.work('second'))
+        result, _ = self.flight.do('key', self.work('third'), remember=True)
+        self.assertEqual((result, self.calls), ({'value': 'third'}, 3))
+
+    @override_settings(SINGLE_FLIGHT_CROSS_WORKER=True, SINGLE_FLIGHT_LOCK_TTL=120, SINGLE_FLIGHT_RESULT_GRACE=10)
+    def test_follower_finds_result_of_leader_that_already_finished(self):
+        # The other worker held the lock when we tried to take it, then finished before our first poll
+        cache = caches['default']
+        cache.set('singleflight:test:key:result', {'value': 'theirs'}, 10)
+        with mock.patch.object(cache, 'add', return_value=False):
+            result, shared = self.flight.do('key', self.work(), timeout=5)
+        self.assertEqual((result, shared, self.calls), ({'value': 'theirs'}, True, 0))
+
+    @override_settings(SINGLE_FLIGHT_CROSS_WORKER=True, SINGLE_FLIGHT_LOCK_TTL=120)
+    def test_follower_runs_at_once_when_leader_left_nothing(self):
+        cache = caches['default']
+        started = time.monotonic()
+        with mock.patch.object(cache, 'add', return_value=False):
+            result, shared = self.flight.do('key', self.work(), timeout=60)
+        self.assertEqual((result, shared, self.calls), ({'value': 'result'}, False, 1))
+        self.assertLess(time.monotonic() - started, 1)
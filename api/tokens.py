@@ -0,0 +1,164 @@
+"""
+Token-aware input budgeting.
+
+Inputs are fitted to the model's context window, minus the prompt around
+them and the tokens kept back for the reply, instead of being cut at a fixed
+number of characters. When text has to be trimmed it is cut at sentence
+boundaries and keeps its beginning and its end, so an article's or a paste's
+conclusion survives, with a marker saying how much was left out.
+
+Counting uses tiktoken when it is installed. Without it, a heuristic is
+used: about four characters per token for ASCII text, about one token per
+character beyond that (CJK, emoji). It is fast and slightly pessimistic for
+English. The counts of what was actually sent are added to the request's
+llm.track_usage() totals.
+"""
+import functools
+import math
+import re
+
+from django.conf import settings
+
+from . import llm
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# A sentence (or line) and the whitespace after it; joining the pieces gives back the text
+_SEGMENT_RE = re.compile(r'[^\n.!?]*(?:[.!?]+["\'”’)\]]*|\n|$)[ \t]*\n?')
+_OMITTED = "\n[... {count} sentences omitted to fit the model's context ...]\n"
+
+
+@functools.lru_cache(maxsize=16)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding('cl100k_base')
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+
+def tokenizer_name():
+    return 'tiktoken' if tiktoken is not None else 'heuristic'
+
+
+def count_tokens(text, model=None):
+    """Tokens in text for model (estimated when tiktoken is not installed)"""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    # Multi-byte characters cost about a token each; ASCII about a quarter
+    extra_bytes = len(text.encode('utf-8')) - len(text)
+    return math.ceil((len(text) - extra_bytes / 2) / 4 + extra_bytes / 2)
+
+
+def context_window(provider, model=None):
+    """Context size in tokens: the longest LLM_CONTEXT_TOKENS prefix of the model name, else the provider's"""
+    windows = settings.LLM_CONTEXT_TOKENS
+    if model:
+        matches = [name for name in windows if model.startswith(name)]
+        if matches:
+            return windows[max(matches, key=len)]
+    return windows.get(provider, windows['default'])
+
+
+def _segments(text):
+    return [segment for segment in _SEGMENT_RE.findall(text) if segment]
+
+
+def _hard_cut(text, max_tokens, model, from_end=False):
+    """Cut text without sentence boundaries (one enormous sentence), at a word boundary"""
+    if max_tokens <= 0:
+        return ''
+    total = count_tokens(text, model)
+    keep = int(len(text) * max_tokens / total)
+    while keep > 0:
+        piece = text[-keep:] if from_end else text[:keep]
+        if count_tokens(piece, model) <= max_tokens:
+            break
+        keep = int(keep * 0.9)
+    if keep <= 0:
+        return ''
+    if from_end:
+        space = text.find(' ', len(text) - keep)
+        return text[space + 1:] if space != -1 else text[-keep:]
+    space = text.rfind(' ', 0, keep)
+    return text[:space] if space > 0 else text[:keep]
+
+
+def fit_text(text, max_tokens, model=None, head_share=None):
+    """
+    Trim text to at most max_tokens, keeping whole sentences from the start
+    (head_share of the budget) and the end (the rest).
+    Returns (text, original_tokens, kept_tokens).
+    """
+    head_share = settings.TOKEN_BUDGET_HEAD_SHARE if head_share is None else head_share
+    total = count_tokens(text, model)
+    if total <= max_tokens:
+        return text, total, total
+
+    segments = _segments(text)
+    costs = [count_tokens(segment, model) for segment in segments]
+    budget = max(0, max_tokens - count_tokens(_OMITTED.format(count=len(segments)), model))
+
+    head, used = 0, 0
+    while head < len(segments) and used + costs[head] <= budget * head_share:
+        used += costs[head]
+        head += 1
+    tail, tail_used = len(segments), 0
+    while tail > head and used + tail_used + costs[tail - 1] <= budget:
+        tail -= 1
+        tail_used += costs[tail]
+
+    head_text = ''.join(segments[:head])
+    tail_text = ''.join(segments[tail:])
+    if not head_text:
+        # Not even the first sentence fits in the head's share: cut inside it
+        head_text = _hard_cut(segments[0], int(budget * head_share), model)
+        used = count_tokens(head_text, model)
+    if not tail_text and tail == len(segments) and len(segments) > head + 1:
+        tail_text = _hard_cut(segments[-1], budget - used, model, from_end=True)
+
+    trimmed = head_text.rstrip() + _OMITTED.format(count=max(1, tail - head)) + tail_text.lstrip()
+    return trimmed, total, count_tokens(trimmed, model)
+
+
+def fit_prompt(template, field, text, provider=llm.HACKCLUB, model=None, output_tokens=None,
+               max_input_tokens=None, **values):
+    """
+    Render a registered prompt template with `field` set to text, trimmed
+    so the whole prompt fits the model's context window less output_tokens
+    (and at most max_input_tokens of text, when given). The counts go into
+    the request's track_usage() totals.
+    """
+    output_tokens = settings.LLM_OUTPUT_RESERVE_TOKENS if output_tokens is None else output_tokens
+    empty = template.render(**{field: ''}, **values)
+    overhead = count_tokens(empty.system, model) + count_tokens(empty.user, model)
+    budget = context_window(provider, model) - overhead - output_tokens
+    if max_input_tokens is not None:
+        budget = min(budget, max_input_tokens)
+
+    fitted, original, kept = fit_text(text, max(0, budget), model)
+    llm.record_input_tokens(overhead + kept, original - kept)
+    return template.render(**{field: fitted}, **values)
+
+
+def measure_prompt(prompt, model=None):
+    """Record the size of a prompt that is sent untrimmed (its parts are already bounded)"""
+    sent = count_tokens(prompt.system, model) + count_tokens(prompt.user, model)
+    llm.record_input_tokens(sent, 0)
+    return prompt
+
+
+def shorten(text, max_chars, suffix='...'):
+    """Cut text for display at a sentence (or failing that, word) boundary within max_chars"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = max(cut.rfind('. '), cut.rfind('! '), cut.rfind('? '), cut.rfind('\n'))
+    if sentence_end >= max_chars // 2:
+        return cut[:sentence_end + 1].rstrip() + ' ' + suffix
+    space = cut.rfind(' ')
+    return (cut[:space] if space >= max_chars // 2 else cut).rstrip() + suffix
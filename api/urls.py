@@ -1,15 +1,21 @@
 from django.urls import path, include
 from . import views
-# from .claude import ClaudeAPIView  # Temporarily commented out due to missing anthropic dependency
+# The anthropic package is optional: without it (or ANTHROPIC_API_KEY) the endpoint answers 503
+from .claude import ClaudeAPIView
 
 app_name = 'api'
 
 urlpatterns = [
     path('health/', views.health_check, name='health-check'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('jobs/', views.submit_job, name='job-submit'),
+    path('jobs/<uuid:job_id>/', views.job_detail, name='job-detail'),
+    path('results/', views.result_history, name='result-history'),
+    path('results/<uuid:result_id>/', views.result_detail, name='result-detail'),
     # AI Detection Services under API
     path('ai-image-detection/', include('ai_image_detection.urls')),
     path('fake-news-detection/', include('fake_news_detection.urls')),
-    # path('claude/', ClaudeAPIView.as_view(), name='claude-api'),  # Temporarily commented out
+    path('claude/', ClaudeAPIView.as_view(), name='claude-api'),
 ]
 
 
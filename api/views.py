@@ -1,7 +1,16 @@
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.urls import reverse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 
+from . import jobs, metrics, results
+from .models import Job
+
 @api_view(['GET'])
 def health_check(request):
     """
@@ -15,3 +24,141 @@ def health_check(request):
         },
         status=status.HTTP_200_OK
     )
+
+
+@api_view(['GET'])
+def metrics_view(request):
+    """
+    Counters and gauges for the worker process that served this request
+    """
+    return Response(metrics.snapshot(), status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+def submit_job(request):
+    """
+    Queue a long analysis and return its id at once (202)
+
+    Expected request body:
+    {
+        "type": "fake_news_detection",  // or text_ai_detection(_batch), ai_image_detection, scam_detection
+        "input": {"url": "https://..."},  // what the detector's own endpoint takes
+        "priority": 0,  // optional, -10..10, higher runs first
+        "webhook_url": "https://..."  // optional, gets the finished job POSTed to it
+    }
+    """
+    kind = request.data.get('type')
+    payload = request.data.get('input')
+    priority = request.data.get('priority', 0)
+    webhook_url = request.data.get('webhook_url') or ''
+    
+    if kind not in jobs.kinds():
+        return Response(
+            {'error': f"type must be one of: {', '.join(jobs.kinds())}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not isinstance(payload, dict) or not payload:
+        return Response({'error': 'input must be a non-empty object'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(priority, int) or isinstance(priority, bool) or not -10 <= priority <= 10:
+        return Response({'error': 'priority must be an integer from -10 to 10'}, status=status.HTTP_400_BAD_REQUEST)
+    if webhook_url:
+        try:
+            URLValidator(schemes=['http', 'https'])(webhook_url)
+        except ValidationError:
+            return Response({'error': 'webhook_url must be an http(s) URL'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Not an address on our own network (loopback, private, link-local metadata services)
+            jobs.check_webhook_url(webhook_url)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if jobs.queued_count() >= settings.JOBS_MAX_QUEUED:
+        metrics.incr('jobs.rejected')
+        retry_after = str(int(settings.JOBS_POLL_INTERVAL * 30))
+        return Response(
+            {'error': 'Too many jobs are waiting, please try again later'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': retry_after}
+        )
+    
+    job = jobs.submit(kind, payload, priority=priority, webhook_url=webhook_url)
+    status_url = request.build_absolute_uri(reverse('api:job-detail', args=[job.id]))
+    return Response(
+        {'job_id': str(job.id), 'status': job.status, 'status_url': status_url},
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': status_url}
+    )
+
+
+@api_view(['GET', 'DELETE'])
+def job_detail(request, job_id):
+    """
+    GET: a job's status, and its result once finished
+    DELETE: cancel a job that hasn't started yet
+    """
+    # Jobs left in the queue by a restart are resumed as soon as anyone asks after them
+    jobs.ensure_workers()
+    if request.method == 'DELETE':
+        if jobs.cancel(job_id):
+            return Response({'job_id': str(job_id), 'status': Job.CANCELLED}, status=status.HTTP_200_OK)
+        if not Job.objects.filter(id=job_id).exists():
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'error': 'Only queued jobs can be cancelled'}, status=status.HTTP_409_CONFLICT)
+    
+    job = Job.objects.filter(id=job_id).first()
+    if job is None:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(jobs.as_dict(job), status=status.HTTP_200_OK)
+
+
+RESULT_FIELDS = ('id', 'detector', 'input_hash', 'domain', 'created_at', 'result')
+# Stored bodies include the submitted text, so the history lists only where to find them
+HISTORY_FIELDS = ('id', 'detector', 'input_hash', 'domain', 'created_at')
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def result_history(request):
+    """
+    Stored analyses, newest first, paginated (PAGE_SIZE per page); staff only,
+    and without the result bodies (fetch those from result_detail)
+
+    Optional filters: ?detector=text_ai_detection (or fake_news_detection,
+    ai_image_detection, scam_detection), ?domain=example.com, ?input_hash=<sha256>
+    """
+    models = results.result_models()
+    detector = request.query_params.get('detector')
+    if detector:
+        if detector not in models:
+            return Response(
+                {'error': f"detector must be one of: {', '.join(sorted(models))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        models = {detector: models[detector]}
+    
+    filters = {}
+    for field in ('domain', 'input_hash'):
+        if request.query_params.get(field):
+            filters[field] = request.query_params[field]
+    
+    # Each detector has its own table; their rows are merged (the parts of a UNION can't be ordered)
+    querysets = [model.objects.filter(**filters).order_by().values(*HISTORY_FIELDS) for model in models.values()]
+    history = querysets[0].union(*querysets[1:], all=True) if len(querysets) > 1 else querysets[0]
+    history = history.order_by('-created_at')
+    
+    paginator = PageNumberPagination()
+    page = paginator.paginate_queryset(history, request)
+    return paginator.get_paginated_response([{**row, 'id': str(row['id'])} for row in page])
+
+
+@api_view(['GET'])
+def result_detail(request, result_id):
+    """
+    One stored analysis, by the result_id the detector's response carried
+    (a random UUID, so only whoever got that response can look it up)
+    """
+    for model in results.result_models().values():
+        row = model.objects.filter(id=result_id).values(*RESULT_FIELDS).first()
+        if row is not None:
+            return Response({**row, 'id': str(row['id'])}, status=status.HTTP_200_OK)
+    return Response({'error': 'Result not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -92,12 +92,18 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# Database - Using SQLite for local development only
-# No database needed for production since this is a stateless API
+# Database - SQLite, holding the claim cache and the job queue (api/jobs.py)
+# WAL lets job workers in other processes write while requests read; IMMEDIATE transactions take
+# the write lock up front instead of failing with "database is locked" halfway through
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -200,3 +206,273 @@ if not DEBUG:
     USE_TZ = True
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
+
+# Outbound HTTP
+# Each worker process keeps one event loop and one pooled httpx client (see api/runtime.py)
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+# Threads available to the event loop for blocking work (asyncio.to_thread)
+ASYNC_RUNTIME_THREADS = int(os.getenv('ASYNC_RUNTIME_THREADS', '32'))
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv('HTTP_POOL_MAX_CONNECTIONS', '50'))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv('HTTP_POOL_MAX_KEEPALIVE', '20'))
+HTTP_POOL_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_POOL_KEEPALIVE_EXPIRY', '60'))
+
+# LLM gateway (api/llm.py)
+# LLM_TIMEOUT bounds a whole call including retries; callers with a request deadline pass less
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5'))
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '4'))
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '50'))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '20'))
+LLM_DEFAULT_MAX_TOKENS = int(os.getenv('LLM_DEFAULT_MAX_TOKENS', '1000'))
+# Append every model response api/model_json.py parses to this file (bench_json_parsing's corpus format).
+# Off by default: responses quote the analysed content
+MODEL_JSON_CAPTURE_PATH = os.getenv('MODEL_JSON_CAPTURE_PATH', '')
+# Streamed replies (the Claude endpoint) may run longer; LLM_TIMEOUT then bounds each wait for a chunk
+LLM_STREAM_TIMEOUT = float(os.getenv('LLM_STREAM_TIMEOUT', '120'))
+HACKCLUB_AI_URL = os.getenv('HACKCLUB_AI_URL', 'https://ai.hackclub.com/chat/completions')
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o')
+ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL', 'claude-3-5-sonnet-20240620')
+# Ordered providers per detector ('provider' or 'provider:model', comma separated). Later entries
+# get a hedged request when the first is slower than its rolling p95 on that route (good replies
+# only), and take over on outages; a single-provider route never hedges. Providers without an API
+# key are skipped. Image and scam prompts use OpenAI-style image input.
+LLM_ROUTES = {
+    'fact_check': os.getenv('FACT_CHECK_LLM_ROUTE', 'hackclub,openai').split(','),
+    'text_ai_detection': os.getenv('TEXT_LLM_ROUTE', 'hackclub,openai').split(','),
+    'ai_image_detection': os.getenv('IMAGE_LLM_ROUTE', 'openai:gpt-4o').split(','),
+    'scam_detection': os.getenv('SCAM_LLM_ROUTE', 'openai:gpt-4o').split(','),
+}
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'True') == 'True'
+LLM_HEDGE_QUANTILE = float(os.getenv('LLM_HEDGE_QUANTILE', '0.95'))
+# Until a provider has this many latency samples on a route, hedge after LLM_HEDGE_DEFAULT_DELAY seconds
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv('LLM_HEDGE_DEFAULT_DELAY', '10'))
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '1'))
+# Providers failing this many times in a row are skipped for LLM_BREAKER_COOLDOWN seconds (doubling)
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+LLM_BREAKER_MAX_COOLDOWN = float(os.getenv('LLM_BREAKER_MAX_COOLDOWN', '300'))
+
+# Bulkheads (api/bulkhead.py): concurrent calls per LLM provider and per detector view adapt between
+# MIN_LIMIT and MAX_LIMIT (AIMD on errors and latency); up to QUEUE callers wait at most MAX_WAIT
+# seconds for a slot, the rest get 503 + Retry-After straight away
+BULKHEAD_ENABLED = os.getenv('BULKHEAD_ENABLED', 'True') == 'True'
+BULKHEAD_PROVIDER_LIMIT = int(os.getenv('BULKHEAD_PROVIDER_LIMIT', '16'))
+BULKHEAD_PROVIDER_MIN_LIMIT = int(os.getenv('BULKHEAD_PROVIDER_MIN_LIMIT', '2'))
+BULKHEAD_PROVIDER_MAX_LIMIT = int(os.getenv('BULKHEAD_PROVIDER_MAX_LIMIT', '64'))
+BULKHEAD_PROVIDER_QUEUE = int(os.getenv('BULKHEAD_PROVIDER_QUEUE', '32'))
+BULKHEAD_PROVIDER_MAX_WAIT = float(os.getenv('BULKHEAD_PROVIDER_MAX_WAIT', '5'))
+# Per worker process. Under the ASGI server each sync detector request holds a thread while it waits on the
+# model (the SSE stream holds none but shares the fake_news_detection limit), so these also cap those threads
+BULKHEAD_DETECTOR_LIMIT = int(os.getenv('BULKHEAD_DETECTOR_LIMIT', '4'))
+BULKHEAD_DETECTOR_MIN_LIMIT = int(os.getenv('BULKHEAD_DETECTOR_MIN_LIMIT', '1'))
+BULKHEAD_DETECTOR_MAX_LIMIT = int(os.getenv('BULKHEAD_DETECTOR_MAX_LIMIT', '16'))
+BULKHEAD_DETECTOR_QUEUE = int(os.getenv('BULKHEAD_DETECTOR_QUEUE', '8'))
+BULKHEAD_DETECTOR_MAX_WAIT = float(os.getenv('BULKHEAD_DETECTOR_MAX_WAIT', '2'))
+# A call slower than this many times the usual latency counts against the limit, like an error
+BULKHEAD_LATENCY_TOLERANCE = float(os.getenv('BULKHEAD_LATENCY_TOLERANCE', '2'))
+BULKHEAD_DECREASE_FACTOR = float(os.getenv('BULKHEAD_DECREASE_FACTOR', '0.7'))
+
+# Token budgeting (api/tokens.py)
+# Context windows in tokens, by provider or model name prefix; inputs are trimmed to fit
+LLM_CONTEXT_TOKENS = {
+    'default': 8192,
+    'hackclub': int(os.getenv('HACKCLUB_CONTEXT_TOKENS', '32768')),
+    'openai': 128000,
+    'anthropic': 200000,
+    'gpt-4o': 128000,
+    'claude-3': 200000,
+}
+# Kept back for the model's reply when fitting the prompt
+LLM_OUTPUT_RESERVE_TOKENS = int(os.getenv('LLM_OUTPUT_RESERVE_TOKENS', '1500'))
+# Share of a trimmed input taken from its beginning; the rest comes from its end
+TOKEN_BUDGET_HEAD_SHARE = float(os.getenv('TOKEN_BUDGET_HEAD_SHARE', '0.7'))
+# Caps on article/pasted text sent in one call, below the context window (cost control)
+FACT_CHECK_MAX_INPUT_TOKENS = int(os.getenv('FACT_CHECK_MAX_INPUT_TOKENS', '4000'))
+TEXT_MAX_INPUT_TOKENS = int(os.getenv('TEXT_MAX_INPUT_TOKENS', '6000'))
+
+# Caches
+# 'articles' holds extraction results keyed by canonical URL (fake_news_detection/article_cache.py).
+# Entries are served directly for ARTICLE_CACHE_TTL seconds, then revalidated with a
+# conditional GET; they are kept for revalidation for up to ARTICLE_CACHE_RETAIN seconds.
+ARTICLE_CACHE_TTL = int(os.getenv('ARTICLE_CACHE_TTL', '900'))
+ARTICLE_CACHE_RETAIN = int(os.getenv('ARTICLE_CACHE_RETAIN', '86400'))
+ARTICLE_CACHE_MAX_ENTRIES = int(os.getenv('ARTICLE_CACHE_MAX_ENTRIES', '2000'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'articles': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'articles',
+        'TIMEOUT': ARTICLE_CACHE_RETAIN,
+        'OPTIONS': {
+            'MAX_ENTRIES': ARTICLE_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    # Visible to every worker process on the host
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SHARED_CACHE_DIR', str(BASE_DIR / 'var' / 'shared-cache')),
+        'TIMEOUT': 600,
+    },
+}
+
+# Single-flight coalescing of identical in-flight analyses (api/singleflight.py)
+SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True') == 'True'
+# Also coalesce across the workers on this host, through the 'shared' cache
+SINGLE_FLIGHT_CROSS_WORKER = os.getenv('SINGLE_FLIGHT_CROSS_WORKER', 'False') == 'True'
+SINGLE_FLIGHT_CACHE = 'shared' if SINGLE_FLIGHT_CROSS_WORKER else 'default'
+SINGLE_FLIGHT_LOCK_TTL = int(os.getenv('SINGLE_FLIGHT_LOCK_TTL', '120'))
+SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv('SINGLE_FLIGHT_POLL_INTERVAL', '0.1'))
+# A cross-worker leader's result stays readable this long after it finishes, for followers between polls
+SINGLE_FLIGHT_RESULT_GRACE = int(os.getenv('SINGLE_FLIGHT_RESULT_GRACE', '10'))
+# How long results of requests sent with an Idempotency-Key are kept for retries
+SINGLE_FLIGHT_IDEMPOTENCY_TTL = int(os.getenv('SINGLE_FLIGHT_IDEMPOTENCY_TTL', '600'))
+
+# Article fetching
+# Bodies are streamed and cut off after ARTICLE_MAX_BYTES (decoded) bytes
+ARTICLE_MAX_BYTES = int(os.getenv('ARTICLE_MAX_BYTES', str(2 * 1024 * 1024)))
+# The download stops early once an <article>/<main> holding this much text has closed
+ARTICLE_EARLY_STOP_MIN_CHARS = int(os.getenv('ARTICLE_EARLY_STOP_MIN_CHARS', '1500'))
+# Bodies declared smaller than this are read whole, without the early-stop parse
+ARTICLE_EARLY_STOP_MIN_BYTES = int(os.getenv('ARTICLE_EARLY_STOP_MIN_BYTES', str(256 * 1024)))
+# Extraction engine: 'bs4' (selector cascade) or 'lxml' (single-pass XPath), see fake_news_detection/extraction.py
+ARTICLE_EXTRACTOR = os.getenv('ARTICLE_EXTRACTOR', 'bs4')
+# Skip the DOM walk when JSON-LD carries an articleBody of at least this many words
+STRUCTURED_DATA_MIN_WORDS = int(os.getenv('STRUCTURED_DATA_MIN_WORDS', '150'))
+# Strategies tried for unknown domains (comma-separated, from fake_news_detection/extraction.py);
+# empty means 'jsonld', the ARTICLE_EXTRACTOR engine, then 'boilerpy3'
+EXTRACTION_STRATEGIES = [name for name in os.getenv('EXTRACTION_STRATEGIES', '').split(',') if name]
+# A DOM strategy result counts as good (and ends the search) at this many words
+EXTRACTION_MIN_WORDS = int(os.getenv('EXTRACTION_MIN_WORDS', '100'))
+# Learned per-domain strategy index (fake_news_detection/domain_templates.py)
+EXTRACTION_TEMPLATES_PATH = os.getenv('EXTRACTION_TEMPLATES_PATH', os.path.join(BASE_DIR, 'var', 'extraction_templates.json'))
+EXTRACTION_TEMPLATES_MAX_DOMAINS = int(os.getenv('EXTRACTION_TEMPLATES_MAX_DOMAINS', '1000'))
+EXTRACTION_TEMPLATES_SAVE_INTERVAL = int(os.getenv('EXTRACTION_TEMPLATES_SAVE_INTERVAL', '30'))
+
+# Batch URL analysis (/fake-news-detection/analyze/batch/)
+NEWS_BATCH_MAX_URLS = int(os.getenv('NEWS_BATCH_MAX_URLS', '500'))
+NEWS_BATCH_CONCURRENCY = int(os.getenv('NEWS_BATCH_CONCURRENCY', '16'))
+# Requests in flight to any single news domain, to stay under publishers' bot limits
+NEWS_BATCH_PER_DOMAIN_CONCURRENCY = int(os.getenv('NEWS_BATCH_PER_DOMAIN_CONCURRENCY', '2'))
+
+# Batch text analysis (/text-ai-detection/analyze/batch/, text_ai_detection/batching.py)
+TEXT_BATCH_MAX_ITEMS = int(os.getenv('TEXT_BATCH_MAX_ITEMS', '500'))
+# Texts packed into one LLM call: at most TEXT_BATCH_PACK_ITEMS of them, TEXT_BATCH_PACK_TOKENS of text
+TEXT_BATCH_PACK_ITEMS = int(os.getenv('TEXT_BATCH_PACK_ITEMS', '10'))
+TEXT_BATCH_PACK_TOKENS = int(os.getenv('TEXT_BATCH_PACK_TOKENS', '1500'))
+# Reply budget per packed text (a call's max_tokens is this times its number of texts)
+TEXT_BATCH_OUTPUT_TOKENS_PER_ITEM = int(os.getenv('TEXT_BATCH_OUTPUT_TOKENS_PER_ITEM', '150'))
+# Packed calls in flight per batch, and each one's timeout
+TEXT_BATCH_CONCURRENCY = int(os.getenv('TEXT_BATCH_CONCURRENCY', '8'))
+TEXT_BATCH_CALL_TIMEOUT = float(os.getenv('TEXT_BATCH_CALL_TIMEOUT', '60'))
+# Times texts missing from a packed reply are sent again before they are reported as failed
+TEXT_BATCH_RETRIES = int(os.getenv('TEXT_BATCH_RETRIES', '1'))
+
+# Fact-checking
+# Articles longer than FACT_CHECK_CHUNK_CHARS are split on paragraph boundaries and checked
+# map-reduce style (fake_news_detection/chunked_fact_check.py) instead of being truncated
+FACT_CHECK_CHUNKED = os.getenv('FACT_CHECK_CHUNKED', 'True') == 'True'
+FACT_CHECK_CHUNK_CHARS = int(os.getenv('FACT_CHECK_CHUNK_CHARS', '15000'))
+# Upper bound on concurrent chunk calls per article; chunks grow beyond FACT_CHECK_CHUNK_CHARS to fit
+FACT_CHECK_MAX_CHUNKS = int(os.getenv('FACT_CHECK_MAX_CHUNKS', '6'))
+
+# Fetch failure handling (api/resilience.py)
+# Domains that answered 403 get the 'blocked' response without a fetch for this long
+FETCH_BLOCKED_TTL = int(os.getenv('FETCH_BLOCKED_TTL', '3600'))
+# Retries of timeouts/5xx/429 back off exponentially with full jitter
+FETCH_RETRY_BASE_DELAY = float(os.getenv('FETCH_RETRY_BASE_DELAY', '0.5'))
+FETCH_RETRY_MAX_DELAY = float(os.getenv('FETCH_RETRY_MAX_DELAY', '8'))
+# Give up instead of waiting when a 429's Retry-After asks for longer than this
+FETCH_RETRY_AFTER_MAX = float(os.getenv('FETCH_RETRY_AFTER_MAX', '10'))
+# Per-host circuit breaker: open after this many consecutive retryable failures...
+FETCH_BREAKER_FAILURES = int(os.getenv('FETCH_BREAKER_FAILURES', '5'))
+# ...for this many seconds, doubling on each failed probe up to FETCH_BREAKER_MAX_COOLDOWN
+FETCH_BREAKER_COOLDOWN = float(os.getenv('FETCH_BREAKER_COOLDOWN', '30'))
+FETCH_BREAKER_MAX_COOLDOWN = float(os.getenv('FETCH_BREAKER_MAX_COOLDOWN', '600'))
+
+# Request deadlines
+# End-to-end budget for one /analyze/ request (fetch, extraction and fact-check), and for a
+# whole batch. With uvicorn workers gunicorn's --timeout only watches worker heartbeats and never
+# ends a slow request, so this is what bounds one; keep it below the frontend's and proxy's timeouts
+ANALYZE_DEADLINE_SECONDS = float(os.getenv('ANALYZE_DEADLINE_SECONDS', '90'))
+# Image and screenshot (vision) calls take 20-60s, so instead of LLM_TIMEOUT they get most of that budget
+AI_IMAGE_TIMEOUT = float(os.getenv('AI_IMAGE_TIMEOUT', str(ANALYZE_DEADLINE_SECONDS - 10)))
+# Part of the budget the fetch stage may not use, so the fact-check always gets a turn
+FACT_CHECK_RESERVE_SECONDS = float(os.getenv('FACT_CHECK_RESERVE_SECONDS', '35'))
+# Below this much remaining time the fact-check is skipped and a degraded result returned
+FACT_CHECK_MIN_SECONDS = float(os.getenv('FACT_CHECK_MIN_SECONDS', '5'))
+# Idle interval after which an SSE analysis stream sends a keepalive comment
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', '15'))
+
+# Jobs (api/jobs.py): POST /api/jobs/ queues an analysis in the database and returns at once
+# Worker threads per web process; 0 leaves the queue to `manage.py run_jobs` processes
+JOBS_IN_PROCESS_WORKERS = int(os.getenv('JOBS_IN_PROCESS_WORKERS', '2'))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1'))
+# New jobs get 503 + Retry-After while this many are waiting
+JOBS_MAX_QUEUED = int(os.getenv('JOBS_MAX_QUEUED', '500'))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '3'))
+JOBS_RETRY_BASE_DELAY = float(os.getenv('JOBS_RETRY_BASE_DELAY', '5'))
+JOBS_RETRY_MAX_DELAY = float(os.getenv('JOBS_RETRY_MAX_DELAY', '120'))
+# Jobs not started within JOBS_TTL seconds expire; finished ones are deleted after JOBS_RESULT_TTL
+JOBS_TTL = int(os.getenv('JOBS_TTL', '3600'))
+JOBS_RESULT_TTL = int(os.getenv('JOBS_RESULT_TTL', '86400'))
+JOBS_PRUNE_INTERVAL = float(os.getenv('JOBS_PRUNE_INTERVAL', '300'))
+# A running job is presumed lost (worker died) and queued again after this long
+JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', '600'))
+# Jobs are not behind the proxy's request timeout, so fake-news checks get a longer budget
+JOBS_ANALYZE_DEADLINE_SECONDS = float(os.getenv('JOBS_ANALYZE_DEADLINE_SECONDS', '180'))
+JOBS_WEBHOOK_TIMEOUT = float(os.getenv('JOBS_WEBHOOK_TIMEOUT', '10'))
+JOBS_WEBHOOK_ATTEMPTS = int(os.getenv('JOBS_WEBHOOK_ATTEMPTS', '3'))
+# When set, webhook bodies are signed: X-NoCap-Signature: sha256=<HMAC-SHA256 of the body>
+JOBS_WEBHOOK_SECRET = os.getenv('JOBS_WEBHOOK_SECRET', '')
+# Webhook hosts must resolve to public addresses; hosts listed here (comma-separated) are exempt
+JOBS_WEBHOOK_ALLOWED_HOSTS = [host.strip().lower() for host in os.getenv('JOBS_WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()]
+
+# Analysis result store (api/results.py): successful analyses are kept per detector
+RESULTS_STORE_ENABLED = os.getenv('RESULTS_STORE_ENABLED', 'True') == 'True'
+# The same input analysed again within RESULTS_REUSE_TTL seconds gets the stored result (0: never)
+RESULTS_REUSE_TTL = int(os.getenv('RESULTS_REUSE_TTL', '3600'))
+# Stored results are deleted after RESULTS_TTL seconds
+RESULTS_TTL = int(os.getenv('RESULTS_TTL', str(30 * 24 * 3600)))
+RESULTS_PRUNE_INTERVAL = float(os.getenv('RESULTS_PRUNE_INTERVAL', '3600'))
+# Rows are written in the background, up to RESULTS_WRITE_BATCH per INSERT, at most
+# RESULTS_WRITE_INTERVAL seconds after the analysis; beyond RESULTS_WRITE_QUEUE waiting rows, new ones are dropped
+RESULTS_WRITE_BATCH = int(os.getenv('RESULTS_WRITE_BATCH', '100'))
+RESULTS_WRITE_INTERVAL = float(os.getenv('RESULTS_WRITE_INTERVAL', '1'))
+RESULTS_WRITE_QUEUE = int(os.getenv('RESULTS_WRITE_QUEUE', '5000'))
+
+# Near-duplicate articles (fake_news_detection/near_duplicates.py)
+# A new article whose MinHash similarity to one fact-checked within NEAR_DUPLICATE_TTL seconds
+# reaches NEAR_DUPLICATE_THRESHOLD reuses that result (source_reliability is recomputed per domain)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.8'))
+NEAR_DUPLICATE_TTL = int(os.getenv('NEAR_DUPLICATE_TTL', '86400'))
+# Articles shorter than this are always checked on their own
+NEAR_DUPLICATE_MIN_WORDS = int(os.getenv('NEAR_DUPLICATE_MIN_WORDS', '100'))
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES', '5000'))
+NEAR_DUPLICATE_INDEX_PATH = os.getenv('NEAR_DUPLICATE_INDEX_PATH', os.path.join(BASE_DIR, 'var', 'near_duplicates.json'))
+NEAR_DUPLICATE_SAVE_INTERVAL = int(os.getenv('NEAR_DUPLICATE_SAVE_INTERVAL', '30'))
+
+# Claim verdict cache (fake_news_detection/claim_cache.py)
+# Stored verdicts younger than CLAIM_CACHE_TTL are given to fact-check prompts as hints, in place of their sentences
+CLAIM_CACHE_TTL = int(os.getenv('CLAIM_CACHE_TTL', str(7 * 24 * 3600)))
+# Shorter sentences are not treated as claims
+CLAIM_CACHE_MIN_WORDS = int(os.getenv('CLAIM_CACHE_MIN_WORDS', '6'))
+# Sentences kept either side of each novel claim when known claims are left out of the article
+CLAIM_CACHE_CONTEXT_SENTENCES = int(os.getenv('CLAIM_CACHE_CONTEXT_SENTENCES', '1'))
+# Hit counts of cached verdicts are written to the database at most this often (seconds)
+CLAIM_CACHE_HIT_FLUSH_INTERVAL = int(os.getenv('CLAIM_CACHE_HIT_FLUSH_INTERVAL', '60'))
+
+# Content quality gate (fake_news_detection/quality_gate.py)
+# Extractions failing any check get an 'insufficient_content' (422) response without an LLM call
+QUALITY_GATE_ENABLED = os.getenv('QUALITY_GATE_ENABLED', 'True') == 'True'
+QUALITY_MIN_WORDS = int(os.getenv('QUALITY_MIN_WORDS', '80'))
+QUALITY_MAX_BOILERPLATE_RATIO = float(os.getenv('QUALITY_MAX_BOILERPLATE_RATIO', '0.6'))
+QUALITY_MAX_LINK_DENSITY = float(os.getenv('QUALITY_MAX_LINK_DENSITY', '0.5'))
+# Consent/paywall wording only rejects texts shorter than this (real articles may mention cookies)
+QUALITY_BLOCKER_MAX_WORDS = int(os.getenv('QUALITY_BLOCKER_MAX_WORDS', '400'))
@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ClaimVerdict, NewsAnalysis
+
+
+@admin.register(ClaimVerdict)
+class ClaimVerdictAdmin(admin.ModelAdmin):
+    list_display = ('claim', 'verdict', 'hits', 'updated_at')
+    list_filter = ('verdict',)
+    search_fields = ('claim',)
+
+
+@admin.register(NewsAnalysis)
+class NewsAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('url', 'domain', 'created_at')
+    list_filter = ('domain',)
+    search_fields = ('url',)
+    readonly_fields = ('result',)
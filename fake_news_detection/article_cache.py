@@ -0,0 +1,129 @@
+"""
+Cache of article extraction results keyed by canonical URL.
+
+Entries live in the 'articles' Django cache (size-bounded LRU by default).
+Each entry remembers the response's ETag/Last-Modified so that, once its
+freshness TTL has passed, the article can be revalidated with a conditional
+GET; a 304 reuses the stored extraction without downloading or parsing the
+page again.
+"""
+import hashlib
+import re
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api import metrics
+
+# Query parameters that never change the article being served
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'gclsrc', 'msclkid', 'yclid', 'twclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', 'ocid', 'cmpid', 'smid', 'sr_share',
+}
+AMP_PARAMS = {'amp', 'outputtype'}
+AMP_PATH_RE = re.compile(r'/amp/?$|\.amp(?=(?:\.html?)?$)', re.IGNORECASE)
+
+
+def _cache():
+    return caches['articles']
+
+
+def _key(prefix, canonical_url):
+    return f"{prefix}:{hashlib.sha1(canonical_url.encode('utf-8')).hexdigest()}"
+
+
+def canonicalize_url(url):
+    """
+    Normalise a URL so that tracking and AMP variants of the same article
+    share a cache entry
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'https'
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+
+    # Drop AMP suffixes: /story/amp, /story.amp, /story.amp.html
+    path = AMP_PATH_RE.sub('', parts.path) or '/'
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith('utm_')
+        and k.lower() not in TRACKING_PARAMS
+        and k.lower() not in AMP_PARAMS
+    ]
+    query.sort()
+
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def lookup(url):
+    """
+    Return (canonical_url, entry) for a requested URL. Follows the redirect
+    alias recorded on the first fetch so short links resolve to the article.
+    """
+    canonical = canonicalize_url(url)
+    cache = _cache()
+    target = cache.get(_key('article-alias', canonical)) or canonical
+    return canonical, cache.get(_key('article', target))
+
+
+def is_fresh(entry):
+    return entry is not None and entry['fresh_until'] > time.time()
+
+
+def conditional_headers(entry):
+    """Validators to send with a revalidation request"""
+    if not entry:
+        return {}
+    headers = {}
+    if entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def cached_result(entry, url):
+    """The stored extraction, re-labelled with the URL the user asked for"""
+    return {**entry['data'], 'url': url}
+
+
+def store(url, final_url, data, response_headers):
+    """
+    Cache a successful extraction under the canonical form of the final
+    (post-redirect) URL, aliasing the requested URL to it
+    """
+    canonical = canonicalize_url(url)
+    final_canonical = canonicalize_url(final_url)
+    cache = _cache()
+
+    entry = {
+        'final_url': final_url,
+        'data': data,
+        'etag': response_headers.get('etag'),
+        'last_modified': response_headers.get('last-modified'),
+        'fresh_until': time.time() + settings.ARTICLE_CACHE_TTL,
+    }
+    cache.set(_key('article', final_canonical), entry)
+    if final_canonical != canonical:
+        cache.set(_key('article-alias', canonical), final_canonical)
+
+
+def refresh(entry, response_headers):
+    """Extend a revalidated (304) entry's freshness"""
+    entry = {
+        **entry,
+        'etag': response_headers.get('etag') or entry.get('etag'),
+        'last_modified': response_headers.get('last-modified') or entry.get('last_modified'),
+        'fresh_until': time.time() + settings.ARTICLE_CACHE_TTL,
+    }
+    _cache().set(_key('article', canonicalize_url(entry['final_url'])), entry)
+    return entry
+
+
+def record(outcome):
+    """Count a cache outcome: hit, miss, revalidated or stale"""
+    metrics.incr(f'fake_news.article_cache.{outcome}')
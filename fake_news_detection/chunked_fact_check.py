@@ -0,0 +1,156 @@
+"""
+Map-reduce fact-checking for long articles.
+
+Instead of cutting an article at a fixed length, the text is split on
+paragraph boundaries into chunks. Every chunk is sent concurrently for claim
+extraction and scoring (map), and one small call without the article text
+merges the per-chunk findings into the usual fact-check result (reduce).
+Wall-clock time is roughly two LLM calls regardless of article length.
+"""
+import asyncio
+import json
+import logging
+import math
+
+from django.conf import settings
+
+from api import llm
+from api.model_json import parse_model_json
+from api.tokens import fit_prompt, measure_prompt
+from .prompts import FACT_CHECK_MERGE, FACT_CHECK_PART, known_claims_section
+
+logger = logging.getLogger(__name__)
+
+
+def split_into_chunks(text, chunk_chars, max_chunks):
+    """
+    Split text on paragraph (line) boundaries into at most max_chunks chunks
+    of roughly chunk_chars characters; chunks grow if the article needs more
+    """
+    chunk_chars = max(chunk_chars, math.ceil(len(text) / max_chunks))
+    chunks = _pack_paragraphs(text, chunk_chars)
+    while len(chunks) > max_chunks:
+        # Paragraph boundaries leave chunks a little short; grow until they fit
+        chunk_chars = math.ceil(chunk_chars * 1.1)
+        chunks = _pack_paragraphs(text, chunk_chars)
+    return chunks
+
+
+def _pack_paragraphs(text, chunk_chars):
+    chunks, current, size = [], [], 0
+    for paragraph in text.split('\n'):
+        # A single paragraph longer than a chunk is split hard
+        while len(paragraph) > chunk_chars:
+            if current:
+                chunks.append('\n'.join(current))
+                current, size = [], 0
+            chunks.append(paragraph[:chunk_chars])
+            paragraph = paragraph[chunk_chars:]
+        if size + len(paragraph) > chunk_chars and current:
+            chunks.append('\n'.join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 1
+    if current and '\n'.join(current).strip():
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+async def _map_chunk(source, chunk, index, total, deadline, progress):
+    prompt = fit_prompt(FACT_CHECK_PART, 'chunk', chunk, index=index, total=total, **source)
+    try:
+        # Keep time back for the reduce call
+        finding = parse_model_json(await llm.chat_routed_async(
+            'fact_check', prompt, timeout=deadline.reserve(settings.FACT_CHECK_MIN_SECONDS).timeout(30)
+        ), 'fake_news_chunk')
+    except Exception as e:
+        logger.warning(f"Fact-check of part {index}/{total} failed: {str(e)}")
+        return None
+    progress('fact_check_part', {'part': index, 'total': total, **finding})
+    finding['_chars'] = len(chunk)
+    return finding
+
+
+def _as_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _unique(items, limit):
+    seen, result = set(), []
+    for item in items:
+        key = str(item).strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            result.append(item)
+    return result[:limit]
+
+
+def merge_findings(findings):
+    """Local reduce used when the reduce call fails: length-weighted scores, merged lists"""
+    total_chars = sum(f['_chars'] for f in findings) or 1
+    credibility = round(sum(_as_int(f.get('credibility_score'), 50) * f['_chars'] for f in findings) / total_chars)
+    fake = round(sum(_as_int(f.get('fake_news_likelihood_percentage'), 50) * f['_chars'] for f in findings) / total_chars)
+    return {
+        "credibility_score": credibility,
+        "fake_news_likelihood_percentage": fake,
+        "fact_check_reasoning": ' '.join(str(f.get('summary', '')) for f in findings if f.get('summary')),
+        "confidence": "medium",
+        "key_claims": _unique((c for f in findings for c in f.get('key_claims') or []), 5),
+        "red_flags": _unique((r for f in findings for r in f.get('red_flags') or []), 5),
+        "recommendation": "likely_false" if fake > 70 else "questionable" if fake > 40 else "trustworthy",
+    }
+
+
+async def fact_check_chunked_async(extracted_data, deadline, progress=None, known_claims=()):
+    """
+    Fact-check a long article with concurrent per-chunk calls and one merge
+    call, all within the request's Deadline. Each part's findings are passed
+    to progress('fact_check_part', ...) as soon as they arrive.
+    """
+    progress = progress or (lambda event, data: None)
+    source = {
+        'url': extracted_data.get('url', 'Unknown URL'),
+        'domain': extracted_data.get('domain', 'Unknown domain'),
+        'title': extracted_data.get('title', ''),
+        'date_published': extracted_data.get('date_published', 'Not specified'),
+    }
+    chunks = split_into_chunks(
+        extracted_data.get('text', ''), settings.FACT_CHECK_CHUNK_CHARS, settings.FACT_CHECK_MAX_CHUNKS
+    )
+
+    results = await asyncio.gather(*(
+        _map_chunk(source, chunk, index, len(chunks), deadline, progress) for index, chunk in enumerate(chunks, start=1)
+    ))
+    findings = [finding for finding in results if finding]
+    if not findings:
+        raise ValueError(f"All {len(chunks)} chunk fact-checks failed")
+
+    # The reduce call only needs scores and lists; claim verdicts are collected here instead
+    findings_json = json.dumps(
+        [{k: v for k, v in finding.items() if k not in ('_chars', 'claim_verdicts')} for finding in findings], indent=1
+    )
+    reduce_prompt = measure_prompt(FACT_CHECK_MERGE.render(
+        total=len(chunks),
+        findings=findings_json,
+        author=extracted_data.get('author', 'Unknown'),
+        word_count=extracted_data.get('word_count', 0),
+        known_claims=known_claims_section(known_claims),
+        **source
+    ))
+    try:
+        result = parse_model_json(
+            await llm.chat_routed_async('fact_check', reduce_prompt, timeout=deadline.timeout(30)), 'fake_news_detection'
+        )
+    except Exception as e:
+        logger.warning(f"Fact-check reduce call failed, merging locally: {str(e)}")
+        result = merge_findings(findings)
+
+    result['claim_verdicts'] = [
+        verdict for finding in findings for verdict in finding.get('claim_verdicts') or [] if isinstance(verdict, dict)
+    ]
+    result['analysis_mode'] = 'chunked'
+    result['chunks_analyzed'] = f"{len(findings)}/{len(chunks)}"
+    return result
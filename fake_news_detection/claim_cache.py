@@ -0,0 +1,255 @@
+"""
+Claim-level verdict cache.
+
+The fact-check prompt asks the model to quote the article's checkable claims
+verbatim and give each a verdict. Those verdicts are stored in ClaimVerdict
+keyed by a hash of the normalised sentence. Before a new article is sent to
+the LLM its sentences are looked up. When some are known, the model gets an
+excerpt instead of the whole text: the opening, and each novel claim with
+CLAIM_CACHE_CONTEXT_SENTENCES sentences either side of it, with [...] where
+passages were left out. Known disputed and false claims are listed in full
+with the date they were checked; supported and unverifiable ones are only
+counted. The model neither re-reads nor re-verifies known claims, so input
+tokens go to the novel ones. Trending stories repeat the same claims
+and quotes across outlets, which is where this pays off.
+
+Hit counts on ClaimVerdict rows are kept in memory and written at most every
+CLAIM_CACHE_HIT_FLUSH_INTERVAL seconds, so lookups don't write to the
+database. The hit_rate gauge counts claim-sized sentences: hits among all
+sentences looked up.
+
+All functions here touch the database and are synchronous; call them from
+the runtime loop with asyncio.to_thread.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api import metrics
+from .models import ClaimVerdict
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=["“‘(]?[A-Z0-9])|(?<=[.!?]["”’)])\s+')
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+VERDICTS = {choice for choice, _ in ClaimVerdict.VERDICT_CHOICES}
+
+_registered_endpoints = set()
+_registered_lock = threading.Lock()
+_last_prune = 0.0
+
+# Hits not yet written to ClaimVerdict.hits, by claim hash
+_pending_hits = Counter()
+_pending_hits_lock = threading.Lock()
+_last_hits_flush = 0.0
+
+
+def normalize_claim(text):
+    """Case, punctuation and whitespace-insensitive form of a claim sentence"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    return ' '.join(_NON_WORD_RE.sub(' ', text).split())
+
+
+def claim_hash(text):
+    return hashlib.sha1(normalize_claim(text).encode('utf-8')).hexdigest()
+
+
+def split_sentences(line):
+    return [sentence.strip() for sentence in _SENTENCE_RE.split(line) if sentence.strip()]
+
+
+def _is_claim_sized(sentence):
+    return len(normalize_claim(sentence).split()) >= settings.CLAIM_CACHE_MIN_WORDS
+
+
+def _register_endpoint(endpoint):
+    with _registered_lock:
+        if endpoint in _registered_endpoints:
+            return
+        _registered_endpoints.add(endpoint)
+
+    def hit_rate():
+        hits = metrics.get(f'fake_news.claims.{endpoint}.hit')
+        total = hits + metrics.get(f'fake_news.claims.{endpoint}.novel')
+        return round(hits / total, 3) if total else None
+
+    metrics.register_gauge(f'fake_news.claims.{endpoint}.hit_rate', hit_rate)
+
+
+def find_known_claims(text, endpoint):
+    """
+    Look up the claim-sized sentences of text.
+
+    Returns (content, known) where content is the text to fact-check (an
+    excerpt around the novel claims when any claim is known, else text) and
+    known is a list of {'claim', 'verdict', 'explanation', 'checked_on',
+    'cached': True} dicts for claims with a verdict younger than CLAIM_CACHE_TTL.
+    """
+    lines = [split_sentences(line) for line in text.split('\n')]
+    hashes = {
+        (i, j): claim_hash(sentence)
+        for i, sentences in enumerate(lines) for j, sentence in enumerate(sentences) if _is_claim_sized(sentence)
+    }
+    unique = list(dict.fromkeys(hashes.values()))
+    if not unique:
+        return text, []
+
+    cutoff = timezone.now() - timedelta(seconds=settings.CLAIM_CACHE_TTL)
+    try:
+        rows = {
+            row.claim_hash: row
+            for row in ClaimVerdict.objects.filter(claim_hash__in=unique, updated_at__gte=cutoff)
+        }
+    except DatabaseError as e:
+        # The cache is an optimisation; check the whole article if it's unavailable
+        logger.warning(f"Claim cache lookup failed: {str(e)}")
+        return text, []
+
+    _register_endpoint(endpoint)
+    metrics.incr(f'fake_news.claims.{endpoint}.hit', len(rows))
+    metrics.incr(f'fake_news.claims.{endpoint}.novel', len(unique) - len(rows))
+    if not rows:
+        return text, []
+    with _pending_hits_lock:
+        _pending_hits.update(list(rows))
+    _flush_hits()
+
+    content = _novel_excerpt(lines, [position for position, key in hashes.items() if key not in rows])
+    metrics.incr(f'fake_news.claims.{endpoint}.chars_left_out', max(0, len(text) - len(content)))
+    known = [
+        {
+            'claim': row.claim,
+            'verdict': row.verdict,
+            'explanation': row.explanation,
+            'checked_on': row.updated_at.date().isoformat(),
+            'cached': True,
+        }
+        for row in (rows[key] for key in unique if key in rows)
+    ]
+    return content, known
+
+
+def _novel_excerpt(lines, novel):
+    """
+    The opening sentences and every novel claim with CLAIM_CACHE_CONTEXT_SENTENCES
+    sentences either side, in article order; [...] marks what was left out
+    """
+    window = settings.CLAIM_CACHE_CONTEXT_SENTENCES
+    order = [(i, j) for i, sentences in enumerate(lines) for j in range(len(sentences))]
+    index = {position: n for n, position in enumerate(order)}
+    keep = set(range(min(window + 1, len(order))))
+    for position in novel:
+        n = index[position]
+        keep.update(range(max(0, n - window), min(len(order), n + window + 1)))
+
+    parts, line, previous = [], None, -1
+    for n in sorted(keep):
+        i, j = order[n]
+        if n != previous + 1:
+            parts.append('\n[...]\n')
+        elif line is not None and i != line:
+            parts.append('\n')
+        elif parts:
+            parts.append(' ')
+        parts.append(lines[i][j])
+        line, previous = i, n
+    if previous != len(order) - 1:
+        parts.append('\n[...]')
+    return ''.join(parts)
+
+
+def _flush_hits(force=False):
+    """Add the hits counted in memory to ClaimVerdict.hits, at most every CLAIM_CACHE_HIT_FLUSH_INTERVAL"""
+    global _last_hits_flush
+    now = time.monotonic()
+    with _pending_hits_lock:
+        if not _pending_hits or (not force and now - _last_hits_flush < settings.CLAIM_CACHE_HIT_FLUSH_INTERVAL):
+            return
+        _last_hits_flush = now
+        pending = dict(_pending_hits)
+        _pending_hits.clear()
+
+    by_count = {}
+    for key, count in pending.items():
+        by_count.setdefault(count, []).append(key)
+    try:
+        with transaction.atomic():
+            for count, keys in by_count.items():
+                ClaimVerdict.objects.filter(claim_hash__in=keys).update(hits=F('hits') + count)
+    except DatabaseError as e:
+        # Hit counts are statistics; losing one interval's worth is fine
+        logger.warning(f"Could not record claim cache hits: {str(e)}")
+
+
+def store_claim_verdicts(claim_verdicts, source_url, endpoint):
+    """Save the verdicts the model returned for novel claims"""
+    stored = 0
+    for item in claim_verdicts or []:
+        if not isinstance(item, dict) or item.get('cached'):
+            continue
+        claim = str(item.get('claim', '')).strip()
+        verdict = str(item.get('verdict', '')).strip().lower()
+        if verdict not in VERDICTS or not _is_claim_sized(claim):
+            continue
+        try:
+            with transaction.atomic():
+                ClaimVerdict.objects.update_or_create(
+                    claim_hash=claim_hash(claim),
+                    defaults={
+                        'claim': claim[:2000],
+                        'verdict': verdict,
+                        'explanation': str(item.get('explanation', ''))[:2000],
+                        'source_url': (source_url or '')[:2000],
+                    },
+                )
+            stored += 1
+        except DatabaseError as e:
+            logger.warning(f"Could not store claim verdict: {str(e)}")
+            break
+    metrics.incr(f'fake_news.claims.{endpoint}.stored', stored)
+    _flush_hits()
+    _prune_expired()
+    return stored
+
+
+def _prune_expired():
+    """Delete verdicts past CLAIM_CACHE_TTL, at most once an hour per process"""
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune < 3600:
+        return
+    _last_prune = now
+    cutoff = timezone.now() - timedelta(seconds=settings.CLAIM_CACHE_TTL)
+    try:
+        deleted, _ = ClaimVerdict.objects.filter(updated_at__lt=cutoff).delete()
+    except DatabaseError as e:
+        logger.warning(f"Could not prune claim verdicts: {str(e)}")
+        return
+    if deleted:
+        logger.info(f"Pruned {deleted} expired claim verdicts")
+
+
+def format_known_claims(known):
+    """
+    Prompt section for claims that were already verified: disputed and false
+    ones in full with when they were checked, the rest only counted
+    """
+    lines = [
+        f'- "{k["claim"]}" => {k["verdict"]} (checked {k["checked_on"]})'
+        for k in known if k['verdict'] in ('disputed', 'false')
+    ]
+    counts = Counter(k['verdict'] for k in known if k['verdict'] not in ('disputed', 'false'))
+    if counts:
+        lines.append(f"- {sum(counts.values())} more: " + ', '.join(f'{n} {verdict}' for verdict, n in sorted(counts.items())))
+    return '\n'.join(lines)
@@ -0,0 +1,222 @@
+"""
+Per-domain extraction templates.
+
+Records, for every news domain we fetch, how each extraction strategy has
+performed (attempts, good extractions, time spent) and which content selector
+last produced good text. extract_article uses this to try the strategy that
+usually wins for a domain first instead of walking the default order.
+
+The index is small (bounded by EXTRACTION_TEMPLATES_MAX_DOMAINS) and is
+persisted as JSON at EXTRACTION_TEMPLATES_PATH so it survives restarts. Each
+worker process keeps its own copy and, at most every
+EXTRACTION_TEMPLATES_SAVE_INTERVAL seconds, adds what it recorded since its
+last save to the file under a lock and adopts the merged result, so workers
+see each other's statistics instead of overwriting them.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from api import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Halve a strategy's counters once it has this many attempts so the
+# ranking follows site redesigns
+DECAY_AFTER_ATTEMPTS = 50
+
+
+def domain_key(domain):
+    domain = (domain or '').lower().split(':')[0]
+    return domain[4:] if domain.startswith('www.') else domain
+
+
+def update_json_file(path, merge, prefix):
+    """
+    Replace the JSON file at path with merge(current data, or None if there
+    is none) while holding an exclusive lock on path + '.lock', so processes
+    sharing the file merge their changes instead of the last writer winning.
+    Returns the data written; raises OSError if it couldn't be
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path, encoding='utf-8') as f:
+                current = json.load(f)
+        except FileNotFoundError:
+            current = None
+        except ValueError as e:
+            logger.warning(f"Replacing unreadable {path}: {e}")
+            current = None
+
+        data = merge(current)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    return data
+
+
+def _add_stats(domains, key, delta, max_domains, decay=True):
+    """
+    Add delta ({'strategies': {name: counters}, 'selector', 'last_seen'}) to
+    the entry for key in domains, which is kept in least-recently-used order
+    """
+    entry = domains.pop(key, None) or {'strategies': {}}
+    for name, counters in delta['strategies'].items():
+        stats = entry['strategies'].setdefault(name, {'attempts': 0, 'successes': 0, 'ms': 0.0})
+        for field, value in counters.items():
+            stats[field] += value
+        while decay and stats['attempts'] > DECAY_AFTER_ATTEMPTS:
+            stats['attempts'] //= 2
+            stats['successes'] //= 2
+            stats['ms'] /= 2
+    if delta.get('selector'):
+        entry['selector'] = delta['selector']
+    entry['last_seen'] = max(entry.get('last_seen', 0), delta['last_seen'])
+
+    # Re-inserting keeps the dict in least-recently-used order
+    domains[key] = entry
+    while len(domains) > max_domains:
+        domains.pop(next(iter(domains)))
+
+
+class DomainTemplates:
+    """Thread-safe, persisted map of domain -> strategy statistics"""
+
+    def __init__(self, path, max_domains, save_interval):
+        self.path = path
+        self.max_domains = max_domains
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._domains = {}
+        # What this process recorded since its last save, in the same shape
+        self._pending = {}
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable extraction template index {self.path}: {e}")
+            return
+        if isinstance(data, dict):
+            with self._lock:
+                self._domains = data.get('domains', {})
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            pending, self._pending = self._pending, {}
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        def merge(data):
+            domains = data.get('domains') if isinstance(data, dict) else None
+            domains = domains if isinstance(domains, dict) else {}
+            for key, delta in pending.items():
+                _add_stats(domains, key, delta, self.max_domains)
+            return {'domains': domains}
+
+        try:
+            merged = update_json_file(self.path, merge, '.templates-')
+        except OSError as e:
+            logger.warning(f"Could not save extraction template index to {self.path}: {e}")
+            with self._lock:
+                # Keep the unsaved statistics for the next attempt
+                for key, delta in self._pending.items():
+                    _add_stats(pending, key, delta, self.max_domains, decay=False)
+                self._pending = pending
+                self._dirty = True
+            return
+
+        with self._lock:
+            domains = merged['domains']
+            for key, delta in self._pending.items():
+                _add_stats(domains, key, delta, self.max_domains)
+            self._domains = domains
+
+    def order(self, domain, candidates):
+        """
+        Candidate strategies for a domain: proven ones first (by success rate,
+        then average time), untried ones in default order, failing ones last
+        """
+        with self._lock:
+            stats = self._domains.get(domain_key(domain), {}).get('strategies', {})
+            proven, untried, failing = [], [], []
+            for index, name in enumerate(candidates):
+                entry = stats.get(name)
+                if not entry or not entry['attempts']:
+                    untried.append(name)
+                elif entry['successes']:
+                    rate = entry['successes'] / entry['attempts']
+                    proven.append((-rate, entry['ms'] / entry['attempts'], index, name))
+                else:
+                    failing.append(name)
+        return [name for *_, name in sorted(proven)] + untried + failing
+
+    def selector(self, domain):
+        """Content selector that last produced good text for this domain"""
+        with self._lock:
+            return self._domains.get(domain_key(domain), {}).get('selector')
+
+    def record(self, domain, strategy, success, elapsed_ms, selector=None):
+        key = domain_key(domain)
+        if not key:
+            return
+        delta = {
+            'strategies': {strategy: {'attempts': 1, 'successes': int(success), 'ms': elapsed_ms}},
+            'selector': selector if success else None,
+            'last_seen': int(time.time()),
+        }
+        with self._lock:
+            _add_stats(self._domains, key, delta, self.max_domains)
+            _add_stats(self._pending, key, delta, self.max_domains, decay=False)
+            self._dirty = True
+            due = time.monotonic() - self._last_save >= self.save_interval
+
+        if due:
+            self.save()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._domains)
+
+
+_templates = None
+_templates_lock = threading.Lock()
+
+
+def get_templates():
+    """The process-wide template index, loaded from disk on first use"""
+    global _templates
+    with _templates_lock:
+        if _templates is None:
+            _templates = DomainTemplates(
+                settings.EXTRACTION_TEMPLATES_PATH,
+                settings.EXTRACTION_TEMPLATES_MAX_DOMAINS,
+                settings.EXTRACTION_TEMPLATES_SAVE_INTERVAL,
+            )
+            atexit.register(_templates.save)
+            metrics.register_gauge('fake_news.extraction_templates.domains', lambda: len(_templates))
+        return _templates
@@ -0,0 +1,383 @@
+"""
+Article extraction strategies.
+
+Every strategy takes the raw (capped) page bytes and returns a dict with
+'title', 'text', 'author', 'date_published' and the content 'selector' it
+used, or None when it has nothing to offer:
+
+- 'jsonld':    the structured-data fast path (JSON-LD and head meta tags, see
+               structured_data.py); no DOM is built
+- 'selectors': the original BeautifulSoup selector cascade
+- 'lxml':      a single pass over the lxml tree driven by one precompiled XPath
+- 'boilerpy3': boilerpipe's ArticleExtractor heuristics
+
+extract_article tries them in turn until one yields enough text. Per domain,
+the order is learned from past attempts (see domain_templates.py). New
+strategies register themselves with @strategy(name). The two DOM strategies
+share the same selectors and filtering rules, so `manage.py compare_extractors`
+can compare their output.
+"""
+import logging
+import time
+from functools import cached_property
+
+from boilerpy3 import extractors
+from bs4 import BeautifulSoup
+from django.conf import settings
+from lxml import etree
+
+from api import metrics
+from .domain_templates import get_templates
+from .structured_data import extract_structured_data, is_complete
+
+logger = logging.getLogger(__name__)
+
+# Candidate content containers, most specific first
+ARTICLE_SELECTORS = [
+    'article',
+    'div.article',
+    'div.article-content',
+    'div.entry-content',
+    'div.post-content',
+    'div.story',
+    'div.story-content',
+    'div.content',
+    'div.main-content',
+    'div[class*="content"]',
+    'div[class*="article"]',
+    'div[class*="post"]',
+    'div[class*="entry"]',
+    'div[class*="story"]',
+    'main',
+    'div#main',
+    'div#content',
+    'div#article'
+]
+
+EXCLUDED_TAGS = ['script', 'style', 'noscript', 'iframe', 'svg', 'button', 'nav', 'footer', 'header', 'aside', 'form']
+BLOCK_TAGS = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+
+def _apply_meta(metadata, attrs):
+    """Update author/date from one <meta> tag's attributes"""
+    property_attr = (attrs.get('property') or '').lower()
+    name_attr = (attrs.get('name') or '').lower()
+    content = attrs.get('content') or ''
+
+    if not content:
+        return
+
+    # Check for author in meta tags
+    if any(x in property_attr for x in ['author', 'article:author']) or \
+       any(x in name_attr for x in ['author', 'article:author']):
+        metadata['author'] = content
+
+    # Check for publication date in meta tags
+    if any(x in property_attr for x in ['article:published_time', 'og:published_time', 'pubdate']) or \
+       any(x in name_attr for x in ['date', 'pubdate', 'publishdate', 'timestamp']):
+        metadata['date_published'] = content
+
+    # Also check for date in other attributes
+    for attr, value in attrs.items():
+        if 'date' in attr.lower() and value and not metadata['date_published']:
+            metadata['date_published'] = value
+
+
+def extract_with_soup(body, encoding=None, preferred_selector=None):
+    """
+    Extract article text and metadata with the BeautifulSoup selector cascade.
+    A preferred_selector learned for the domain is tried before the cascade.
+    """
+    soup = BeautifulSoup(body, 'lxml', from_encoding=encoding)
+
+    # Extract title
+    title = ''
+    if soup.title and soup.title.string:
+        title = soup.title.string.strip()
+
+    # Try to find the main article content
+    article = None
+    matched_selector = None
+    selectors = [preferred_selector] + ARTICLE_SELECTORS if preferred_selector else ARTICLE_SELECTORS
+    for selector in selectors:
+        article = soup.select_one(selector)
+        if article:
+            matched_selector = selector
+            break
+
+    # If we found an article container, use that; otherwise use the whole page
+    content_source = article if article else soup
+
+    # Remove unwanted elements
+    for element in content_source(EXCLUDED_TAGS):
+        element.decompose()
+
+    # Extract text from paragraphs and headers
+    text_parts = []
+    for element in content_source.find_all(BLOCK_TAGS):
+        text = element.get_text(separator=' ', strip=True)
+        if text and len(text) > 20:  # Only include non-empty text with reasonable length
+            if element.name.startswith('h'):
+                text_parts.append(f'\n\n{text.upper()}\n')
+            else:
+                text_parts.append(text)
+
+    full_text = '\n'.join(text_parts)
+
+    # If we still don't have enough content, fall back to getting all text
+    if len(full_text) < 100:
+        full_text = content_source.get_text(separator='\n', strip=True)
+
+    metadata = {'title': title, 'text': full_text, 'author': '', 'date_published': '', 'selector': matched_selector}
+
+    # Try to extract author and date from common meta tags
+    for meta in soup.find_all('meta'):
+        _apply_meta(metadata, meta.attrs)
+
+    return metadata
+
+
+# Everything the lxml engine needs, returned in document order by one traversal
+_NODES_XPATH = etree.XPath(
+    '//title | //meta[@content] | //article | //main | //div[@class or @id]'
+    ' | ' + ' | '.join(f'//{tag}' for tag in BLOCK_TAGS)
+)
+
+
+def _container_rank(el):
+    """Index of the first ARTICLE_SELECTORS entry matching el, or None"""
+    tag = el.tag
+    if tag == 'article':
+        return 0
+    if tag == 'main':
+        return 14
+    if tag != 'div':
+        return None
+
+    class_attr = el.get('class') or ''
+    classes = class_attr.split()
+    for rank, name in ((1, 'article'), (2, 'article-content'), (3, 'entry-content'), (4, 'post-content'),
+                       (5, 'story'), (6, 'story-content'), (7, 'content'), (8, 'main-content')):
+        if name in classes:
+            return rank
+    for rank, fragment in ((9, 'content'), (10, 'article'), (11, 'post'), (12, 'entry'), (13, 'story')):
+        if fragment in class_attr:
+            return rank
+
+    element_id = el.get('id')
+    for rank, name in ((15, 'main'), (16, 'content'), (17, 'article')):
+        if element_id == name:
+            return rank
+    return None
+
+
+def _iter_text(el):
+    """Text nodes under el, skipping excluded subtrees and comments"""
+    if el.text:
+        yield el.text
+    for child in el:
+        if isinstance(child.tag, str) and child.tag not in EXCLUDED_TAGS:
+            yield from _iter_text(child)
+        if child.tail:
+            yield child.tail
+
+
+def _get_text(el, separator):
+    return separator.join(s.strip() for s in _iter_text(el) if s.strip())
+
+
+def _in_content(el, container):
+    """True if el is inside the container and not inside an excluded element"""
+    for ancestor in el.iterancestors():
+        if ancestor is container:
+            return True
+        if ancestor.tag in EXCLUDED_TAGS:
+            return False
+    return container is None
+
+
+def extract_with_lxml(body, encoding=None):
+    """
+    Extract article text and metadata from one traversal of the lxml tree
+    """
+    metadata = {'title': '', 'text': '', 'author': '', 'date_published': '', 'selector': None}
+    try:
+        root = etree.fromstring(body, etree.HTMLParser(encoding=encoding))
+    except (etree.ParserError, etree.XMLSyntaxError, LookupError) as e:
+        logger.debug(f"lxml could not parse document: {e}")
+        root = None
+    if root is None:
+        return metadata
+
+    title_el = None
+    container = None
+    container_rank = len(ARTICLE_SELECTORS)
+    blocks = []
+
+    for el in _NODES_XPATH(root):
+        tag = el.tag
+        if tag in BLOCK_TAGS:
+            blocks.append(el)
+        elif tag == 'meta':
+            _apply_meta(metadata, el.attrib)
+        elif tag == 'title':
+            if title_el is None:
+                title_el = el
+        else:
+            rank = _container_rank(el)
+            if rank is not None and rank < container_rank:
+                container, container_rank = el, rank
+
+    # Same rule as soup.title.string: only a title with a single text child counts
+    if title_el is not None and title_el.text and len(title_el) == 0:
+        metadata['title'] = title_el.text.strip()
+
+    # Extract text from paragraphs and headers inside the content container
+    text_parts = []
+    for el in blocks:
+        if not _in_content(el, container):
+            continue
+        text = _get_text(el, ' ')
+        if text and len(text) > 20:
+            if el.tag.startswith('h'):
+                text_parts.append(f'\n\n{text.upper()}\n')
+            else:
+                text_parts.append(text)
+
+    full_text = '\n'.join(text_parts)
+
+    # If we still don't have enough content, fall back to getting all text
+    if len(full_text) < 100:
+        full_text = _get_text(container if container is not None else root, '\n')
+
+    metadata['text'] = full_text
+    if container is not None:
+        metadata['selector'] = ARTICLE_SELECTORS[container_rank]
+    return metadata
+
+
+class ArticleDocument:
+    """Raw page bytes plus views of them shared between strategies"""
+
+    def __init__(self, body, encoding=None):
+        self.body = body
+        self.encoding = encoding
+
+    @cached_property
+    def structured(self):
+        return extract_structured_data(self.body, self.encoding)
+
+    @cached_property
+    def html(self):
+        return self.body.decode(self.encoding or 'utf-8', errors='replace')
+
+
+# name -> callable(document, preferred_selector) returning an extraction dict or None
+STRATEGIES = {}
+
+
+def strategy(name):
+    """Register an extraction strategy under a name usable in EXTRACTION_STRATEGIES"""
+    def register(fn):
+        STRATEGIES[name] = fn
+        return fn
+    return register
+
+
+@strategy('jsonld')
+def _jsonld_strategy(document, preferred_selector):
+    structured = document.structured
+    if not is_complete(structured, settings.STRUCTURED_DATA_MIN_WORDS):
+        return None
+    return {**structured, 'selector': None}
+
+
+@strategy('selectors')
+def _selectors_strategy(document, preferred_selector):
+    return extract_with_soup(document.body, document.encoding, preferred_selector)
+
+
+@strategy('lxml')
+def _lxml_strategy(document, preferred_selector):
+    return extract_with_lxml(document.body, document.encoding)
+
+
+@strategy('boilerpy3')
+def _boilerpy3_strategy(document, preferred_selector):
+    try:
+        doc = extractors.ArticleExtractor().get_doc(document.html)
+    except Exception as e:
+        logger.debug(f"boilerpy3 could not extract document: {e}")
+        return None
+    return {'title': (doc.title or '').strip(), 'text': doc.content or '', 'author': '', 'date_published': '', 'selector': None}
+
+
+# ARTICLE_EXTRACTOR value -> DOM strategy name
+DOM_STRATEGIES = {'bs4': 'selectors', 'lxml': 'lxml'}
+
+
+def default_strategies():
+    """Strategy order for domains we know nothing about"""
+    if settings.EXTRACTION_STRATEGIES:
+        return [name for name in settings.EXTRACTION_STRATEGIES if name in STRATEGIES]
+    dom = DOM_STRATEGIES.get(settings.ARTICLE_EXTRACTOR)
+    if dom is None:
+        logger.warning(f"Unknown ARTICLE_EXTRACTOR '{settings.ARTICLE_EXTRACTOR}', falling back to bs4")
+        dom = 'selectors'
+    return ['jsonld', dom, 'boilerpy3']
+
+
+def _word_count(extracted):
+    return len(extracted['text'].split()) if extracted else 0
+
+
+def extract_article(body, encoding=None, domain=None, strategies=None):
+    """
+    Extract an article by trying strategies until one yields enough text.
+
+    With a domain, strategies are ordered by what has worked for that domain
+    before and every attempt is recorded; an explicit strategies list is used
+    as-is (e.g. by compare_extractors). Publisher-declared metadata from the
+    structured-data scan overrides what the DOM strategies found.
+    """
+    document = ArticleDocument(body, encoding)
+    templates = get_templates() if domain and strategies is None else None
+    candidates = strategies or default_strategies()
+    if templates is not None:
+        candidates = templates.order(domain, candidates)
+    preferred_selector = templates.selector(domain) if templates is not None else None
+
+    extracted = None
+    for name in candidates:
+        started = time.perf_counter()
+        result = STRATEGIES[name](document, preferred_selector)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        good = (name == 'jsonld' and result is not None) or _word_count(result) >= settings.EXTRACTION_MIN_WORDS
+        if templates is not None:
+            templates.record(domain, name, good, elapsed_ms, result and result.get('selector'))
+        if _word_count(result) > _word_count(extracted):
+            extracted, extracted_by = result, name
+        if good:
+            extracted, extracted_by = result, name
+            break
+
+    if extracted is None:
+        extracted, extracted_by = {'title': '', 'text': '', 'author': '', 'date_published': '', 'selector': None}, 'none'
+    metrics.incr(f'fake_news.extraction.{extracted_by}')
+    extracted = dict(extracted, strategy=extracted_by)
+
+    # Publisher-declared metadata beats whichever meta tag the DOM loop matched last
+    structured = document.structured
+    for field in ('title', 'author', 'date_published'):
+        extracted[field] = structured[field] or extracted[field]
+
+    # Clean up the text
+    full_text = '\n'.join(line.strip() for line in extracted['text'].splitlines() if line.strip())
+
+    # If still no content, use the raw text (first 10,000 chars)
+    if not full_text.strip():
+        full_text = body[:10000].decode(encoding or 'utf-8', errors='ignore')
+
+    extracted['text'] = full_text
+    return extracted
@@ -0,0 +1,25 @@
+"""
+Job handlers (see api/jobs.py): the same pipeline as analyze_news, run by a
+job worker with a longer time budget than a request gets
+"""
+from django.conf import settings
+
+from api import jobs
+from api.resilience import Deadline
+from api.runtime import run_sync
+from .views import DEADLINE_GRACE_SECONDS, analysis_error_response, analyze_url_async
+
+
+@jobs.handler('fake_news_detection')
+def run_fake_news_job(payload):
+    url = (payload.get('url') or '').strip()
+    if not url:
+        return {'error': 'URL is required'}, 400
+    deadline = Deadline(settings.JOBS_ANALYZE_DEADLINE_SECONDS)
+    try:
+        return run_sync(
+            analyze_url_async(url, deadline, endpoint='job'),
+            timeout=settings.JOBS_ANALYZE_DEADLINE_SECONDS + DEADLINE_GRACE_SECONDS,
+        )
+    except Exception as e:
+        return analysis_error_response(e)
@@ -0,0 +1,76 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fake_news_detection.extraction import STRATEGIES, extract_article
+
+
+class Command(BaseCommand):
+    help = "Run every article extraction strategy over saved HTML pages and compare output and timing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="HTML files or directories of *.html files")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per page and strategy")
+        parser.add_argument('--baseline', default='selectors', choices=sorted(STRATEGIES), help="Strategy to compare against")
+
+    def handle(self, *args, **options):
+        pages = []
+        for raw in options['paths']:
+            path = Path(raw)
+            if path.is_dir():
+                pages.extend(sorted(path.glob('*.html')) + sorted(path.glob('*.htm')))
+            elif path.is_file():
+                pages.append(path)
+            else:
+                raise CommandError(f"No such file or directory: {raw}")
+        if not pages:
+            raise CommandError("No HTML pages found")
+
+        baseline = options['baseline']
+        repeat = max(1, options['repeat'])
+        totals = {name: 0.0 for name in STRATEGIES}
+        mismatches = {name: 0 for name in STRATEGIES if name != baseline}
+
+        for page in pages:
+            body = page.read_bytes()
+            results = {}
+            for name in STRATEGIES:
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    results[name] = extract_article(body, strategies=[name])
+                elapsed = (time.perf_counter() - started) / repeat
+                totals[name] += elapsed
+                results[name]['_ms'] = elapsed * 1000
+
+            expected = results[baseline]
+            self.stdout.write(f"{page.name}")
+            for name, result in results.items():
+                words = len(result['text'].split())
+                line = f"  {name:9s} {result['_ms']:8.2f} ms  {words:6d} words"
+                if name != baseline:
+                    differs = [
+                        field for field in ('title', 'author', 'date_published', 'text')
+                        if result[field] != expected[field]
+                    ]
+                    if differs:
+                        mismatches[name] += 1
+                        line += f"  differs from {baseline}: {', '.join(differs)} (word overlap {_overlap(result['text'], expected['text']):.1%})"
+                    else:
+                        line += f"  identical to {baseline}"
+                self.stdout.write(line)
+
+        self.stdout.write("")
+        for name, total in totals.items():
+            summary = f"{name:9s} total {total * 1000:9.2f} ms over {len(pages)} pages"
+            if name != baseline:
+                summary += f", {mismatches[name]} differing, {totals[baseline] / total if total else 0:.1f}x vs {baseline}"
+            self.stdout.write(summary)
+
+
+def _overlap(a, b):
+    """Jaccard overlap of the word sets of two texts"""
+    a, b = set(a.split()), set(b.split())
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimVerdict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('claim_hash', models.CharField(max_length=40, unique=True)),
+                ('claim', models.TextField()),
+                ('verdict', models.CharField(choices=[('supported', 'Supported'), ('disputed', 'Disputed'), ('false', 'False'), ('unverifiable', 'Unverifiable')], max_length=16)),
+                ('explanation', models.TextField(blank=True)),
+                ('source_url', models.URLField(blank=True, max_length=2000)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='fake_news_d_updated_2438d2_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,41 @@
 from django.db import models
 
-# Create your models here.
+from api.models import AnalysisResult
+
+
+class ClaimVerdict(models.Model):
+    """
+    A factual claim (normalised sentence) with the verdict the fact-checker gave it.
+    Shared across articles so a claim repeated by many outlets is only checked once.
+    """
+    VERDICT_CHOICES = [
+        ('supported', 'Supported'),
+        ('disputed', 'Disputed'),
+        ('false', 'False'),
+        ('unverifiable', 'Unverifiable'),
+    ]
+
+    # sha1 of the normalised claim text (see fake_news_detection/claim_cache.py)
+    claim_hash = models.CharField(max_length=40, unique=True)
+    claim = models.TextField()
+    verdict = models.CharField(max_length=16, choices=VERDICT_CHOICES)
+    explanation = models.TextField(blank=True)
+    source_url = models.URLField(max_length=2000, blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['updated_at'])]
+
+    def __str__(self):
+        return f"{self.verdict}: {self.claim[:80]}"
+
+
+class NewsAnalysis(AnalysisResult):
+    """A fact-checked article (analyze_news, batch, stream and jobs)"""
+    DETECTOR = 'fake_news_detection'
+    url = models.URLField(max_length=2000)
+
+    class Meta(AnalysisResult.Meta):
+        verbose_name_plural = 'news analyses'
@@ -0,0 +1,323 @@
+"""
+Near-duplicate article index.
+
+Wire stories (AP, Reuters, ...) are republished on many domains with small
+boilerplate differences. Each fact-checked article is summarised by a MinHash
+signature (one-permutation hashing over word 5-gram shingles, so one hash per
+shingle rather than one per shingle per permutation) and filed in an LSH table
+of signature bands. A later article whose signature lands in a shared bucket
+and agrees on at least NEAR_DUPLICATE_THRESHOLD of its positions reuses the
+stored fact-check result instead of calling the LLM again.
+
+Domain-specific fields are not copied: source_reliability is recomputed from
+what earlier checks said about the new article's own domain.
+
+Like the extraction template index, each worker process keeps its own copy,
+bounded by NEAR_DUPLICATE_MAX_ENTRIES, and at most every
+NEAR_DUPLICATE_SAVE_INTERVAL seconds merges what it indexed since its last
+save into the JSON file at NEAR_DUPLICATE_INDEX_PATH under a lock, then
+rebuilds its copy from the merged file. That takes a while for a full index,
+so add() leaves it to a background thread, and callers on the event loop
+reach the index through asyncio.to_thread (the rebuild holds its lock).
+"""
+import atexit
+import base64
+import json
+import logging
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+from api import metrics
+from .domain_templates import domain_key, update_json_file
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_WORDS = 5
+NUM_HASHES = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity share a bucket with high probability
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_BIN_BITS = NUM_HASHES.bit_length() - 1
+_WORD_RE = re.compile(r'\w+')
+
+# Fields that describe the publisher rather than the story
+DOMAIN_FIELDS = ('source_reliability',)
+RELIABILITY_VALUES = ('reliable', 'mixed', 'unreliable')
+
+
+def signature(text):
+    """
+    One-permutation MinHash signature of text (array of NUM_HASHES uint32),
+    or None if the text is too short to compare meaningfully
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < settings.NEAR_DUPLICATE_MIN_WORDS:
+        return None
+
+    empty = 0xFFFFFFFF
+    bins = [empty] * NUM_HASHES
+    for i in range(len(words) - SHINGLE_WORDS + 1):
+        # crc32 is fast but linear; the multiply spreads its bits over the 64-bit range
+        h = (zlib.crc32(' '.join(words[i:i + SHINGLE_WORDS]).encode()) * _GOLDEN) & _MASK64
+        index = h >> (64 - _BIN_BITS)
+        value = h & 0xFFFFFFFF
+        if value < bins[index]:
+            bins[index] = value
+
+    # Densify: an empty bin borrows the next non-empty bin to its right (rotation)
+    for index in range(NUM_HASHES):
+        if bins[index] == empty:
+            for step in range(1, NUM_HASHES):
+                borrowed = bins[(index + step) % NUM_HASHES]
+                if borrowed != empty:
+                    bins[index] = (borrowed + step * 0x9E3779B1) & 0xFFFFFFFF
+                    break
+    return array('I', bins)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+def _band_keys(sig):
+    return [hash((band,) + tuple(sig[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+def _add_votes(reliability, key, votes, max_entries):
+    """Add votes ({verdict: count}) for a domain, keeping reliability in least-recently-used order"""
+    counts = reliability.pop(key, {})
+    for verdict, count in votes.items():
+        counts[verdict] = counts.get(verdict, 0) + count
+    reliability[key] = counts
+    while len(reliability) > max_entries:
+        reliability.pop(next(iter(reliability)))
+
+
+class NearDuplicateIndex:
+    """Thread-safe, persisted LSH index of signature -> fact-check result"""
+
+    def __init__(self, path, max_entries, ttl, threshold, save_interval):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._docs = OrderedDict()
+        self._buckets = {}
+        self._reliability = {}
+        self._next_id = 0
+        # What this process indexed since its last save, in the file's format
+        self._pending_docs = []
+        self._pending_votes = {}
+        self._dirty = False
+        self._saving = False
+        self._last_save = time.monotonic()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable near-duplicate index {self.path}: {e}")
+            return
+        if isinstance(data, dict):
+            with self._lock:
+                self._rebuild(data)
+
+    def _rebuild(self, data):
+        """Replace the index with the file's contents; caller holds the lock"""
+        self._docs.clear()
+        self._buckets.clear()
+        self._reliability = dict(data.get('reliability', {}))
+        now = time.time()
+        for doc in data.get('docs', []):
+            if now - doc.get('created', 0) < self.ttl:
+                self._insert_doc(doc)
+
+    def _insert_doc(self, doc):
+        sig = array('I')
+        sig.frombytes(base64.b64decode(doc['signature']))
+        if len(sig) == NUM_HASHES:
+            self._insert(sig, doc['result'], doc['domain'], doc['url'], doc['created'])
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            docs, self._pending_docs = self._pending_docs, []
+            votes, self._pending_votes = self._pending_votes, {}
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        def merge(data):
+            data = data if isinstance(data, dict) else {}
+            now = time.time()
+            merged, seen = [], set()
+            for doc in data.get('docs', []) + docs:
+                identity = (doc.get('url'), doc.get('created'))
+                if now - doc.get('created', 0) < self.ttl and identity not in seen:
+                    seen.add(identity)
+                    merged.append(doc)
+            reliability = data.get('reliability', {})
+            for key, counts in votes.items():
+                _add_votes(reliability, key, counts, self.max_entries)
+            return {'docs': merged[-self.max_entries:], 'reliability': reliability}
+
+        try:
+            data = update_json_file(self.path, merge, '.near-duplicates-')
+        except OSError as e:
+            logger.warning(f"Could not save near-duplicate index to {self.path}: {e}")
+            with self._lock:
+                # Keep the unsaved entries for the next attempt
+                self._pending_docs = docs + self._pending_docs
+                for key, counts in self._pending_votes.items():
+                    _add_votes(votes, key, counts, self.max_entries)
+                self._pending_votes = votes
+                self._dirty = True
+            return
+
+        with self._lock:
+            self._rebuild(data)
+            for doc in self._pending_docs:
+                self._insert_doc(doc)
+            for key, counts in self._pending_votes.items():
+                _add_votes(self._reliability, key, counts, self.max_entries)
+
+    def _insert(self, sig, result, domain, url, created):
+        doc_id = self._next_id
+        self._next_id += 1
+        # Results are kept serialised: one str per entry instead of a tree of dicts and lists
+        self._docs[doc_id] = (sig, json.dumps(result, separators=(',', ':')), domain, url, created)
+        for key in _band_keys(sig):
+            # Nearly every bucket holds one article, so store a bare id until a second arrives
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                self._buckets[key] = doc_id
+            elif isinstance(bucket, int):
+                self._buckets[key] = [bucket, doc_id]
+            else:
+                bucket.append(doc_id)
+        while len(self._docs) > self.max_entries:
+            self._remove(next(iter(self._docs)))
+
+    def _remove(self, doc_id):
+        sig = self._docs.pop(doc_id)[0]
+        for key in _band_keys(sig):
+            bucket = self._buckets.get(key)
+            if bucket == doc_id:
+                del self._buckets[key]
+            elif isinstance(bucket, list) and doc_id in bucket:
+                bucket.remove(doc_id)
+                if len(bucket) == 1:
+                    self._buckets[key] = bucket[0]
+
+    def lookup(self, sig):
+        """
+        Best stored match for a signature above the similarity threshold:
+        (result, url, domain, similarity), or None
+        """
+        if sig is None:
+            return None
+        now = time.time()
+        with self._lock:
+            candidates = set()
+            for key in _band_keys(sig):
+                bucket = self._buckets.get(key)
+                if isinstance(bucket, int):
+                    candidates.add(bucket)
+                elif bucket:
+                    candidates.update(bucket)
+
+            best, best_similarity = None, self.threshold
+            for doc_id in candidates:
+                doc = self._docs[doc_id]
+                if now - doc[4] >= self.ttl:
+                    self._remove(doc_id)
+                    continue
+                score = similarity(sig, doc[0])
+                if score >= best_similarity:
+                    best, best_similarity = doc, score
+        if best is None:
+            return None
+        _, result, domain, url, _ = best
+        return json.loads(result), url, domain, best_similarity
+
+    def add(self, sig, result, domain, url):
+        """Index a fact-check result and remember what it said about the domain"""
+        reliability = result.get('source_reliability')
+        with self._lock:
+            if reliability in RELIABILITY_VALUES:
+                for votes in (self._reliability, self._pending_votes):
+                    _add_votes(votes, domain_key(domain), {reliability: 1}, self.max_entries)
+            if sig is not None:
+                doc = {
+                    'signature': base64.b64encode(sig.tobytes()).decode('ascii'),
+                    'result': {k: v for k, v in result.items() if k not in DOMAIN_FIELDS},
+                    'domain': domain,
+                    'url': url,
+                    'created': time.time(),
+                }
+                self._insert(sig, doc['result'], domain, url, doc['created'])
+                self._pending_docs.append(doc)
+                del self._pending_docs[:-self.max_entries]
+            self._dirty = True
+            due = not self._saving and time.monotonic() - self._last_save >= self.save_interval
+            if due:
+                self._saving = True
+
+        if due:
+            threading.Thread(target=self._save_in_background, name='near-duplicates-save', daemon=True).start()
+
+    def _save_in_background(self):
+        try:
+            self.save()
+        finally:
+            with self._lock:
+                self._saving = False
+
+    def source_reliability(self, domain):
+        """Majority verdict of earlier fact-checks on this domain, or 'unknown'"""
+        with self._lock:
+            votes = self._reliability.get(domain_key(domain))
+        if not votes:
+            return 'unknown'
+        return Counter(votes).most_common(1)[0][0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide near-duplicate index, loaded from disk on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex(
+                settings.NEAR_DUPLICATE_INDEX_PATH,
+                settings.NEAR_DUPLICATE_MAX_ENTRIES,
+                settings.NEAR_DUPLICATE_TTL,
+                settings.NEAR_DUPLICATE_THRESHOLD,
+                settings.NEAR_DUPLICATE_SAVE_INTERVAL,
+            )
+            atexit.register(_index.save)
+            metrics.register_gauge('fake_news.near_duplicates.entries', lambda: len(_index))
+        return _index
@@ -0,0 +1,121 @@
+"""
+Fact-checking prompts (see api/prompts.py). Instructions and output format
+are the static, cacheable prefix; the article and its metadata follow.
+"""
+from api import prompts
+from .claim_cache import format_known_claims
+
+OUTPUT_FORMAT = """
+OUTPUT FORMAT (JSON only, no other text):
+{
+    "credibility_score": <0-100, where 100 is most credible>,
+    "fake_news_likelihood_percentage": <0-100, estimated likelihood of being misinformation>,
+    "fact_check_reasoning": "<detailed analysis of the content's credibility, 3-5 sentences>",
+    "confidence": "<high/medium/low, your confidence in this assessment>",
+    "key_claims": ["<list the 3-5 most important claims that should be fact-checked>", "..."],
+    "red_flags": ["<list any red flags found in the content or source>", "..."],
+    "recommendation": "<trustworthy/questionable/likely_false, your overall assessment>",
+    "source_reliability": "<reliable/mixed/unreliable, assessment of the source domain>"%s
+}
+"""
+
+FACT_CHECK = prompts.register(
+    'fact_check',
+    prefix="""
+You are a fact-checking assistant analyzing an article extracted from a webpage.
+The content was automatically extracted using web scraping and may contain some formatting artifacts.
+The user message gives the source information and the content to analyze.
+
+INSTRUCTIONS:
+1. Evaluate the credibility of the content considering the source and content
+2. Identify any potential misinformation, biases, or unsubstantiated claims
+3. Consider that the content was automatically extracted and may be missing some context
+4. Be particularly alert for:
+   - Sensational or emotionally charged language
+   - Lack of credible sources or references
+   - Logical fallacies or inconsistencies
+   - Outdated information (check against the publication date)
+   - Potential bias in the reporting
+5. If ALREADY VERIFIED CLAIMS are listed, claims in the content were checked before in other articles (disputed and false ones are quoted, the others counted) and the content is an excerpt: [...] marks passages left out because they only repeat those claims. Use their verdicts as part of your assessment, revise them only if the content or newer information changes their meaning, and leave them out of claim_verdicts
+""" + OUTPUT_FORMAT % """,
+    "claim_verdicts": [{"claim": "<a checkable factual claim, quoted as the exact sentence from the content>", "verdict": "<supported/disputed/false/unverifiable>", "explanation": "<one sentence>"}, "..."]""" + """
+IMPORTANT: Respond with ONLY the JSON object, no other text or markdown formatting.
+""",
+    suffix="""
+SOURCE ANALYSIS:
+- Source URL: {url}
+- Domain: {domain}
+- Article Title: "{title}"
+- Author: {author} (note: this may be incomplete as it's automatically extracted)
+- Publication Date: {date_published}
+- Content Length: {word_count} words
+{known_claims}
+CONTENT TO ANALYZE:
+""
+{content}
+""
+""",
+)
+
+# Map step of the chunked fact-check: one part of a long article
+FACT_CHECK_PART = prompts.register(
+    'fact_check_part',
+    prefix="""
+You are a fact-checking assistant. The user message holds one part of an article extracted from a webpage.
+Only assess that part; other parts are checked separately and merged afterwards.
+[...] marks passages left out because their claims were already verified in other articles.
+
+OUTPUT FORMAT (JSON only, no other text):
+{
+    "credibility_score": <0-100 for this part, where 100 is most credible>,
+    "fake_news_likelihood_percentage": <0-100 for this part>,
+    "summary": "<1-2 sentences on the credibility of this part>",
+    "key_claims": ["<the most important claims in this part that should be fact-checked>", "..."],
+    "red_flags": ["<red flags found in this part>", "..."],
+    "claim_verdicts": [{"claim": "<a checkable factual claim, quoted as the exact sentence from this part>", "verdict": "<supported/disputed/false/unverifiable>", "explanation": "<one sentence>"}, "..."]
+}
+""",
+    suffix="""
+SOURCE:
+- Source URL: {url}
+- Domain: {domain}
+- Article Title: "{title}"
+- Publication Date: {date_published}
+
+ARTICLE PART {index} OF {total}:
+""
+{chunk}
+""
+""",
+)
+
+# Reduce step of the chunked fact-check: merge the per-part findings
+FACT_CHECK_MERGE = prompts.register(
+    'fact_check_merge',
+    prefix="""
+You are a fact-checking assistant. An article was too long to check in one pass, so it was split into
+parts and each part was assessed separately. The user message gives the per-part findings; merge them into
+one assessment of the whole article. If ALREADY VERIFIED CLAIMS are listed (from other articles), take
+those verdicts into account.
+""" + OUTPUT_FORMAT % '',
+    suffix="""
+SOURCE:
+- Source URL: {url}
+- Domain: {domain}
+- Article Title: "{title}"
+- Author: {author}
+- Publication Date: {date_published}
+- Content Length: {word_count} words
+
+PER-PART FINDINGS FOR {total} PARTS (JSON):
+{findings}
+{known_claims}
+""",
+)
+
+
+def known_claims_section(known_claims):
+    """Suffix section listing claims verified elsewhere, or '' when there are none"""
+    if not known_claims:
+        return ''
+    return f"\nALREADY VERIFIED CLAIMS:\n{format_known_claims(known_claims)}\n"
@@ -0,0 +1,116 @@
+"""
+Content quality gate.
+
+Runs locally right after extraction and decides whether the text is worth a
+fact-check LLM call. Cookie walls, paywall teasers, "enable JavaScript"
+interstitials, bot checks and stubs are rejected with the reasons that
+tripped, which feed per-reason and per-strategy counters for tuning the
+extractor.
+
+Signals:
+- length: words in the extracted text
+- boilerplate ratio: share of characters in short lines (menus, buttons,
+  captions) and lines repeated within the page
+- consent/paywall phrases: known interstitial wording
+- link density: share of characters in lines that are just the text of a
+  link on the page (related-article lists, navigation)
+"""
+import html
+import re
+from collections import Counter
+
+from django.conf import settings
+
+from api import metrics
+
+# Wording of consent walls, paywalls, JS interstitials and bot checks
+BLOCKER_PHRASES = re.compile(
+    r'enable javascript|javascript is (?:disabled|required)|turn on javascript|'
+    r'we use cookies|accept (?:all )?cookies|cookie (?:policy|settings|preferences)|manage (?:your )?consent|'
+    r'subscribe (?:now )?to (?:continue|read)|already a subscriber|subscribers only|for subscribers|'
+    r'sign in to (?:continue|read)|create a free account to|log in to continue|'
+    r'reached your (?:free )?(?:article|story) limit|free articles? (?:left|remaining)|'
+    r'disable your ad ?blocker|turn off your ad ?blocker|'
+    r'are you a robot|verify (?:that )?you are (?:a )?human|complete the captcha|access denied|unusual traffic',
+    re.IGNORECASE,
+)
+
+_ANCHOR_RE = re.compile(rb'<a\b[^>]*>(.*?)</a\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# Lines shorter than this many words count as boilerplate
+SHORT_LINE_WORDS = 5
+
+
+def _normalize(line):
+    return ' '.join(line.lower().split())
+
+
+def _anchor_texts(body, encoding):
+    texts = set()
+    for raw in _ANCHOR_RE.findall(body):
+        text = _normalize(html.unescape(_TAG_RE.sub(' ', raw.decode(encoding or 'utf-8', errors='replace'))))
+        if text:
+            texts.add(text)
+    return texts
+
+
+def assess_content(text, body=b'', encoding=None, strategy=None):
+    """
+    Score extracted text. Returns a dict with 'passed', 'score' (0-1),
+    'reasons' and the individual signals.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    total_chars = sum(len(line) for line in lines) or 1
+    word_count = len(text.split())
+
+    repeats = Counter(_normalize(line) for line in lines)
+    boilerplate_chars = sum(
+        len(line) for line in lines
+        if len(line.split()) < SHORT_LINE_WORDS or repeats[_normalize(line)] > 1
+    )
+    boilerplate_ratio = boilerplate_chars / total_chars
+
+    anchors = _anchor_texts(body, encoding) if body else set()
+    link_chars = sum(len(line) for line in lines if _normalize(line) in anchors)
+    link_density = link_chars / total_chars
+
+    phrases = sorted({match.lower() for match in BLOCKER_PHRASES.findall(text)})
+
+    reasons = []
+    if strategy == 'none':
+        reasons.append('no_content')
+    if word_count < settings.QUALITY_MIN_WORDS:
+        reasons.append('too_short')
+    if boilerplate_ratio > settings.QUALITY_MAX_BOILERPLATE_RATIO:
+        reasons.append('boilerplate')
+    if link_density > settings.QUALITY_MAX_LINK_DENSITY:
+        reasons.append('link_heavy')
+    # A real article may mention cookies once; an interstitial is mostly that wording
+    if phrases and word_count < settings.QUALITY_BLOCKER_MAX_WORDS:
+        reasons.append('consent_or_paywall')
+
+    score = (
+        min(1.0, word_count / (3 * settings.QUALITY_MIN_WORDS))
+        * (1 - boilerplate_ratio)
+        * (1 - link_density)
+        * 0.5 ** len(phrases)
+    )
+    return {
+        'passed': not reasons,
+        'score': round(score, 3),
+        'reasons': reasons,
+        'word_count': word_count,
+        'boilerplate_ratio': round(boilerplate_ratio, 3),
+        'link_density': round(link_density, 3),
+        'blocker_phrases': phrases,
+        'strategy': strategy,
+    }
+
+
+def record_rejection(quality):
+    """Count a rejected extraction by reason and by the strategy that produced it"""
+    metrics.incr('fake_news.quality.rejected')
+    metrics.incr(f'fake_news.quality.rejected.strategy.{quality.get("strategy") or "unknown"}')
+    for reason in quality['reasons']:
+        metrics.incr(f'fake_news.quality.rejected.reason.{reason}')
@@ -0,0 +1,156 @@
+"""
+Structured-data fast path for article extraction.
+
+Most publishers embed a schema.org NewsArticle block (application/ld+json)
+and OpenGraph/article meta tags. Both can be read with a cheap scan of the raw
+bytes, i.e. just the <head> meta tags and the ld+json script bodies, without
+building a DOM. When the block carries a full articleBody the DOM heuristics
+are skipped entirely; otherwise its author/date/title still take precedence
+over what the DOM meta loop finds.
+"""
+import html
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_TYPES = {
+    'Article', 'NewsArticle', 'ReportageNewsArticle', 'AnalysisNewsArticle', 'OpinionNewsArticle',
+    'BackgroundNewsArticle', 'ReviewNewsArticle', 'BlogPosting', 'LiveBlogPosting', 'Report',
+}
+
+_JSONLD_RE = re.compile(
+    rb'<script\b[^>]*\btype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script\s*>',
+    re.IGNORECASE | re.DOTALL,
+)
+_HEAD_END_RE = re.compile(rb'</head\s*>|<body[\s>]', re.IGNORECASE)
+_META_RE = re.compile(rb'<meta\b[^>]*>', re.IGNORECASE)
+_TITLE_RE = re.compile(rb'<title\b[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+_ATTR_RE = re.compile(r'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))')
+_TAG_RE = re.compile(r'<[^>]+>')
+
+# Without a closing </head> only look this far into the document for meta tags
+HEAD_SCAN_LIMIT = 64 * 1024
+
+# Meta tags in order of preference
+AUTHOR_META = ('author', 'article:author', 'og:article:author', 'parsely-author', 'sailthru.author', 'dc.creator')
+DATE_META = (
+    'article:published_time', 'og:published_time', 'datepublished', 'pubdate', 'publishdate',
+    'parsely-pub-date', 'sailthru.date', 'dc.date', 'date', 'timestamp',
+)
+TITLE_META = ('og:title', 'twitter:title')
+
+
+def _decode(raw, encoding):
+    return html.unescape(raw.decode(encoding or 'utf-8', errors='replace')).strip()
+
+
+def _head_meta(body, encoding):
+    """Map of lowercased meta name/property -> first non-empty content"""
+    match = _HEAD_END_RE.search(body, 0, HEAD_SCAN_LIMIT)
+    head = body[:match.start()] if match else body[:HEAD_SCAN_LIMIT]
+
+    meta = {}
+    for tag in _META_RE.findall(head):
+        attrs = {}
+        for name, dq, sq, bare in _ATTR_RE.findall(tag.decode(encoding or 'utf-8', errors='replace')):
+            attrs[name.lower()] = dq or sq or bare
+        key = (attrs.get('property') or attrs.get('name') or attrs.get('itemprop') or '').lower()
+        content = html.unescape(attrs.get('content', '')).strip()
+        if key and content and key not in meta:
+            meta[key] = content
+
+    title_match = _TITLE_RE.search(head)
+    if title_match:
+        meta.setdefault('<title>', _decode(title_match.group(1), encoding))
+    return meta
+
+
+def _iter_nodes(data):
+    """Walk JSON-LD data, yielding every dict (handles lists and @graph)"""
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_nodes(item)
+    elif isinstance(data, dict):
+        yield data
+        for key in ('@graph', 'mainEntity', 'mainEntityOfPage'):
+            if isinstance(data.get(key), (list, dict)):
+                yield from _iter_nodes(data[key])
+
+
+def _is_article(node):
+    types = node.get('@type')
+    if isinstance(types, str):
+        types = [types]
+    return isinstance(types, list) and any(t in ARTICLE_TYPES for t in types if isinstance(t, str))
+
+
+def _names(value):
+    """Author field -> 'Name A, Name B'"""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return _names(value.get('name', ''))
+    if isinstance(value, list):
+        return ', '.join(name for name in (_names(v) for v in value) if name)
+    return ''
+
+
+def _clean_body(value):
+    if not isinstance(value, str):
+        return ''
+    return _TAG_RE.sub(' ', html.unescape(value)).strip()
+
+
+def _article_node(body, encoding):
+    """The ld+json node with the longest articleBody, or the first article node"""
+    best = None
+    for raw in _JSONLD_RE.findall(body):
+        try:
+            data = json.loads(raw.decode(encoding or 'utf-8', errors='replace'), strict=False)
+        except ValueError:
+            continue
+        for node in _iter_nodes(data):
+            if not _is_article(node):
+                continue
+            if best is None or len(_clean_body(node.get('articleBody'))) > len(_clean_body(best.get('articleBody'))):
+                best = node
+    return best or {}
+
+
+def _first(meta, keys):
+    for key in keys:
+        value = meta.get(key, '')
+        # article:author is frequently a profile URL rather than a name
+        if value and not value.startswith(('http://', 'https://')):
+            return value
+    return ''
+
+
+def extract_structured_data(body, encoding=None):
+    """
+    Read title/text/author/date from JSON-LD and head meta tags.
+
+    Returns a dict with the same keys as the DOM engines; missing fields are
+    empty strings.
+    """
+    meta = _head_meta(body, encoding)
+    node = _article_node(body, encoding)
+
+    date_published = node.get('datePublished') or _first(meta, DATE_META)
+    return {
+        'title': (
+            _clean_body(node.get('headline'))
+            or _first(meta, TITLE_META)
+            or meta.get('<title>', '')
+        ),
+        'text': _clean_body(node.get('articleBody')),
+        'author': _names(node.get('author')) or _first(meta, AUTHOR_META),
+        'date_published': date_published if isinstance(date_published, str) else '',
+    }
+
+
+def is_complete(structured, min_words):
+    """True if the structured data alone is good enough to skip the DOM walk"""
+    return bool(structured['title']) and len(structured['text'].split()) >= min_words
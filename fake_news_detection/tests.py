@@ -1,3 +1,831 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.core.cache import caches
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from api import llm, metrics
+from api import bulkhead as bulkhead_module
+from api.bulkhead import get_bulkhead, mark_upstream_call
+from api.resilience import Deadline
+from . import article_cache, chunked_fact_check, claim_cache, extraction, fetching, near_duplicates, views
+from .domain_templates import DomainTemplates
+from .fetching import read_html_capped
+from .near_duplicates import NearDuplicateIndex, signature
+from .quality_gate import assess_content, record_rejection
+from .structured_data import extract_structured_data
+from .models import ClaimVerdict
+
+PARAGRAPH = '<p>' + 'Reporting from the scene of the story. ' * 10 + '</p>'
+
+
+def read(html, max_bytes=1024 * 1024, chunk_size=256, headers=None):
+    body = html.encode('utf-8')
+
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=chunks(), headers=headers))
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream('GET', 'https://example.com/story') as response:
+                return await read_html_capped(response, max_bytes)
+
+    return asyncio.run(run())
+
+
+@override_settings(ARTICLE_EARLY_STOP_MIN_CHARS=1000, ARTICLE_EARLY_STOP_MIN_BYTES=0)
+class ReadHtmlCappedTests(SimpleTestCase):
+    footer = '<footer>' + '<a href="/x">Related story</a>' * 400 + '</footer></body></html>'
+
+    def test_stops_after_article_with_enough_text(self):
+        html = f'<html><body><article>{PARAGRAPH * 5}</article>{self.footer}'
+        body, truncated, stopped_early = read(html)
+        self.assertTrue(stopped_early)
+        self.assertFalse(truncated)
+        self.assertIn(PARAGRAPH * 5, body.decode())
+        self.assertLess(len(body), len(html))
+
+    def test_teaser_articles_dont_stop_the_download(self):
+        teasers = '<article><h2>Teaser</h2><p>Short blurb.</p></article>' * 5
+        html = f'<html><body><main>{teasers}<div>{PARAGRAPH * 5}</div></main>{self.footer}'
+        body, _, stopped_early = read(html)
+        self.assertTrue(stopped_early)
+        self.assertIn(PARAGRAPH * 5 + '</div></main>', body.decode())
+
+    def test_scripts_dont_count_as_text(self):
+        script = '<script>' + 'var x = 1;' * 500 + '</script>'
+        html = f'<html><body><article>{script}<p>Short.</p></article>{PARAGRAPH * 5}</body></html>'
+        body, _, stopped_early = read(html)
+        self.assertFalse(stopped_early)
+        self.assertEqual(body.decode(), html)
+
+    def test_reads_to_byte_cap_without_a_large_region(self):
+        html = f'<html><body><div>{PARAGRAPH * 50}</div></body></html>'
+        body, truncated, stopped_early = read(html, max_bytes=4096)
+        self.assertTrue(truncated)
+        self.assertFalse(stopped_early)
+        self.assertEqual(len(body), 4096)
+
+    @override_settings(ARTICLE_EARLY_STOP_MIN_BYTES=1024 * 1024)
+    def test_small_declared_body_is_read_whole(self):
+        html = f'<html><body><article>{PARAGRAPH * 5}</article>{self.footer}'
+        body, _, stopped_early = read(html, headers={'Content-Length': str(len(html.encode()))})
+        self.assertFalse(stopped_early)
+        self.assertEqual(body.decode(), html)
+
+
+ARTICLE_URL = 'https://news.example.com/2026/10/council-budget'
+ARTICLE_HTML = (
+    '<html><head><title>Council approves budget</title></head><body>'
+    f'<article><h1>Council approves budget</h1>{PARAGRAPH * 8}</article></body></html>'
+)
+
+
+def fetch(handler, url=ARTICLE_URL, deadline=10):
+    """
+    extract_data_from_url_async with handler(request) answering for the site;
+    returns (result, progress events, requests made)
+    """
+    events, requests = [], []
+
+    def respond(request):
+        requests.append(request)
+        return handler(request)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond), follow_redirects=True) as client:
+            with mock.patch.object(views, 'get_http_client', return_value=client):
+                return await views.extract_data_from_url_async(
+                    url, Deadline(deadline), progress=lambda event, data: events.append((event, data))
+                )
+
+    return asyncio.run(run()), events, requests
+
+
+class FetchTestCase(SimpleTestCase):
+    """Each test starts with an empty article cache and no host health history"""
+
+    def setUp(self):
+        caches['articles'].clear()
+        patcher = mock.patch.object(fetching, '_host_health', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@override_settings(ARTICLE_MAX_BYTES=4096, ARTICLE_EARLY_STOP_MIN_CHARS=100000)
+class StreamingFetchTests(FetchTestCase):
+    def test_body_is_cut_at_the_byte_cap(self):
+        html = f'<html><body><div>{PARAGRAPH * 50}</div></body></html>'
+        result, events, _ = fetch(lambda request: httpx.Response(200, html=html))
+        fetched = dict(events)['fetched']
+        self.assertEqual((fetched['bytes'], fetched['truncated'], fetched['cached']), (4096, True, False))
+        self.assertTrue(result['success'])
+        self.assertIn('Reporting from the scene', result['text'])
+        self.assertLess(len(result['text']), len(html))
+
+    def test_small_page_is_read_whole(self):
+        result, events, _ = fetch(lambda request: httpx.Response(200, html=ARTICLE_HTML))
+        self.assertFalse(dict(events)['fetched']['truncated'])
+        self.assertEqual(result['domain'], 'news.example.com')
+
+
+@override_settings(ARTICLE_CACHE_TTL=600)
+class ArticleCacheTests(FetchTestCase):
+    def test_tracking_and_amp_variants_share_a_key(self):
+        canonical = article_cache.canonicalize_url('https://News.Example.com/story?id=7')
+        for variant in (
+            'https://news.example.com/story/amp?id=7&utm_source=x',
+            'https://news.example.com:443/story.amp?fbclid=abc&id=7',
+            'https://news.example.com/story?amp=1&id=7#comments',
+        ):
+            self.assertEqual(article_cache.canonicalize_url(variant), canonical)
+        self.assertNotEqual(article_cache.canonicalize_url('https://news.example.com/story?id=8'), canonical)
+
+    def test_fresh_entry_is_served_without_a_request(self):
+        site = lambda request: httpx.Response(200, html=ARTICLE_HTML, headers={'ETag': '"v1"'})
+        first, _, requests = fetch(site)
+        second, events, more = fetch(site, url=f'{ARTICLE_URL}?utm_campaign=share')
+        self.assertEqual((len(requests), len(more)), (1, 0))
+        self.assertEqual(second['text'], first['text'])
+        self.assertEqual(second['url'], f'{ARTICLE_URL}?utm_campaign=share')
+        self.assertTrue(dict(events)['fetched']['cached'])
+
+    def test_stale_entry_is_revalidated_and_reused_on_304(self):
+        def site(request):
+            if request.headers.get('If-None-Match') == '"v1"':
+                return httpx.Response(304, headers={'ETag': '"v1"'})
+            return httpx.Response(200, html=ARTICLE_HTML, headers={'ETag': '"v1"'})
+
+        first, _, _ = fetch(site)
+        with mock.patch.object(article_cache.time, 'time', return_value=time.time() + 601):
+            second, events, requests = fetch(site)
+            self.assertEqual(requests[0].headers['If-None-Match'], '"v1"')
+            self.assertEqual(dict(events)['fetched']['status'], 304)
+            self.assertEqual(second['text'], first['text'])
+            # The 304 made the entry fresh again
+            _, _, requests = fetch(site)
+            self.assertEqual(requests, [])
+
+    def test_changed_article_is_downloaded_again(self):
+        html = {'body': ARTICLE_HTML}
+
+        def site(request):
+            return httpx.Response(200, html=html['body'], headers={'ETag': f'"{len(html["body"])}"'})
+
+        fetch(site)
+        html['body'] = ARTICLE_HTML.replace('Council approves budget', 'Council rejects budget')
+        with mock.patch.object(article_cache.time, 'time', return_value=time.time() + 601):
+            result, events, requests = fetch(site)
+        self.assertEqual(requests[0].headers['If-None-Match'], f'"{len(ARTICLE_HTML)}"')
+        self.assertFalse(dict(events)['fetched']['cached'])
+        self.assertEqual(result['title'], 'Council rejects budget')
+
+    def test_short_link_is_aliased_to_the_article(self):
+        def site(request):
+            if request.url.host == 'sho.rt':
+                return httpx.Response(301, headers={'Location': ARTICLE_URL})
+            return httpx.Response(200, html=ARTICLE_HTML)
+
+        fetch(site, url='https://sho.rt/abc')
+        result, _, requests = fetch(site, url='https://sho.rt/abc')
+        self.assertEqual(requests, [])
+        self.assertEqual(result['url'], 'https://sho.rt/abc')
+
+
+@override_settings(
+    ARTICLE_CACHE_TTL=600, FETCH_BLOCKED_TTL=3600, FETCH_RETRY_BASE_DELAY=0, FETCH_BREAKER_FAILURES=2,
+    FETCH_BREAKER_COOLDOWN=30, FETCH_BREAKER_MAX_COOLDOWN=600,
+)
+class HostHealthTests(FetchTestCase):
+    def quiet_fetch(self, handler, **kwargs):
+        # The retry loop prints each failed attempt
+        with redirect_stdout(io.StringIO()):
+            return fetch(handler, **kwargs)
+
+    def test_blocking_site_is_not_fetched_again(self):
+        result, _, requests = self.quiet_fetch(lambda request: httpx.Response(403))
+        self.assertEqual((result['status'], result['error_code'], len(requests)), ('blocked', 403, 1))
+        result, _, requests = self.quiet_fetch(lambda request: httpx.Response(200, html=ARTICLE_HTML))
+        self.assertEqual((result['status'], len(requests)), ('blocked', 0))
+        # Other sites are unaffected
+        result, _, _ = self.quiet_fetch(
+            lambda request: httpx.Response(200, html=ARTICLE_HTML), url='https://other.example.com/a'
+        )
+        self.assertTrue(result['success'])
+
+    def test_blocked_site_is_answered_from_a_stale_cache_entry(self):
+        first, _, _ = self.quiet_fetch(lambda request: httpx.Response(200, html=ARTICLE_HTML))
+        with mock.patch.object(article_cache.time, 'time', return_value=time.time() + 601):
+            self.quiet_fetch(lambda request: httpx.Response(403))
+            result, _, requests = self.quiet_fetch(lambda request: httpx.Response(403))
+        self.assertEqual(requests, [])
+        self.assertEqual(result['text'], first['text'])
+
+    def test_repeated_server_errors_open_the_host_circuit(self):
+        with self.assertLogs('fake_news_detection.views', 'WARNING'):
+            result, _, requests = self.quiet_fetch(lambda request: httpx.Response(503))
+        self.assertEqual((result['status'], len(requests)), ('error', 2))
+
+        result, _, requests = self.quiet_fetch(lambda request: httpx.Response(200, html=ARTICLE_HTML))
+        self.assertEqual((result['status'], result['error_code'], len(requests)), ('unavailable', 503, 0))
+        self.assertEqual(result['retry_after'], 30)
+
+    def test_client_errors_dont_count_against_the_host(self):
+        for _ in range(3):
+            result, _, requests = self.quiet_fetch(lambda request: httpx.Response(404))
+            self.assertEqual((result['status'], len(requests)), ('error', 1))
+        _, breakers = fetching.get_host_health()
+        self.assertEqual(breakers.open_keys(), {})
+
+
+@override_settings(
+    RESULTS_STORE_ENABLED=False, FACT_CHECK_RESERVE_SECONDS=35, FACT_CHECK_MIN_SECONDS=0.2, FACT_CHECK_CHUNKED=False,
+    QUALITY_GATE_ENABLED=False,
+)
+class AnalyzeDeadlineTests(FetchTestCase, TestCase):
+    def analyze(self, site, chat, seconds):
+        """analyze_url_async under a Deadline of seconds; returns (body, status, elapsed, LLM calls)"""
+        calls = []
+
+        async def chat_routed(route, prompt, timeout):
+            calls.append(timeout)
+            return await chat(timeout)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(site)) as client:
+                with mock.patch.object(views, 'get_http_client', return_value=client):
+                    return await views.analyze_url_async(ARTICLE_URL, Deadline(seconds))
+
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(views.llm, 'chat_routed_async', chat_routed), \
+                mock.patch.object(views, 'store_claim_verdicts', return_value=0), \
+                mock.patch.object(views, 'get_near_duplicate_index', return_value=NearDuplicateIndex(
+                    os.path.join(directory, 'index.json'), max_entries=10, ttl=3600, threshold=0.8, save_interval=3600
+                )):
+            started = time.monotonic()
+            body, status_code = asyncio.run(run())
+        return body, status_code, time.monotonic() - started, calls
+
+    async def answer(self, timeout):
+        return json.dumps({'credibility_score': 80, 'fake_news_likelihood_percentage': 10, 'recommendation': 'trustworthy'})
+
+    def test_slow_site_times_out_within_the_fetch_share(self):
+        async def site(request):
+            await asyncio.sleep(5)
+            return httpx.Response(200, html=ARTICLE_HTML)
+
+        with redirect_stdout(io.StringIO()):
+            body, status_code, elapsed, calls = self.analyze(site, self.answer, 1.0)
+        self.assertEqual((status_code, body['status']), (504, 'timeout'))
+        # Half the budget is kept back for the fact-check, so fetching gives up after about 0.5s
+        self.assertLess(elapsed, 0.9)
+        self.assertEqual(calls, [])
+        # Running out of our own time says nothing about the host
+        _, breakers = fetching.get_host_health()
+        self.assertEqual(breakers._state, {})
+
+    def test_slow_model_gives_a_partial_result_in_time(self):
+        async def slow(timeout):
+            await asyncio.wait_for(asyncio.sleep(5), timeout)
+
+        with self.assertLogs('fake_news_detection.views', 'WARNING'):
+            body, status_code, elapsed, calls = self.analyze(
+                lambda request: httpx.Response(200, html=ARTICLE_HTML), slow, 1.0
+            )
+        self.assertEqual((status_code, body['status']), (200, 'partial'))
+        self.assertEqual(body['fact_check_result']['analysis_mode'], 'degraded')
+        self.assertEqual(body['extracted_metadata']['title'], 'Council approves budget')
+        self.assertLessEqual(calls[0], 1.0)
+        self.assertLess(elapsed, 1.5)
+
+    @override_settings(FACT_CHECK_MIN_SECONDS=5)
+    def test_no_model_call_without_enough_time_left(self):
+        body, status_code, _, calls = self.analyze(lambda request: httpx.Response(200, html=ARTICLE_HTML), self.answer, 3)
+        self.assertEqual(calls, [])
+        self.assertEqual((status_code, body['status']), (200, 'partial'))
+
+    def test_fast_pipeline_is_a_full_success(self):
+        body, status_code, _, calls = self.analyze(lambda request: httpx.Response(200, html=ARTICLE_HTML), self.answer, 10)
+        self.assertEqual((status_code, body['status']), (200, 'success'))
+        self.assertEqual(body['fact_check_result']['credibility_score'], 80)
+        self.assertEqual(len(calls), 1)
+
+
+ARTICLE_TEXT = '\n'.join(
+    f'Paragraph {i}: the council debated the budget for hours, and members from both parties spoke at length.'
+    for i in range(12)
+)
+
+
+@override_settings(
+    QUALITY_MIN_WORDS=80, QUALITY_MAX_BOILERPLATE_RATIO=0.6, QUALITY_MAX_LINK_DENSITY=0.5, QUALITY_BLOCKER_MAX_WORDS=400,
+)
+class QualityGateTests(SimpleTestCase):
+    def test_article_passes(self):
+        quality = assess_content(ARTICLE_TEXT, strategy='lxml')
+        self.assertEqual((quality['passed'], quality['reasons']), (True, []))
+        self.assertGreater(quality['score'], 0.8)
+
+    def test_reject_reasons(self):
+        menu = '\n'.join(['Home', 'World', 'Sport', 'Business', 'Sign up'] * 100)
+        related = '\n'.join(f'Council story number {i} that you might also like to read' for i in range(20))
+        related_links = ''.join(f'<a href="/s/{i}">Council story number {i} that you might also like to read</a>' for i in range(20))
+        cookie_wall = 'We use cookies to improve your experience. Accept all cookies to continue reading this article.'
+        cases = {
+            'too_short': (('Council approves budget.',), {}),
+            'boilerplate': ((f'{ARTICLE_TEXT}\n{menu}',), {}),
+            'link_heavy': ((f'{ARTICLE_TEXT[:400]}\n{related}', f'<html>{related_links}</html>'.encode()), {}),
+            'consent_or_paywall': ((f'{cookie_wall}\n{ARTICLE_TEXT}',), {}),
+            'no_content': ((ARTICLE_TEXT,), {'strategy': 'none'}),
+        }
+        for reason, (args, kwargs) in cases.items():
+            with self.subTest(reason=reason):
+                quality = assess_content(*args, **kwargs)
+                self.assertFalse(quality['passed'])
+                self.assertIn(reason, quality['reasons'])
+
+    def test_long_article_mentioning_cookies_passes(self):
+        more = '\n'.join(f'Paragraph {i}: residents told reporters the new clinics were overdue.' for i in range(12, 40))
+        text = f'Officials said "we use cookies" appeared on the fake site.\n{ARTICLE_TEXT}\n{more}'
+        quality = assess_content(text)
+        self.assertTrue(quality['passed'])
+        self.assertEqual(quality['blocker_phrases'], ['we use cookies'])
+
+    def test_rejections_are_counted_by_reason_and_strategy(self):
+        before = metrics.get('fake_news.quality.rejected.reason.too_short'), metrics.get('fake_news.quality.rejected.strategy.jsonld')
+        record_rejection(assess_content('Council approves budget.', strategy='jsonld'))
+        after = metrics.get('fake_news.quality.rejected.reason.too_short'), metrics.get('fake_news.quality.rejected.strategy.jsonld')
+        self.assertEqual((after[0] - before[0], after[1] - before[1]), (1, 1))
+
+    @override_settings(QUALITY_GATE_ENABLED=True, RESULTS_STORE_ENABLED=False)
+    def test_rejected_page_gets_422_without_an_llm_call(self):
+        caches['articles'].clear()
+        page = '<html><body><div class="consent"><p>We use cookies. Accept all cookies to continue.</p></div></body></html>'
+
+        async def run():
+            transport = httpx.MockTransport(lambda request: httpx.Response(200, html=page))
+            async with httpx.AsyncClient(transport=transport) as client:
+                with mock.patch.object(views, 'get_http_client', return_value=client):
+                    return await views.analyze_url_async('https://walled.example.com/story', Deadline(10))
+
+        with mock.patch.object(views.llm, 'chat_routed_async', side_effect=AssertionError), \
+                self.assertLogs('fake_news_detection.views', 'INFO'):
+            body, status_code = asyncio.run(run())
+        self.assertEqual((status_code, body['status']), (422, 'insufficient_content'))
+        self.assertIn('consent_or_paywall', body['quality']['reasons'])
+
+
+SAMPLE_PAGE = """<html><head>
+<title>Council approves budget</title>
+<meta name="author" content="Jane Reporter">
+<meta property="article:published_time" content="2026-10-14T09:00:00Z">
+</head><body>
+<header><h1>News Site navigation headline here</h1></header>
+<div class="sidebar-post"><p>A related post teaser that should not be picked as the article.</p></div>
+<div class="entry-content">
+<h2>Council approves the 2027 budget</h2>
+<p>The city council approved a $2.1 billion budget on Tuesday after a long debate.</p>
+<script>var tracking = "This script text is not part of the article at all";</script>
+<p>Council members said the plan funds <b>four new clinics</b> and road repairs.</p>
+<aside><p>Advertisement text that sits inside the content container.</p></aside>
+<p>Short.</p>
+</div>
+<footer><p>Copyright News Site, all rights reserved worldwide.</p></footer>
+</body></html>""".encode()
+
+
+class ArticleExtractionTests(SimpleTestCase):
+    def test_lxml_engine_extracts_the_sample_page(self):
+        extracted = extraction.extract_with_lxml(SAMPLE_PAGE)
+        self.assertEqual(extracted['title'], 'Council approves budget')
+        self.assertEqual(extracted['author'], 'Jane Reporter')
+        self.assertEqual(extracted['date_published'], '2026-10-14T09:00:00Z')
+        self.assertEqual(extracted['selector'], 'div.entry-content')
+        self.assertEqual(extracted['text'], (
+            '\n\nCOUNCIL APPROVES THE 2027 BUDGET\n'
+            '\nThe city council approved a $2.1 billion budget on Tuesday after a long debate.'
+            '\nCouncil members said the plan funds four new clinics and road repairs.'
+        ))
+
+    def test_lxml_engine_matches_the_selector_cascade(self):
+        pages = [
+            SAMPLE_PAGE,
+            f'<html><body><main><p>{"Main element text that is long enough. " * 5}</p></main></body></html>'.encode(),
+            f'<html><body><div id="content"><p>{"Text in a div with an id. " * 5}</p></div></body></html>'.encode(),
+            b'<html><body><div class="story"><p>Too short.</p>Loose text outside any paragraph tag.</div></body></html>',
+        ]
+        for page in pages:
+            with self.subTest(page=page[:60]):
+                self.assertEqual(extraction.extract_with_lxml(page), extraction.extract_with_soup(page))
+
+    def test_unparsable_body_gives_an_empty_extraction(self):
+        self.assertEqual(extraction.extract_with_lxml(b'')['text'], '')
+
+    def test_extractor_setting_picks_the_dom_engine(self):
+        with override_settings(ARTICLE_EXTRACTOR='lxml', EXTRACTION_STRATEGIES=[]):
+            self.assertEqual(extraction.default_strategies(), ['jsonld', 'lxml', 'boilerpy3'])
+        with override_settings(ARTICLE_EXTRACTOR='html5', EXTRACTION_STRATEGIES=[]), \
+                self.assertLogs('fake_news_detection.extraction', 'WARNING'):
+            self.assertEqual(extraction.default_strategies(), ['jsonld', 'selectors', 'boilerpy3'])
+
+
+ARTICLE_BODY = ' '.join(f'Sentence {i} of the article body &amp; its <em>reporting</em>.' for i in range(40))
+JSONLD_PAGE = f"""<html><head>
+<title>Budget vote | News Site</title>
+<meta property="og:title" content="Council approves budget (OpenGraph)">
+<script type="application/ld+json">{{ not json }}</script>
+<script type="application/ld+json">{{"@context": "https://schema.org", "@graph": [
+  {{"@type": "WebPage", "name": "Budget vote"}},
+  {{"@type": ["NewsArticle"], "headline": "Council approves budget", "datePublished": "2026-10-14T09:00:00Z",
+    "author": [{{"@type": "Person", "name": "Jane Reporter"}}, {{"name": "Sam Writer"}}],
+    "articleBody": "{ARTICLE_BODY}"}}
+]}}</script>
+</head><body><div class="content"><p>{'DOM text that the fast path never reads. ' * 5}</p></div></body></html>""".encode()
+
+
+@override_settings(STRUCTURED_DATA_MIN_WORDS=150, EXTRACTION_STRATEGIES=[], ARTICLE_EXTRACTOR='bs4')
+class StructuredDataTests(SimpleTestCase):
+    def test_jsonld_article_is_read_without_the_dom(self):
+        structured = extract_structured_data(JSONLD_PAGE)
+        self.assertEqual(structured['title'], 'Council approves budget')
+        self.assertEqual(structured['author'], 'Jane Reporter, Sam Writer')
+        self.assertEqual(structured['date_published'], '2026-10-14T09:00:00Z')
+        self.assertTrue(structured['text'].startswith('Sentence 0 of the article body & its  reporting . Sentence 1'))
+
+        with mock.patch.dict(extraction.STRATEGIES, selectors=mock.Mock(side_effect=AssertionError)):
+            extracted = extraction.extract_article(JSONLD_PAGE)
+        self.assertEqual(extracted['strategy'], 'jsonld')
+        self.assertNotIn('DOM text', extracted['text'])
+
+    def test_meta_tags_fill_in_without_jsonld(self):
+        page = b"""<html><head><title>Budget vote | News Site</title>
+        <meta property="og:title" content="Council approves budget">
+        <meta property="article:author" content="https://news.example.com/staff/jane">
+        <meta name="parsely-author" content="Jane Reporter">
+        <meta name="pubdate" content="2026-10-14">
+        </head><body><p>Body.</p></body></html>"""
+        self.assertEqual(extract_structured_data(page), {
+            'title': 'Council approves budget', 'text': '', 'author': 'Jane Reporter', 'date_published': '2026-10-14',
+        })
+
+    def test_short_article_body_falls_through_to_the_dom_with_publisher_metadata(self):
+        page = JSONLD_PAGE.replace(ARTICLE_BODY.encode(), b'Only a teaser.')
+        extracted = extraction.extract_article(page)
+        self.assertEqual(extracted['strategy'], 'selectors')
+        self.assertIn('DOM text', extracted['text'])
+        self.assertEqual(extracted['title'], 'Council approves budget')
+        self.assertEqual(extracted['author'], 'Jane Reporter, Sam Writer')
+
+
+@override_settings(NEWS_BATCH_CONCURRENCY=3, NEWS_BATCH_PER_DOMAIN_CONCURRENCY=2, NEWS_BATCH_MAX_URLS=10)
+class NewsBatchTests(SimpleTestCase):
+    def analyze(self, urls, fail=()):
+        """analyze_urls_async with a slow fake pipeline; returns (results, peak in flight, peak per domain, calls)"""
+        in_flight, peaks, calls = {}, {'all': 0}, []
+
+        async def analyze_url(url, deadline, endpoint):
+            domain = url.split('/')[2]
+            calls.append(url)
+            in_flight[domain] = in_flight.get(domain, 0) + 1
+            peaks[domain] = max(peaks.get(domain, 0), in_flight[domain])
+            peaks['all'] = max(peaks['all'], sum(in_flight.values()))
+            await asyncio.sleep(0.01)
+            in_flight[domain] -= 1
+            if url in fail:
+                raise ConnectionError('connection reset')
+            return {'status': 'success', 'endpoint': endpoint}, 200
+
+        with mock.patch.object(views, 'analyze_url_async', analyze_url):
+            results = asyncio.run(views.analyze_urls_async(urls, Deadline(10)))
+        return results, peaks.pop('all'), peaks, calls
+
+    def test_concurrency_is_capped_globally_and_per_domain(self):
+        urls = [f'https://busy.example.com/{i}' for i in range(6)] + [f'https://other{i}.example.com/' for i in range(4)]
+        results, peak, per_domain, _ = self.analyze(urls)
+        self.assertEqual(peak, 3)
+        self.assertEqual(per_domain['busy.example.com'], 2)
+        self.assertEqual([result['url'] for result in results], urls)
+        self.assertTrue(all(result['endpoint'] == 'analyze_batch' for result in results))
+
+    def test_duplicates_are_analyzed_once_and_failures_stay_per_url(self):
+        urls = ['https://a.example.com/1', 'https://b.example.com/1', 'https://a.example.com/1']
+        with self.assertLogs('fake_news_detection.views', 'ERROR'):
+            results, _, _, calls = self.analyze(urls, fail={'https://b.example.com/1'})
+        self.assertEqual(sorted(calls), ['https://a.example.com/1', 'https://b.example.com/1'])
+        self.assertEqual([result['http_status'] for result in results], [200, 500, 200])
+        self.assertEqual(results[1]['status'], 'error')
+
+    def test_endpoint_validates_and_summarises(self):
+        def post(urls):
+            return views.analyze_news_batch(APIRequestFactory().post('/', {'urls': urls}, format='json'))
+
+        self.assertEqual(post([]).status_code, 400)
+        self.assertEqual(post(['https://a.example.com/', ' ']).status_code, 400)
+        self.assertEqual(post([f'https://a.example.com/{i}' for i in range(11)]).status_code, 400)
+
+        async def analyze_urls(urls, deadline):
+            return [{'url': url, 'status': 'success' if 'ok' in url else 'blocked'} for url in urls]
+
+        with mock.patch.object(views, 'analyze_urls_async', analyze_urls):
+            response = post([' https://a.example.com/ok ', 'https://b.example.com/x', 'https://c.example.com/ok'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'], {'total': 3, 'success': 2, 'blocked': 1})
+        self.assertEqual(response.data['results'][0]['url'], 'https://a.example.com/ok')
+
+
+CLAIM = 'The minister confirmed on Tuesday that four new hospitals will open.'
+
+
+@override_settings(CLAIM_CACHE_HIT_FLUSH_INTERVAL=3600)
+class ClaimCacheTests(TestCase):
+    def setUp(self):
+        claim_cache._pending_hits.clear()
+        claim_cache._last_hits_flush = time.monotonic()
+        ClaimVerdict.objects.create(
+            claim_hash=claim_cache.claim_hash(CLAIM), claim=CLAIM, verdict='supported', explanation='Announced.'
+        )
+
+    def test_known_claims_are_hints_with_their_age(self):
+        text = f'Residents of the town waited for news all week long. {CLAIM}'
+        content, known = claim_cache.find_known_claims(text, 'test')
+        self.assertEqual([k['claim'] for k in known], [CLAIM])
+        self.assertEqual(claim_cache.format_known_claims(known), '- 1 more: 1 supported')
+        known[0]['verdict'] = 'false'
+        self.assertIn(f'"{CLAIM}" => false (checked ', claim_cache.format_known_claims(known))
+
+    @override_settings(CLAIM_CACHE_CONTEXT_SENTENCES=1)
+    def test_only_novel_claims_and_their_context_are_sent(self):
+        filler = [f'Paragraph {i} repeats what the wire story already said in full.' for i in range(1, 7)]
+        novel = 'A local nurse said the nearest of the hospitals has no staff yet.'
+        for sentence in filler:
+            ClaimVerdict.objects.create(claim_hash=claim_cache.claim_hash(sentence), claim=sentence, verdict='supported')
+        text = '\n'.join([f'{filler[0]} {filler[1]}', f'{CLAIM} {filler[2]}', f'{filler[3]} {novel} {filler[4]}', filler[5]])
+        content, known = claim_cache.find_known_claims(text, 'test')
+        self.assertEqual(len(known), 7)
+        self.assertEqual(content, f'{filler[0]} {filler[1]}\n[...]\n{filler[3]} {novel} {filler[4]}\n[...]')
+
+    def test_articles_without_known_claims_are_sent_whole(self):
+        text = 'Nobody has checked this sentence before today.\nOr this second one, written just now.'
+        self.assertEqual(claim_cache.find_known_claims(text, 'test'), (text, []))
+
+    def test_hits_are_written_in_batches(self):
+        for _ in range(3):
+            claim_cache.find_known_claims(CLAIM, 'test')
+        self.assertEqual(ClaimVerdict.objects.get().hits, 0)
+        claim_cache._flush_hits(force=True)
+        self.assertEqual(ClaimVerdict.objects.get().hits, 3)
+
+    def test_hit_rate_counts_sentences(self):
+        before = metrics.get('fake_news.claims.rate.hit'), metrics.get('fake_news.claims.rate.novel')
+        claim_cache.find_known_claims(f'{CLAIM} Nobody has checked this other sentence before today.', 'rate')
+        after = metrics.get('fake_news.claims.rate.hit'), metrics.get('fake_news.claims.rate.novel')
+        self.assertEqual((after[0] - before[0], after[1] - before[1]), (1, 1))
+
+
+class DomainTemplatesTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'templates.json')
+
+    def make(self):
+        return DomainTemplates(self.path, max_domains=10, save_interval=3600)
+
+    def test_workers_sharing_the_file_keep_each_others_stats(self):
+        first, second = self.make(), self.make()
+        first.record('www.example.com', 'readability', True, 120.0, selector='article')
+        second.record('example.com', 'trafilatura', False, 80.0)
+        second.record('other.org', 'readability', True, 50.0)
+        first.save()
+        second.save()
+
+        stats = self.make()._domains['example.com']['strategies']
+        self.assertEqual(stats['readability']['successes'], 1)
+        self.assertEqual(stats['trafilatura']['attempts'], 1)
+        self.assertEqual(self.make().selector('example.com'), 'article')
+        # The second worker adopted the first one's statistics when it saved
+        self.assertEqual(second.selector('example.com'), 'article')
+        self.assertEqual(len(second), 2)
+
+    def test_saving_twice_does_not_count_twice(self):
+        templates = self.make()
+        templates.record('example.com', 'readability', True, 100.0)
+        templates.save()
+        templates.record('example.com', 'readability', True, 100.0)
+        templates.save()
+        self.assertEqual(self.make()._domains['example.com']['strategies']['readability']['attempts'], 2)
+
+
+STORY = ' '.join(f'word{i}' for i in range(200))
+
+
+@override_settings(NEAR_DUPLICATE_MIN_WORDS=100)
+class NearDuplicateIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'near_duplicates.json')
+
+    def make(self):
+        return NearDuplicateIndex(self.path, max_entries=10, ttl=3600, threshold=0.8, save_interval=3600)
+
+    def test_workers_sharing_the_file_keep_each_others_entries(self):
+        first, second = self.make(), self.make()
+        first.add(signature(STORY), {'verdict': 'true', 'source_reliability': 'reliable'}, 'a.com', 'https://a.com/1')
+        other = STORY.replace('word', 'term')
+        second.add(signature(other), {'verdict': 'false', 'source_reliability': 'reliable'}, 'a.com', 'https://a.com/2')
+        first.save()
+        second.save()
+
+        loaded = self.make()
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.lookup(signature(STORY))[0], {'verdict': 'true'})
+        self.assertEqual(loaded._reliability['a.com'], {'reliable': 2})
+        # The second worker adopted the first one's entry when it saved
+        self.assertIsNotNone(second.lookup(signature(STORY)))
+
+    def test_add_leaves_a_due_save_to_a_background_thread(self):
+        index = NearDuplicateIndex(self.path, max_entries=10, ttl=3600, threshold=0.8, save_interval=0)
+        release, saved = threading.Event(), threading.Event()
+        write = near_duplicates.update_json_file
+
+        def slow_write(*args):
+            release.wait(5)
+            data = write(*args)
+            saved.set()
+            return data
+
+        with mock.patch.object(near_duplicates, 'update_json_file', slow_write):
+            index.add(signature(STORY), {'verdict': 'true'}, 'a.com', 'https://a.com/1')
+            # Returned (and still answers lookups) while the save waits
+            self.assertIsNotNone(index.lookup(signature(STORY)))
+            self.assertFalse(os.path.exists(self.path))
+            release.set()
+            self.assertTrue(saved.wait(5))
+        self.assertEqual(len(self.make()), 1)
+
+    def test_saving_twice_does_not_duplicate_entries(self):
+        index = self.make()
+        index.add(signature(STORY), {'verdict': 'true', 'source_reliability': 'mixed'}, 'a.com', 'https://a.com/1')
+        index.save()
+        index.save()
+        index.add(None, {'source_reliability': 'mixed'}, 'a.com', 'https://a.com/2')
+        index.save()
+        loaded = self.make()
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded.source_reliability('www.a.com'), 'mixed')
+        self.assertEqual(loaded._reliability['a.com'], {'mixed': 2})
+
+
+@override_settings(
+    BULKHEAD_ENABLED=True, BULKHEAD_DETECTOR_LIMIT=1, BULKHEAD_DETECTOR_MIN_LIMIT=1, BULKHEAD_DETECTOR_MAX_LIMIT=1,
+    BULKHEAD_DETECTOR_QUEUE=0,
+)
+class AnalyzeStreamBulkheadTests(SimpleTestCase):
+    def setUp(self):
+        bulkhead_module._bulkheads.pop('detector.fake_news_detection', None)
+
+    def stream(self, outcome=({'ok': True}, 200), upstream=True):
+        async def analyze(url, deadline, progress, endpoint):
+            if upstream:
+                mark_upstream_call()
+            return outcome
+
+        async def run():
+            request = RequestFactory().get('/api/fake-news-detection/analyze/stream/', {'url': 'https://example.com/a'})
+            response = await views.analyze_news_stream(request)
+            if response.status_code == 200:
+                return response, b''.join([part async for part in response])
+            return response, response.content
+
+        with mock.patch.object(views, 'analyze_url_async', analyze):
+            return asyncio.run(run())
+
+    def test_stream_holds_a_detector_slot_until_it_ends(self):
+        detector = get_bulkhead('detector', 'fake_news_detection')
+        permit = detector.acquire()
+        response, body = self.stream()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        permit.release(record=False)
+
+        latency = detector._latency
+        response, body = self.stream(upstream=False)
+        self.assertIn(b'event: final', body)
+        # Answered without a provider call: released, but not recorded
+        self.assertEqual(detector._latency, latency)
+        detector.acquire().release(record=False)
+
+        self.stream()
+        self.assertIsNotNone(detector._latency)
+        detector.acquire().release(record=False)
+
+
+ARTICLE = '\n'.join(f'Paragraph {i} of the article. ' + 'More reporting. ' * 20 for i in range(1, 13))
+
+
+@override_settings(FACT_CHECK_CHUNK_CHARS=1000, FACT_CHECK_MAX_CHUNKS=4, FACT_CHECK_MIN_SECONDS=1)
+class ChunkedFactCheckTests(SimpleTestCase):
+    def check(self, part_reply, merge_reply, known_claims=()):
+        """fact_check_chunked_async with the model answering part_reply(index) / merge_reply(prompt); returns (result, events)"""
+        events = []
+
+        async def chat(route, prompt, timeout):
+            part = re.search(r'ARTICLE PART (\d+) OF', prompt.user)
+            reply = part_reply(int(part.group(1))) if part else merge_reply(prompt)
+            return llm.Reply(reply, llm.OPENAI, 'gpt-4o')
+
+        with mock.patch.object(chunked_fact_check.llm, 'chat_routed_async', chat):
+            result = asyncio.run(chunked_fact_check.fact_check_chunked_async(
+                {'text': ARTICLE, 'url': 'https://example.com/a'}, Deadline(30),
+                progress=lambda event, data: events.append((event, data['part'])), known_claims=known_claims,
+            ))
+        return result, events
+
+    def part(self, index):
+        return json.dumps({
+            'credibility_score': 10 * index, 'fake_news_likelihood_percentage': 100 - 10 * index,
+            'summary': f'Part {index}.', 'key_claims': ['Shared claim', f'Claim {index}'], 'red_flags': [],
+            'claim_verdicts': [{'claim': f'Claim {index}', 'verdict': 'supported', 'explanation': 'Sourced.'}],
+        })
+
+    def test_split_keeps_paragraphs_whole_and_respects_the_chunk_limit(self):
+        chunks = chunked_fact_check.split_into_chunks(ARTICLE, 1000, 4)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual('\n'.join(chunks), ARTICLE)
+        self.assertTrue(all(chunk.startswith('Paragraph ') for chunk in chunks))
+
+        # Fewer allowed chunks: chunks grow instead
+        self.assertEqual(len(chunked_fact_check.split_into_chunks(ARTICLE, 1000, 2)), 2)
+
+    def test_overlong_paragraph_is_split_hard(self):
+        chunks = chunked_fact_check.split_into_chunks('x' * 2500, 1000, 5)
+        self.assertEqual([len(chunk) for chunk in chunks], [1000, 1000, 500])
+
+    def test_parts_are_mapped_then_merged_by_the_model(self):
+        merged = {'credibility_score': 55, 'fake_news_likelihood_percentage': 45, 'recommendation': 'questionable'}
+        prompts = []
+
+        def merge(prompt):
+            prompts.append(prompt.user)
+            return json.dumps(merged)
+
+        result, events = self.check(self.part, merge)
+        self.assertEqual(sorted(events), [('fact_check_part', index) for index in range(1, 5)])
+        self.assertEqual(result['credibility_score'], 55)
+        self.assertEqual(result['chunks_analyzed'], '4/4')
+        self.assertEqual(result['analysis_mode'], 'chunked')
+        self.assertEqual([v['claim'] for v in result['claim_verdicts']], [f'Claim {index}' for index in range(1, 5)])
+        # The merge call gets the findings, not the article or the claim verdicts
+        self.assertIn('Part 4.', prompts[0])
+        self.assertNotIn('More reporting', prompts[0])
+        self.assertNotIn('claim_verdicts', prompts[0])
+
+    def test_failed_merge_is_reduced_locally(self):
+        with self.assertLogs('fake_news_detection.chunked_fact_check', 'WARNING'):
+            result, events = self.check(self.part, lambda prompt: "I can't help with that.")
+        # Length-weighted averages of 10..40 and 90..60 over similar-sized parts
+        self.assertAlmostEqual(result['credibility_score'], 25, delta=2)
+        self.assertAlmostEqual(result['fake_news_likelihood_percentage'], 75, delta=2)
+        self.assertEqual(result['recommendation'], 'likely_false')
+        self.assertEqual(result['key_claims'], ['Shared claim', 'Claim 1', 'Claim 2', 'Claim 3', 'Claim 4'])
+        self.assertEqual(result['fact_check_reasoning'], 'Part 1. Part 2. Part 3. Part 4.')
+
+    def test_failed_parts_are_left_out(self):
+        def part(index):
+            return 'not json' if index == 2 else self.part(index)
+
+        with self.assertLogs('fake_news_detection.chunked_fact_check', 'WARNING'):
+            result, events = self.check(part, lambda prompt: json.dumps({'credibility_score': 50}))
+        self.assertEqual(result['chunks_analyzed'], '3/4')
+        self.assertNotIn(('fact_check_part', 2), events)
+
+    def test_all_parts_failing_raises(self):
+        with self.assertLogs('fake_news_detection.chunked_fact_check', 'WARNING'), self.assertRaises(ValueError):
+            self.check(lambda index: 'not json', lambda prompt: '{}')
+
+    def test_chunked_failure_falls_back_to_one_call_with_a_logged_warning(self):
+        async def failing(*args, **kwargs):
+            raise ValueError('All 4 chunk fact-checks failed')
+
+        async def chat(route, prompt, timeout):
+            return llm.Reply(json.dumps({'credibility_score': 70, 'fake_news_likelihood_percentage': 20}), llm.OPENAI, 'gpt-4o')
+
+        with mock.patch.object(views, 'fact_check_chunked_async', failing), \
+                mock.patch.object(views.llm, 'chat_routed_async', chat), \
+                self.assertLogs('fake_news_detection.views', 'WARNING') as logs:
+            result = asyncio.run(views.fact_check_with_ai_async({'text': ARTICLE}, Deadline(30)))
+        self.assertIn('Chunked fact-check failed', logs.output[0])
+        self.assertEqual(result['credibility_score'], 70)
@@ -7,4 +7,6 @@ app_name = 'fake_news_detection'
 urlpatterns = [
     path('', views.fake_news_detection_view, name='fake-news-detection'),
     path('analyze/', require_http_methods(['POST'])(views.analyze_news), name='analyze-news'),
+    path('analyze/batch/', require_http_methods(['POST'])(views.analyze_news_batch), name='analyze-news-batch'),
+    path('analyze/stream/', require_http_methods(['GET', 'POST'])(views.analyze_news_stream), name='analyze-news-stream'),
 ]
@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseServerError
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseServerError, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import status
@@ -20,6 +20,32 @@ from boilerpy3 import extractors
 import httpx
 import re
 import asyncio
+from api import llm, metrics
+from api import results as result_store
+from api.bulkhead import Overloaded, bulkhead, get_bulkhead, upstream_calls_context
+from api.model_json import parse_model_json
+from api.resilience import Deadline, backoff_delay, is_retryable, retry_after_seconds, status_code_of
+from api.runtime import get_http_client, run_sync, submit
+from api.singleflight import get_flight, idempotency_key, request_key
+from api.tokens import fit_prompt, shorten
+from . import article_cache
+from .chunked_fact_check import fact_check_chunked_async
+from .claim_cache import claim_hash, find_known_claims, store_claim_verdicts
+from .extraction import extract_article
+from .fetching import get_host_health, host_key, read_html_capped
+from .models import NewsAnalysis
+from .near_duplicates import get_index as get_near_duplicate_index, signature
+from .prompts import FACT_CHECK, known_claims_section
+from .quality_gate import assess_content, record_rejection
+
+logger = logging.getLogger(__name__)
+
+# Extra time run_sync waits past the request deadline before giving up on the pipeline
+DEADLINE_GRACE_SECONDS = 5
+
+
+def no_progress(event, data):
+    """Default progress callback for pipeline stages: report nothing"""
 
 
 @api_view(['GET'])
@@ -31,7 +57,9 @@ def fake_news_detection_view(request):
         'service': 'Fake News Detection',
         'description': 'Detects fake news and misinformation',
         'endpoints': {
-            'analyze': '/fake-news-detection/analyze/ (POST)'
+            'analyze': '/fake-news-detection/analyze/ (POST)',
+            'analyze_batch': '/fake-news-detection/analyze/batch/ (POST)',
+            'analyze_stream': '/fake-news-detection/analyze/stream/ (GET ?url= or POST, text/event-stream)'
         }
     })
 
@@ -40,10 +68,11 @@ from asgiref.sync import sync_to_async
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@bulkhead('fake_news_detection')
 def analyze_news(request):
     """
     Analyze news content for fake news detection
-    Extract text from URL using API Tier, then fact-check using AI Hack Club
+    Extract text from URL using API Tier, then fact-check it with the fact_check LLM route
     """
     print("Analyze news endpoint hit")  # Debug log
     
@@ -59,67 +88,337 @@ def analyze_news(request):
     print(f"Processing URL: {url}")  # Debug log
     
     try:
-        # Run the async function in the event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Run the pipeline on this worker's long-lived event loop, inside one time budget.
+        # Requests for the same article while one is already running wait for it instead.
+        deadline = Deadline(settings.ANALYZE_DEADLINE_SECONDS)
+        idem_key = idempotency_key(request)
+        (response_data, status_code), _ = get_flight('fake_news_detection').do(
+            request_key('analyze', article_cache.canonicalize_url(url), idem_key),
+            lambda: run_sync(
+                analyze_url_async(url, deadline), timeout=settings.ANALYZE_DEADLINE_SECONDS + DEADLINE_GRACE_SECONDS
+            ),
+            timeout=settings.ANALYZE_DEADLINE_SECONDS + DEADLINE_GRACE_SECONDS,
+            remember=bool(idem_key),
+            # Failures are worth retrying for real
+            should_remember=lambda result: result[1] < 500,
+        )
+        return Response(response_data, status=status_code)
+    
+    except Exception as e:
+        logger.exception(f"Error in analyze_news: {str(e)}")
+        response_data, status_code = analysis_error_response(e)
+        return Response(response_data, status=status_code)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@bulkhead('fake_news_batch')
+def analyze_news_batch(request):
+    """
+    Analyze many news URLs in one request
+    Fetching and fact-checking fan out concurrently, bounded globally and per domain
+    """
+    urls = request.data.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return Response(
+            {'error': 'A non-empty list of URLs is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not all(isinstance(url, str) and url.strip() for url in urls):
+        return Response(
+            {'error': 'Every URL must be a non-empty string'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(urls) > settings.NEWS_BATCH_MAX_URLS:
+        return Response(
+            {'error': f'At most {settings.NEWS_BATCH_MAX_URLS} URLs can be analyzed per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # The whole batch shares one budget; URLs not reached in time are reported as timeouts
+    deadline = Deadline(settings.ANALYZE_DEADLINE_SECONDS)
+    results = run_sync(
+        analyze_urls_async([url.strip() for url in urls], deadline),
+        timeout=settings.ANALYZE_DEADLINE_SECONDS + DEADLINE_GRACE_SECONDS
+    )
+    
+    summary = {'total': len(results)}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    
+    return Response({'results': results, 'summary': summary, 'status': 'success'}, status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+async def analyze_news_stream(request):
+    """
+    Streaming variant of analyze_news (Server-Sent Events)
+    Emits 'fetched', 'extracted', 'fact_check_part' (long articles), 'fact_check' and
+    'final' events as the stages finish. Async view: under ASGI an open stream costs
+    no worker thread while it waits on the pipeline.
+    Accepts GET ?url=... (for EventSource) or a POST JSON body like analyze_news.
+    """
+    if request.method == 'POST':
+        try:
+            url = json.loads(request.body or b'{}').get('url')
+        except (ValueError, AttributeError):
+            url = None
+    else:
+        url = request.GET.get('url')
+    if not url:
+        return JsonResponse({'error': 'URL is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Shares analyze_news's limit: an open stream costs no thread, but its pipeline loads the same providers
+    permit = None
+    if settings.BULKHEAD_ENABLED:
         try:
-            extracted_data = loop.run_until_complete(extract_data_from_url_async(url))
-        finally:
-            loop.close()
+            permit = await get_bulkhead('detector', 'fake_news_detection').acquire_async()
+        except Overloaded as e:
+            return JsonResponse(
+                {'error': 'The service is busy, please try again shortly', 'retry_after': e.retry_after},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(e.retry_after)},
+            )
+    
+    response = StreamingHttpResponse(analysis_events(url, permit), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def analysis_events(url, permit=None):
+    """
+    Run analyze_url_async on the shared runtime loop and relay its progress
+    callbacks to this (server) loop as SSE frames; releases the view's
+    bulkhead permit when the stream ends
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    
+    def progress(event, data):
+        # Called on the runtime loop's thread
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+    
+    deadline = Deadline(settings.ANALYZE_DEADLINE_SECONDS)
+    context, upstream_calls = upstream_calls_context()
+    pipeline = asyncio.wrap_future(
+        context.run(submit, analyze_url_async(url, deadline, progress, endpoint='analyze_stream'))
+    )
+    # Progress callbacks are queued before the future resolves, so this marker comes last
+    pipeline.add_done_callback(lambda _: events.put_nowait(None))
+    metrics.incr('fake_news.stream.opened')
+    status_code = None
+    
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), settings.SSE_KEEPALIVE_SECONDS)
+            except TimeoutError:
+                # Comment line keeps proxies from closing an idle-looking connection
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                break
+            yield sse_event(*item)
         
-        if not extracted_data.get('success', False):
-            if extracted_data.get('status') == 'blocked':
-                return Response(
-                    {
-                        'error': extracted_data.get('error', 'This website is blocking our access'),
-                        'status': 'blocked',
-                        'error_code': 403,
-                        'message': 'Please use the "Paste Text" feature to check this content.'
-                    },
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            return Response(
-                {'error': extracted_data.get('error', 'Failed to extract content from URL')},
-                status=status.HTTP_400_BAD_REQUEST
+        try:
+            response_data, status_code = pipeline.result()
+        except Exception as e:
+            logger.exception(f"Error in analyze_news_stream: {str(e)}")
+            response_data, status_code = analysis_error_response(e)
+        yield sse_event('final', {**response_data, 'http_status': status_code})
+    finally:
+        # Client went away: stop fetching/fact-checking for it
+        if not pipeline.done():
+            pipeline.cancel()
+            metrics.incr('fake_news.stream.cancelled')
+        if permit is not None:
+            # Like bulkhead(): only finished analyses that reached a provider teach the limit
+            finished = status_code is not None
+            permit.release(
+                failed=not finished or status_code >= 500,
+                record=finished and bool(upstream_calls) and not 400 <= status_code < 500,
             )
+
+
+async def analyze_url_async(url, deadline, progress=no_progress, endpoint='analyze'):
+    """
+    Extract and fact-check one URL within the given Deadline
+    Returns the response body and HTTP status analyze_news would send for it
+    Stage results are also reported to progress(event, data) as they finish
+    endpoint labels the claim-cache hit-rate metrics
+    """
+    # An article checked recently is answered from the result store
+    key = result_store.input_hash(article_cache.canonicalize_url(url))
+    stored = await asyncio.to_thread(result_store.lookup, NewsAnalysis, key)
+    if stored is not None:
+        response_data = result_store.reused_body(stored)
+        progress('extracted', response_data.get('extracted_metadata', {}))
+        progress('fact_check', response_data.get('fact_check_result', {}))
+        return response_data, status.HTTP_200_OK
+    
+    # Fetching may not eat into the time kept back for fact-checking (at most half the budget)
+    reserve = min(settings.FACT_CHECK_RESERVE_SECONDS, deadline.remaining() / 2)
+    extracted_data = await extract_data_from_url_async(url, deadline.reserve(reserve), progress=progress)
+    
+    if not extracted_data.get('success', False):
+        if extracted_data.get('status') == 'blocked':
+            return {
+                'error': extracted_data.get('error', 'This website is blocking our access'),
+                'status': 'blocked',
+                'error_code': 403,
+                'message': 'Please use the "Paste Text" feature to check this content.'
+            }, status.HTTP_403_FORBIDDEN
         
-        # Get fact check from AI (this part remains synchronous for now)
-        fact_check_result = fact_check_with_ai(extracted_data)
+        if extracted_data.get('status') == 'timeout':
+            return {
+                'error': extracted_data.get('error'),
+                'status': 'timeout',
+                'error_code': 504
+            }, status.HTTP_504_GATEWAY_TIMEOUT
         
-        # Prepare response
-        response_data = {
-            'url': url,
-            'extracted_text': extracted_data.get('text', '')[:1000] + '...' if extracted_data.get('text') else '',
-            'extracted_metadata': {
-                'title': extracted_data.get('title', ''),
-                'author': extracted_data.get('author', ''),
-                'date_published': extracted_data.get('date_published', ''),
-                'domain': extracted_data.get('domain', ''),
-                'word_count': extracted_data.get('word_count', 0)
-            },
-            'fact_check_result': fact_check_result,
-            'status': 'success'
-        }
+        if extracted_data.get('status') == 'unavailable':
+            return {
+                'error': extracted_data.get('error'),
+                'status': 'unavailable',
+                'error_code': 503,
+                'retry_after': extracted_data.get('retry_after')
+            }, status.HTTP_503_SERVICE_UNAVAILABLE
         
-        return Response(response_data, status=status.HTTP_200_OK)
+        return {
+            'error': extracted_data.get('error', 'Failed to extract content from URL')
+        }, status.HTTP_400_BAD_REQUEST
     
-    except Exception as e:
-        print(f"Error in analyze_news: {str(e)}", exc_info=True)  # Debug log with traceback
-        error_msg = f"An error occurred while processing the request: {str(e)}"
-        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
-        
-        # Provide more specific error messages for common issues
-        if 'timeout' in str(e).lower():
-            error_msg = "The request timed out while processing the URL"
-            status_code = status.HTTP_504_GATEWAY_TIMEOUT
-        elif 'connection' in str(e).lower():
-            error_msg = "Could not connect to the content extraction service"
-        
-        return Response(
-            {'error': error_msg}, 
-            status=status_code
+    extracted_metadata = {
+        'title': extracted_data.get('title', ''),
+        'author': extracted_data.get('author', ''),
+        'date_published': extracted_data.get('date_published', ''),
+        'domain': extracted_data.get('domain', ''),
+        'word_count': extracted_data.get('word_count', 0)
+    }
+    progress('extracted', extracted_metadata)
+    
+    # Cookie walls, paywall teasers and stubs are answered right away instead of with an LLM call
+    quality = extracted_data.get('quality')
+    if settings.QUALITY_GATE_ENABLED and quality and not quality['passed']:
+        record_rejection(quality)
+        logger.info(f"Insufficient content at {url}: {', '.join(quality['reasons'])} (score {quality['score']})")
+        return {
+            'url': url,
+            'error': 'Not enough article content could be extracted from this page to fact-check it.',
+            'status': 'insufficient_content',
+            'message': 'Please use the "Paste Text" feature to check this content.',
+            'extracted_metadata': extracted_metadata,
+            'quality': quality
+        }, status.HTTP_422_UNPROCESSABLE_ENTITY
+    
+    # Syndicated copies of a story checked recently reuse its result instead of another LLM call
+    near_duplicates = get_near_duplicate_index()
+    text_signature = await asyncio.to_thread(signature, extracted_data.get('text', ''))
+    # The index's lock can be held for a while by a save in another thread, so keep it off the loop
+    match = await asyncio.to_thread(near_duplicates.lookup, text_signature)
+    token_usage = llm.empty_usage()
+    if match:
+        metrics.incr('fake_news.near_duplicates.hit')
+        fact_check_result, source_url, source_domain, similarity = match
+        fact_check_result.update({
+            'source_reliability': await asyncio.to_thread(
+                near_duplicates.source_reliability, extracted_data.get('domain')
+            ),
+            'analysis_mode': 'near_duplicate',
+            'reused_from': {'url': source_url, 'domain': source_domain, 'similarity': round(similarity, 3)}
+        })
+    else:
+        metrics.incr('fake_news.near_duplicates.miss')
+        # Claims other outlets' articles already had checked go to the model as hints, in place
+        # of their sentences: only the novel claims and a little context around them are sent
+        content, known_claims = await asyncio.to_thread(find_known_claims, extracted_data.get('text', ''), endpoint)
+        # Get fact check from AI with whatever is left of the budget
+        with llm.track_usage() as token_usage:
+            fact_check_result = await fact_check_with_ai_async(
+                {**extracted_data, 'text': content}, deadline, progress=progress, known_claims=known_claims
+            )
+        known_hashes = {claim_hash(claim['claim']) for claim in known_claims}
+        novel_claims = [
+            claim for claim in fact_check_result.get('claim_verdicts') or []
+            if not (isinstance(claim, dict) and claim_hash(str(claim.get('claim', ''))) in known_hashes)
+        ]
+        fact_check_result['claim_verdicts'] = known_claims + novel_claims
+        fact_check_result['claims_reused'] = len(known_claims)
+        if fact_check_result.get('analysis_mode') not in ('degraded', 'fallback'):
+            await asyncio.to_thread(store_claim_verdicts, novel_claims, url, endpoint)
+            await asyncio.to_thread(
+                near_duplicates.add, text_signature, fact_check_result, extracted_data.get('domain'), url
+            )
+    progress('fact_check', fact_check_result)
+    
+    # Prepare response
+    response_data = {
+        'url': url,
+        'extracted_text': shorten(extracted_data.get('text', ''), 1000),
+        'extracted_metadata': extracted_metadata,
+        'fact_check_result': fact_check_result,
+        # Prompt tokens served from the provider's prefix cache show up as cached_tokens
+        'token_usage': token_usage,
+        # Extraction succeeded but the fact-check was cut short by the deadline
+        'status': 'partial' if fact_check_result.get('analysis_mode') == 'degraded' else 'success'
+    }
+    # Partial and fallback checks are not kept, so the next request for the article gets a full one
+    if fact_check_result.get('analysis_mode') not in ('degraded', 'fallback'):
+        response_data['result_id'] = result_store.save(
+            NewsAnalysis, key, response_data, domain=extracted_data.get('domain', ''), url=url[:2000]
         )
+    
+    return response_data, status.HTTP_200_OK
+
+
+def analysis_error_response(e):
+    """Map an unexpected pipeline exception to a response body and HTTP status"""
+    error_msg = f"An error occurred while processing the request: {str(e)}"
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    
+    # Provide more specific error messages for common issues
+    if isinstance(e, TimeoutError) or 'timeout' in str(e).lower():
+        error_msg = "The request timed out while processing the URL"
+        status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    elif 'connection' in str(e).lower():
+        error_msg = "Could not connect to the content extraction service"
+    
+    return {'error': error_msg}, status_code
+
+
+async def analyze_urls_async(urls, deadline):
+    """
+    Run analyze_url_async over many URLs with a global concurrency cap and a
+    smaller per-domain cap, so one publisher never sees a burst from us.
+    All URLs share one Deadline.
+    """
+    global_slots = asyncio.Semaphore(settings.NEWS_BATCH_CONCURRENCY)
+    domain_slots = {}
+    
+    async def analyze_one(url):
+        domain = urlparse(url).netloc.lower()
+        slots = domain_slots.setdefault(domain, asyncio.Semaphore(settings.NEWS_BATCH_PER_DOMAIN_CONCURRENCY))
+        # Take the domain slot first so waiting on a busy domain doesn't hold a global slot
+        async with slots, global_slots:
+            try:
+                response_data, status_code = await analyze_url_async(url, deadline, endpoint='analyze_batch')
+            except Exception as e:
+                logger.exception(f"Error analyzing {url} in batch: {str(e)}")
+                response_data, status_code = analysis_error_response(e)
+        
+        response_data.setdefault('status', 'error')
+        return {**response_data, 'url': url, 'http_status': status_code}
+    
+    # Analyze each distinct URL once, but report it at every position it was submitted
+    unique_urls = list(dict.fromkeys(urls))
+    results = dict(zip(unique_urls, await asyncio.gather(*(analyze_one(url) for url in unique_urls))))
+    return [results[url] for url in urls]
 
 
 def clean_text(text):
@@ -154,9 +453,10 @@ def clean_text(text):
     return text.strip()
 
 
-async def extract_data_from_url_async(url, max_retries=3, timeout=30):
+async def extract_data_from_url_async(url, deadline, max_retries=3, timeout=30, progress=no_progress):
     """
     Extract text and metadata from a URL using a simple and reliable approach.
+    Every attempt, and the waits between them, fit inside the given Deadline.
     """
     headers = {
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -173,167 +473,195 @@ async def extract_data_from_url_async(url, max_retries=3, timeout=30):
         'Referer': 'https://www.google.com/'
     }
     
-    async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-        for attempt in range(max_retries):
-            try:
-                # Make the HTTP request
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                
-                # Parse the HTML content
-                soup = BeautifulSoup(response.text, 'lxml')
-                
-                # Extract title
-                title = ''
-                if soup.title and soup.title.string:
-                    title = soup.title.string.strip()
-                
-                # Try to find the main article content
-                article = None
-                article_selectors = [
-                    'article',
-                    'div.article',
-                    'div.article-content',
-                    'div.entry-content',
-                    'div.post-content',
-                    'div.story',
-                    'div.story-content',
-                    'div.content',
-                    'div.main-content',
-                    'div[class*="content"]',
-                    'div[class*="article"]',
-                    'div[class*="post"]',
-                    'div[class*="entry"]',
-                    'div[class*="story"]',
-                    'main',
-                    'div#main',
-                    'div#content',
-                    'div#article'
-                ]
-                
-                for selector in article_selectors:
-                    article = soup.select_one(selector)
-                    if article:
-                        break
-                
-                # If we found an article container, use that; otherwise use the whole page
-                content_source = article if article else soup
-                
-                # Remove unwanted elements
-                for element in content_source(['script', 'style', 'noscript', 'iframe', 'svg', 'button', 'nav', 'footer', 'header', 'aside', 'form']):
-                    element.decompose()
-                
-                # Extract text from paragraphs and headers
-                text_parts = []
-                for element in content_source.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                    text = element.get_text(separator=' ', strip=True)
-                    if text and len(text) > 20:  # Only include non-empty text with reasonable length
-                        if element.name.startswith('h'):
-                            text_parts.append(f'\n\n{text.upper()}\n')
-                        else:
-                            text_parts.append(text)
-                
-                full_text = '\n'.join(text_parts)
-                
-                # If we still don't have enough content, fall back to getting all text
-                if len(full_text) < 100:
-                    full_text = content_source.get_text(separator='\n', strip=True)
-                
-                # Clean up the text
-                full_text = '\n'.join(line.strip() for line in full_text.splitlines() if line.strip())
-                
-                # If still no content, use the raw text (first 10,000 chars)
-                if not full_text.strip():
-                    full_text = response.text[:10000]
-                
-                # Extract metadata
-                metadata = {
-                    'title': title,
-                    'author': '',
-                    'date_published': '',
-                    'domain': urlparse(url).netloc,
-                    'word_count': len(full_text.split())
-                }
-                
-                # Try to extract author and date from common meta tags
-                for meta in soup.find_all('meta'):
-                    property_attr = meta.get('property', '').lower()
-                    name_attr = meta.get('name', '').lower()
-                    content = meta.get('content', '')
-                    
-                    if not content:
-                        continue
-                        
-                    # Check for author in meta tags
-                    if any(x in property_attr for x in ['author', 'article:author']) or \
-                       any(x in name_attr for x in ['author', 'article:author']):
-                        metadata['author'] = content
-                    
-                    # Check for publication date in meta tags
-                    if any(x in property_attr for x in ['article:published_time', 'og:published_time', 'pubdate']) or \
-                       any(x in name_attr for x in ['date', 'pubdate', 'publishdate', 'timestamp']):
-                        metadata['date_published'] = content
-                    
-                    # Also check for date in other attributes
-                    for attr, value in meta.attrs.items():
-                        if 'date' in attr.lower() and value and not metadata['date_published']:
-                            metadata['date_published'] = value
-                
-                result = {
-                    'success': True,
-                    'url': url,
-                    'text': full_text,
-                    **metadata
+    # Serve repeat pastes of the same article from the extraction cache
+    canonical_url, cached = article_cache.lookup(url)
+    if article_cache.is_fresh(cached):
+        article_cache.record('hit')
+        progress('fetched', {'url': cached['final_url'], 'status': 200, 'cached': True})
+        return article_cache.cached_result(cached, url)
+    article_cache.record('stale' if cached else 'miss')
+    
+    # Revalidate a stale entry at its post-redirect URL with a conditional GET
+    fetch_url = cached['final_url'] if cached else url
+    headers.update(article_cache.conditional_headers(cached))
+    
+    # Domains that blocked us recently, or whose circuit is open, are answered without a
+    # fetch (from a stale cache entry if we have one)
+    host = host_key(urlparse(url).netloc)
+    blocked_domains, breakers = get_host_health()
+    if blocked_domains.get(host):
+        metrics.incr('fake_news.fetch.blocked_cached')
+        return article_cache.cached_result(cached, url) if cached else blocked_result()
+    if not breakers.allow(host):
+        metrics.incr('fake_news.fetch.circuit_rejected')
+        return article_cache.cached_result(cached, url) if cached else circuit_open_result(host, breakers.retry_in(host))
+    
+    # Shared per-worker client: connections to hot news domains stay alive between requests
+    client = get_http_client()
+    
+    for attempt in range(max_retries):
+        if deadline.expired:
+            return deadline_result(url, attempt)
+        try:
+            # Bound the whole attempt (connect, headers and the streamed body), not just each read
+            result = await asyncio.wait_for(
+                fetch_article_once(client, url, fetch_url, headers, cached, deadline.timeout(timeout), progress),
+                deadline.timeout(timeout)
+            )
+            breakers.record_success(host)
+            return result
+            
+        except Exception as e:
+            error_msg = f"Attempt {attempt + 1} failed: {str(e)}"
+            print(error_msg)
+            status_code = status_code_of(e)
+            
+            # Special handling for 403 Forbidden: remember the domain so the next paste skips the fetch
+            if status_code == 403:
+                blocked_domains.add(host)
+                breakers.record_success(host)
+                return blocked_result()
+            
+            # Only timeouts, dropped connections, 5xx and 429 count against the host;
+            # anything else means it answered, which also closes a half-open circuit.
+            # An attempt cut short by our own deadline says nothing about the host.
+            retryable = is_retryable(e)
+            if deadline.expired:
+                return deadline_result(url, attempt + 1)
+            if not retryable:
+                breakers.record_success(host)
+            elif breakers.record_failure(host):
+                metrics.incr('fake_news.fetch.circuit_opened')
+                logger.warning(f"Circuit opened for {host} after repeated fetch failures")
+            
+            delay = backoff_delay(attempt, settings.FETCH_RETRY_BASE_DELAY, settings.FETCH_RETRY_MAX_DELAY)
+            if status_code == 429:
+                delay = retry_after_seconds(e) or delay
+            
+            # 4xx other than 408/429, parse errors, etc. will fail the same way again
+            give_up = (
+                not retryable
+                or attempt == max_retries - 1
+                or delay > settings.FETCH_RETRY_AFTER_MAX
+                or delay >= deadline.remaining()
+                or not breakers.allow(host)
+            )
+            if give_up:
+                error_details = str(e)
+                if status_code is not None:
+                    error_details += f" | Status Code: {status_code}"
+                    if hasattr(e.response, 'text'):
+                        error_details += f" | Response: {e.response.text[:200]}"
+                return {
+                    'success': False,
+                    'error': f'Failed to fetch URL after {attempt + 1} attempt(s): {error_details}',
+                    'status': 'error'
                 }
-                return result
-                
-            except Exception as e:
-                error_msg = f"Attempt {attempt + 1} failed: {str(e)}"
-                print(error_msg)
-                if attempt == max_retries - 1:  # Last attempt
-                    error_details = str(e)
-                    if hasattr(e, 'response') and e.response is not None:
-                        status_code = getattr(e.response, 'status_code', None)
-                        error_details += f" | Status Code: {status_code}"
-                        
-                        # Special handling for 403 Forbidden
-                        if status_code == 403:
-                            return {
-                                'success': False,
-                                'error': 'This website is blocking our access. Please use the "Paste Text" feature to check this content.',
-                                'status': 'blocked',
-                                'error_code': 403
-                            }
-                            
-                        if hasattr(e.response, 'text'):
-                            error_details += f" | Response: {e.response.text[:200]}"
-                    return {
-                        'success': False,
-                        'error': f'Failed to fetch URL after {max_retries} attempts: {error_details}',
-                        'status': 'error'
-                    }
-                backoff_time = 1 * (attempt + 1)
-                print(f"Retrying in {backoff_time} seconds...")
-                await asyncio.sleep(backoff_time)  # Use asyncio.sleep for async context
-        
-        return {
-            'success': False,
-            'error': 'Failed to extract content from URL',
-            'status': 'error'
-        }
+            
+            metrics.incr('fake_news.fetch.retries')
+            print(f"Retrying in {delay:.2f} seconds...")
+            await asyncio.sleep(delay)  # Use asyncio.sleep for async context
+    
+    return {
+        'success': False,
+        'error': 'Failed to extract content from URL',
+        'status': 'error'
+    }
 
 
-def fact_check_with_ai(extracted_data):
-    """
-    Fact-check content using AI Hack Club API
-    Analyzes the extracted content from BeautifulSoup for credibility and potential misinformation
-    """
-    ai_url = "https://ai.hackclub.com/chat/completions"
+async def fetch_article_once(client, url, fetch_url, headers, cached, timeout, progress=no_progress):
+    """One fetch-and-extract attempt; HTTP errors are raised for the retry loop"""
+    # Stream the body, stopping at the byte ceiling or once the article has closed
+    async with client.stream('GET', fetch_url, headers=headers, timeout=timeout) as response:
+        if response.status_code == 304 and cached:
+            # Unchanged since we last parsed it
+            article_cache.record('revalidated')
+            cached = article_cache.refresh(cached, response.headers)
+            progress('fetched', {'url': str(response.url), 'status': 304, 'cached': True})
+            return article_cache.cached_result(cached, url)
+        if response.is_error:
+            # Error pages are small; keep them for the failure message below
+            await response.aread()
+        response.raise_for_status()
     
-    headers = {
-        "Content-Type": "application/json"
+        body, truncated, stopped_early = await read_html_capped(response, settings.ARTICLE_MAX_BYTES)
+    
+    progress('fetched', {
+        'url': str(response.url),
+        'status': response.status_code,
+        'bytes': len(body),
+        'truncated': truncated,
+        'cached': False
+    })
+    logger.debug(
+        f"Fetched {len(body)} bytes from {url} (truncated={truncated}, stopped_early={stopped_early})"
+    )
+    
+    # Parse the HTML content with the strategies that work for this domain, off the
+    # shared loop so a large page doesn't stall other requests' fetches
+    extracted = await asyncio.to_thread(extract_article, body, response.charset_encoding, urlparse(url).netloc)
+    full_text = extracted['text']
+    
+    # Score the text locally (cached with it) so junk pages never reach the LLM
+    quality = await asyncio.to_thread(
+        assess_content, full_text, body, response.charset_encoding, extracted['strategy']
+    )
+    
+    # Extract metadata
+    metadata = {
+        'title': extracted['title'],
+        'author': extracted['author'],
+        'date_published': extracted['date_published'],
+        'domain': urlparse(url).netloc,
+        'word_count': len(full_text.split())
     }
     
+    result = {
+        'success': True,
+        'url': url,
+        'text': full_text,
+        'quality': quality,
+        **metadata
+    }
+    article_cache.store(url, str(response.url), result, response.headers)
+    return result
+
+
+def blocked_result():
+    return {
+        'success': False,
+        'error': 'This website is blocking our access. Please use the "Paste Text" feature to check this content.',
+        'status': 'blocked',
+        'error_code': 403
+    }
+
+
+def deadline_result(url, attempts):
+    return {
+        'success': False,
+        'error': f'Ran out of time fetching {url} after {attempts} attempt(s).',
+        'status': 'timeout',
+        'error_code': 504
+    }
+
+
+def circuit_open_result(host, retry_in):
+    return {
+        'success': False,
+        'error': f'{host} is failing repeatedly; not retrying for {retry_in:.0f} seconds.',
+        'status': 'unavailable',
+        'error_code': 503,
+        'retry_after': max(1, round(retry_in))
+    }
+
+
+async def fact_check_with_ai_async(extracted_data, deadline, progress=no_progress, known_claims=()):
+    """
+    Fact-check content with the fact_check LLM route
+    Analyzes the extracted content from BeautifulSoup for credibility and potential misinformation
+    The LLM calls share the request's Deadline; running out of it gives a degraded result
+    known_claims (already verified elsewhere) are given to the model as hints; the text is then an excerpt without them
+    """
     # Extract information from the BeautifulSoup extraction
     text = extracted_data.get('text', '')
     title = extracted_data.get('title', '')
@@ -343,91 +671,42 @@ def fact_check_with_ai(extracted_data):
     url = extracted_data.get('url', 'Unknown URL')
     word_count = extracted_data.get('word_count', 0)
     
-    # Create a more detailed prompt for fact-checking
-    analysis_prompt = f"""
-You are a fact-checking assistant analyzing an article extracted from a webpage. 
-The content was automatically extracted using web scraping and may contain some formatting artifacts.
-
-SOURCE ANALYSIS:
-- Source URL: {url}
-- Domain: {domain}
-- Article Title: "{title}"
-- Author: {author} (note: this may be incomplete as it's automatically extracted)
-- Publication Date: {date_published}
-- Content Length: {word_count} words
-
-CONTENT TO ANALYZE:
-"""
-    
-    # Add the content in chunks to avoid hitting token limits
-    max_content_length = 15000  # Leave room for the rest of the prompt
-    content_preview = text[:max_content_length]
-    if len(text) > max_content_length:
-        content_preview += "\n[Content truncated due to length]"
-    
-    # Add the content to the prompt with proper escaping
-    analysis_prompt += '""\n' + content_preview + '\n""\n'
-    
-    analysis_prompt += """
-
-INSTRUCTIONS:
-1. Evaluate the credibility of the content considering the source and content
-2. Identify any potential misinformation, biases, or unsubstantiated claims
-3. Consider that the content was automatically extracted and may be missing some context
-4. Be particularly alert for:
-   - Sensational or emotionally charged language
-   - Lack of credible sources or references
-   - Logical fallacies or inconsistencies
-   - Outdated information (check against the publication date)
-   - Potential bias in the reporting
-
-OUTPUT FORMAT (JSON only, no other text):
-{
-    "credibility_score": <0-100, where 100 is most credible>,
-    "fake_news_likelihood_percentage": <0-100, estimated likelihood of being misinformation>,
-    "fact_check_reasoning": "<detailed analysis of the content's credibility, 3-5 sentences>",
-    "confidence": "<high/medium/low, your confidence in this assessment>",
-    "key_claims": ["<list the 3-5 most important claims that should be fact-checked>", "..."],
-    "red_flags": ["<list any red flags found in the content or source>", "..."],
-    "recommendation": "<trustworthy/questionable/likely_false, your overall assessment>",
-    "source_reliability": "<reliable/mixed/unreliable, assessment of the source domain>"
-}
-
-IMPORTANT: Respond with ONLY the JSON object, no other text or markdown formatting.
-"""
-    
-    payload = {
-        "messages": [
-            {
-                "role": "user", 
-                "content": analysis_prompt
-            }
-        ]
-    }
+    if deadline.remaining() < settings.FACT_CHECK_MIN_SECONDS:
+        return degraded_fact_check("Not enough time left in the request to fact-check the content")
+    
+    # Long articles are fact-checked in concurrent chunks instead of being truncated
+    if settings.FACT_CHECK_CHUNKED and len(text) > settings.FACT_CHECK_CHUNK_CHARS:
+        try:
+            return await fact_check_chunked_async(extracted_data, deadline, progress=progress, known_claims=known_claims)
+        except Exception as e:
+            logger.warning(f"Chunked fact-check failed, falling back to a single truncated call: {str(e)}")
+            if deadline.remaining() < settings.FACT_CHECK_MIN_SECONDS:
+                return degraded_fact_check("Fact-checking ran out of time")
+    
+    # Static instructions first (cached by the provider), then this article, trimmed
+    # to its token budget keeping the opening and the conclusion
+    analysis_prompt = fit_prompt(
+        FACT_CHECK,
+        'content',
+        text,
+        max_input_tokens=settings.FACT_CHECK_MAX_INPUT_TOKENS,
+        url=url,
+        domain=domain,
+        title=title,
+        author=author,
+        date_published=date_published,
+        word_count=word_count,
+        known_claims=known_claims_section(known_claims),
+    )
     
     try:
-        response = requests.post(ai_url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        ai_response = response.json()
-        ai_content = ai_response.get('choices', [{}])[0].get('message', {}).get('content', '')
+        ai_content = await llm.chat_routed_async('fact_check', analysis_prompt, timeout=deadline.timeout(30))
         
         # Try to parse the AI response as JSON
         try:
             # Extract JSON from the response if it's wrapped in markdown or other text
-            import re
-            json_match = re.search(r'\{[^}]*"credibility_score"[^}]*"recommendation"[^}]*\}', ai_content, re.DOTALL)
-            if json_match:
-                analysis_data = json.loads(json_match.group())
-                return analysis_data
-            else:
-                # Try to find JSON block in markdown
-                json_block_match = re.search(r'```json\s*(\{.*?\})\s*```', ai_content, re.DOTALL)
-                if json_block_match:
-                    analysis_data = json.loads(json_block_match.group(1))
-                    return analysis_data
-                else:
-                    raise ValueError("No valid JSON found in response")
+            analysis_data = parse_model_json(ai_content, 'fake_news_detection')
+            return analysis_data
         except (json.JSONDecodeError, ValueError):
             # Fallback: parse manually or provide default analysis
             print(f"Could not parse AI response as JSON: {ai_content}")
@@ -442,15 +721,19 @@ IMPORTANT: Respond with ONLY the JSON object, no other text or markdown formatti
             return {
                 "credibility_score": credibility_score,
                 "fake_news_likelihood_percentage": fake_percentage,
-                "fact_check_reasoning": ai_content[:300] + "..." if len(ai_content) > 300 else ai_content,
+                "fact_check_reasoning": shorten(ai_content, 300),
                 "confidence": "medium",
                 "key_claims": ["Analysis completed"],
                 "red_flags": ["Manual parsing used"],
-                "recommendation": "questionable" if fake_percentage > 50 else "trustworthy"
+                "recommendation": "questionable" if fake_percentage > 50 else "trustworthy",
+                "analysis_mode": "fallback"
             }
         
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Hack Club AI API: {str(e)}")
+    except TimeoutError:
+        logger.warning("Fact-check LLM call ran out of time")
+        return degraded_fact_check("Fact-checking ran out of time")
+    except llm.LLMError as e:
+        logger.error(f"Fact-check LLM call failed: {str(e)}")
         return {
             "credibility_score": 50,
             "fake_news_likelihood_percentage": 50,
@@ -458,7 +741,8 @@ IMPORTANT: Respond with ONLY the JSON object, no other text or markdown formatti
             "confidence": "low",
             "key_claims": [],
             "red_flags": ["Service unavailable"],
-            "recommendation": "questionable"
+            "recommendation": "questionable",
+            "analysis_mode": "fallback"
         }
     except Exception as e:
         print(f"Error in fact-checking: {str(e)}")
@@ -469,7 +753,22 @@ IMPORTANT: Respond with ONLY the JSON object, no other text or markdown formatti
             "confidence": "low",
             "key_claims": [],
             "red_flags": ["Technical error"],
-            "recommendation": "questionable"
+            "recommendation": "questionable",
+            "analysis_mode": "fallback"
         }
 
 
+def degraded_fact_check(reason):
+    """Neutral fact-check result for when the request deadline cut the analysis short"""
+    return {
+        "credibility_score": 50,
+        "fake_news_likelihood_percentage": 50,
+        "fact_check_reasoning": reason,
+        "confidence": "low",
+        "key_claims": [],
+        "red_flags": ["Analysis incomplete"],
+        "recommendation": "questionable",
+        "analysis_mode": "degraded"
+    }
+
+
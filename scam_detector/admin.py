@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ScamAnalysis
+
+
+@admin.register(ScamAnalysis)
+class ScamAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('id', 'input_hash', 'created_at')
+    readonly_fields = ('result',)
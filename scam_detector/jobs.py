@@ -0,0 +1,9 @@
+"""Job handlers (see api/jobs.py)"""
+from api import jobs
+from .views import analyze_screenshot_data
+
+
+@jobs.handler('scam_detection')
+def run_scam_job(payload):
+    response = analyze_screenshot_data(payload)
+    return response.data, response.status_code
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:29
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScamAnalysis',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('detector', models.CharField(db_index=True, max_length=64)),
+                ('input_hash', models.CharField(db_index=True, max_length=64)),
+                ('domain', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('result', models.JSONField()),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name_plural': 'scam analyses',
+                'ordering': ['-created_at'],
+                'abstract': False,
+            },
+        ),
+    ]
@@ -1,3 +1,11 @@
 from django.db import models
 
-# Create your models here.
+from api.models import AnalysisResult
+
+
+class ScamAnalysis(AnalysisResult):
+    """A scam analysis of an uploaded screenshot"""
+    DETECTOR = 'scam_detection'
+
+    class Meta(AnalysisResult.Meta):
+        verbose_name_plural = 'scam analyses'
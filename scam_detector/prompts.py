@@ -0,0 +1,40 @@
+"""
+Scam screenshot prompt (see api/prompts.py). The instructions are the
+static, cacheable prefix; the screenshot follows in the user message.
+"""
+from api import prompts
+
+SCAM_DETECTION = prompts.register(
+    'scam_detection',
+    prefix="""
+Analyze the provided screenshot for potential scam indicators. This could be a screenshot of SMS messages, emails, social media messages, or any other communication that might be a scam.
+
+Look for common scam patterns including:
+- Urgent language and time pressure
+- Requests for personal information (passwords, SSN, bank details)
+- Suspicious links or phone numbers
+- Grammar and spelling errors
+- Impersonation of legitimate organizations
+- Too-good-to-be-true offers
+- Threats or fear tactics
+- Requests for money or gift cards
+- Poor formatting or unprofessional appearance
+
+Provide your analysis in this exact JSON format:
+{
+    "scam_likelihood_percentage": <number between 0-100>,
+    "scam_confidence": "<low/medium/high>",
+    "scam_type": "<type of scam detected or 'unknown'>",
+    "red_flags": ["<list of specific red flags found>"],
+    "legitimate_indicators": ["<list of indicators suggesting legitimacy>"],
+    "risk_level": "<low/medium/high/critical>",
+    "recommended_action": "<specific recommendation for the user>",
+    "analysis_summary": "<brief summary of the analysis>"
+}
+
+Be thorough in your analysis and consider both scam indicators and legitimate communication patterns.
+""",
+    suffix="""
+Analyze the attached screenshot.
+""",
+)
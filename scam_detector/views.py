@@ -1,5 +1,6 @@
 from django.shortcuts import render
 from django.http import JsonResponse
+from django.conf import settings
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
@@ -10,6 +11,13 @@ import base64
 import logging
 import os
 
+from api import llm, results
+from api.bulkhead import bulkhead
+from api.model_json import parse_model_json
+from api.tokens import shorten
+from .models import ScamAnalysis
+from .prompts import SCAM_DETECTION
+
 logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
@@ -27,12 +35,21 @@ def scam_detector_view(request):
 
 
 @api_view(['POST'])
+@bulkhead('scam_detection')
 def analyze_scam_screenshot(request):
     """
-    Analyze screenshot for scam detection using OpenAI GPT-4o
+    Analyze screenshot for scam detection with the scam_detection LLM route (vision models)
     Accepts base64 encoded screenshots from frontend
     """
-    image_base64 = request.data.get('image_base64', '')
+    return analyze_screenshot_data(request.data, timestamp=request.META.get('HTTP_DATE', ''))
+
+
+def analyze_screenshot_data(data, timestamp=''):
+    """
+    analyze_scam_screenshot for a request body (also run by scam_detection jobs);
+    returns the DRF Response
+    """
+    image_base64 = data.get('image_base64', '')
     
     if not image_base64:
         return Response(
@@ -55,106 +72,46 @@ def analyze_scam_screenshot(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Initialize OpenAI client with API key from environment variables
-        try:
-            import os
-            import logging
-            from openai import OpenAI
-            
-            # Get API key from environment variables
-            api_key = os.getenv('OPENAI_API_KEY')
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY environment variable is not set")
-            
-            # Log the API key for debugging (first few characters only)
-            logger.info(f"Initializing OpenAI client with API key: {api_key[:8]}...")
-            
-            # Create client configuration
-            client_config = {
-                'api_key': api_key,
-            }
-            
-            # Initialize the client with explicit configuration
-            client = OpenAI(**client_config)
-        except Exception as init_error:
-            logger.error(f"Failed to initialize OpenAI client: {str(init_error)}")
-            return Response(
-                {
-                    'error': 'Failed to initialize AI service',
-                    'details': str(init_error)
-                },
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
-        
-        # Create comprehensive prompt for scam detection
-        analysis_prompt = """
-Analyze the provided screenshot for potential scam indicators. This could be a screenshot of SMS messages, emails, social media messages, or any other communication that might be a scam.
-
-Look for common scam patterns including:
-- Urgent language and time pressure
-- Requests for personal information (passwords, SSN, bank details)
-- Suspicious links or phone numbers
-- Grammar and spelling errors
-- Impersonation of legitimate organizations
-- Too-good-to-be-true offers
-- Threats or fear tactics
-- Requests for money or gift cards
-- Poor formatting or unprofessional appearance
-
-Provide your analysis in this exact JSON format:
-{
-    "scam_likelihood_percentage": <number between 0-100>,
-    "scam_confidence": "<low/medium/high>",
-    "scam_type": "<type of scam detected or 'unknown'>",
-    "red_flags": ["<list of specific red flags found>"],
-    "legitimate_indicators": ["<list of indicators suggesting legitimacy>"],
-    "risk_level": "<low/medium/high/critical>",
-    "recommended_action": "<specific recommendation for the user>",
-    "analysis_summary": "<brief summary of the analysis>"
-}
-
-Be thorough in your analysis and consider both scam indicators and legitimate communication patterns.
-"""
+        # The same screenshot analysed recently is answered from the result store
+        key = results.input_hash(image_base64)
+        stored = results.lookup(ScamAnalysis, key)
+        if stored is not None:
+            return Response(results.reused_body(stored))
         
-        # Make request to OpenAI GPT-4o
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": analysis_prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
+        # Static instructions go first as the system prompt (cached by the provider), then the screenshot
+        analysis_prompt = SCAM_DETECTION.render()
+        with llm.track_usage() as usage:
+            ai_content = llm.chat_routed(
+                'scam_detection',
+                [
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": analysis_prompt.user
+                            },
+                            {
+                                "type": "image_url",
+                                "image_url": {
+                                    "url": f"data:image/jpeg;base64,{image_base64}"
+                                }
                             }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1500
-        )
-        
-        ai_content = response.choices[0].message.content
+                        ]
+                    }
+                ],
+                system=analysis_prompt.system,
+                cache_system=analysis_prompt.cacheable,
+                max_tokens=1500,
+                # Vision calls take far longer than LLM_TIMEOUT allows
+                timeout=settings.AI_IMAGE_TIMEOUT
+            )
         
         # Try to parse the AI response as JSON
         try:
             # Extract JSON from the response if it's wrapped in markdown or other text
-            json_match = re.search(r'\{[^}]*"scam_likelihood_percentage"[^}]*"analysis_summary"[^}]*\}', ai_content, re.DOTALL)
-            if json_match:
-                analysis_data = json.loads(json_match.group())
-            else:
-                # Try to find JSON block in markdown
-                json_block_match = re.search(r'```json\s*(\{.*?\})\s*```', ai_content, re.DOTALL)
-                if json_block_match:
-                    analysis_data = json.loads(json_block_match.group(1))
-                else:
-                    raise ValueError("No valid JSON found in response")
-        except (json.JSONDecodeError, ValueError):
+            analysis_data = parse_model_json(ai_content, 'scam_detection')
+        except ValueError:
             # Fallback: parse manually or provide default analysis
             logger.warning(f"Could not parse AI response as JSON: {ai_content}")
             
@@ -173,7 +130,7 @@ Be thorough in your analysis and consider both scam indicators and legitimate co
                 "legitimate_indicators": [],
                 "risk_level": risk_level,
                 "recommended_action": "Review the message carefully",
-                "analysis_summary": ai_content[:300] + "..." if len(ai_content) > 300 else ai_content
+                "analysis_summary": shorten(ai_content, 300)
             }
         
         # Format the comprehensive response
@@ -191,15 +148,36 @@ Be thorough in your analysis and consider both scam indicators and legitimate co
             'recommended_action': analysis_data.get('recommended_action', 'Review carefully'),
             'analysis_summary': analysis_data.get('analysis_summary', 'Scam analysis completed'),
             # Metadata
-            'model_used': 'OpenAI GPT-4o',
+            'model_used': ai_content.model_used,
             'analysis_type': 'scam_detection',
-            'timestamp': request.META.get('HTTP_DATE', '')
+            'timestamp': timestamp,
+            'token_usage': usage
         }
+        result['result_id'] = results.save(ScamAnalysis, key, result)
         
         return Response(result)
         
+    except llm.LLMConfigurationError as e:
+        logger.error(f"No usable LLM provider for screenshot analysis: {str(e)}")
+        return Response(
+            {
+                'error': 'Failed to initialize AI service',
+                'details': str(e)
+            },
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    except llm.LLMError as e:
+        logger.error(f"Screenshot analysis LLM call failed: {str(e)}")
+        return Response(
+            {
+                'error': 'Failed to analyze screenshot - AI service unavailable',
+                'details': str(e)
+            },
+            status=e.status_code,
+            headers=llm.error_headers(e)
+        )
     except Exception as e:
-        logger.error(f"Error calling OpenAI API: {str(e)}")
+        logger.error(f"Unexpected error in screenshot analysis: {str(e)}")
         return Response(
             {
                 'error': 'Failed to analyze screenshot - AI service unavailable',
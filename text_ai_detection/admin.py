@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import TextAnalysis
+
+
+@admin.register(TextAnalysis)
+class TextAnalysisAdmin(admin.ModelAdmin):
+    list_display = ('id', 'input_hash', 'created_at')
+    readonly_fields = ('result',)
@@ -0,0 +1,138 @@
+"""
+Packed analysis of many short texts.
+
+Moderation clients send comment threads: hundreds of short texts, each of
+which would otherwise pay for the whole instruction prompt and a round trip
+of its own. Here texts are packed, in order, into as few calls as fit
+TEXT_BATCH_PACK_TOKENS of text and TEXT_BATCH_PACK_ITEMS texts per call,
+each tagged with a short id, and the model answers with one JSON object per
+id. Packs run concurrently, TEXT_BATCH_CONCURRENCY at a time, within one
+Deadline.
+
+A reply that leaves items out (malformed, cut off at max_tokens, or items
+skipped) doesn't fail the pack. If nothing usable came back the pack is
+split in half and each half sent again, so one text that confuses the model
+can't take its neighbours down with it; otherwise the missing items are
+packed together and retried, up to TEXT_BATCH_RETRIES times.
+"""
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+
+from api import llm, metrics
+from api.model_json import parse_model_json_items
+from api.tokens import fit_text, measure_prompt
+from .prompts import TEXT_BATCH_ANALYSIS
+
+logger = logging.getLogger(__name__)
+
+NO_ANALYSIS = 'The model returned no analysis for this text'
+
+
+def prepare_items(texts):
+    """
+    (id, text, tokens) items for texts, with ids '1', '2', ...; texts over
+    TEXT_MAX_INPUT_TOKENS are trimmed like a single analysis would be
+    """
+    items = []
+    for index, text in enumerate(texts, start=1):
+        fitted, original, kept = fit_text(text, settings.TEXT_MAX_INPUT_TOKENS)
+        if kept < original:
+            llm.record_input_tokens(0, original - kept)
+        items.append((str(index), fitted, kept))
+    return items
+
+
+def pack_items(items, max_tokens, max_items):
+    """
+    Group items, in order, into packs of at most max_items items and
+    max_tokens of text; an item larger than max_tokens gets a pack of its own
+    """
+    packs, current, used = [], [], 0
+    for item in items:
+        if current and (used + item[2] > max_tokens or len(current) >= max_items):
+            packs.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += item[2]
+    if current:
+        packs.append(current)
+    return packs
+
+
+def render_pack(pack):
+    items = ',\n'.join(json.dumps({'id': item_id, 'text': text}, ensure_ascii=False) for item_id, text, _ in pack)
+    return measure_prompt(TEXT_BATCH_ANALYSIS.render(count=len(pack), items=f'[\n{items}\n]'))
+
+
+async def _analyze_pack(pack, deadline, slots, attempt=0):
+    """
+    Analyse one pack; returns (analyses, errors), dicts keyed by item id
+    covering every item: the validated analysis, or (message, HTTP status)
+    """
+    if deadline.expired:
+        return {}, {item_id: ('Not analyzed before the batch deadline', 504) for item_id, _, _ in pack}
+
+    prompt = render_pack(pack)
+    try:
+        async with slots:
+            reply = await llm.chat_routed_async(
+                'text_ai_detection', prompt,
+                timeout=deadline.timeout(settings.TEXT_BATCH_CALL_TIMEOUT),
+                max_tokens=settings.TEXT_BATCH_OUTPUT_TOKENS_PER_ITEM * len(pack),
+            )
+    except llm.LLMError as e:
+        # The gateway already retried and failed over; another try now would fail the same way
+        logger.warning(f"Packed analysis of {len(pack)} texts failed: {str(e)}")
+        return {}, {item_id: (str(e), e.status_code) for item_id, _, _ in pack}
+
+    metrics.incr('text_ai.batch.calls')
+    found = parse_model_json_items(reply, 'text_ai_detection')
+    analyses = {
+        item_id: {**found[item_id], 'model_used': reply.model_used} for item_id, _, _ in pack if item_id in found
+    }
+    missing = [item for item in pack if item[0] not in analyses]
+    if not missing:
+        return analyses, {}
+
+    metrics.incr('text_ai.batch.missing', len(missing))
+    if len(missing) == len(pack) and len(pack) > 1:
+        metrics.incr('text_ai.batch.splits')
+        half = len(pack) // 2
+        parts = await asyncio.gather(
+            _analyze_pack(pack[:half], deadline, slots, attempt), _analyze_pack(pack[half:], deadline, slots, attempt)
+        )
+    elif attempt < settings.TEXT_BATCH_RETRIES:
+        metrics.incr('text_ai.batch.retries')
+        logger.info(f"Reply for {len(pack)} texts missed {len(missing)}, retrying them")
+        parts = [await _analyze_pack(missing, deadline, slots, attempt + 1)]
+    else:
+        logger.warning(f"No usable analysis for {len(missing)} texts after {attempt + 1} attempts")
+        parts = [({}, {item_id: (NO_ANALYSIS, 502) for item_id, _, _ in missing})]
+
+    errors = {}
+    for part_analyses, part_errors in parts:
+        analyses.update(part_analyses)
+        errors.update(part_errors)
+    return analyses, errors
+
+
+async def analyze_texts_async(texts, deadline, concurrency=None):
+    """
+    Analyse texts in packed calls, at most concurrency (TEXT_BATCH_CONCURRENCY)
+    at a time; returns one entry per text, in order: the analysis dict (with
+    the model_used that answered it), or (error message, HTTP status)
+    """
+    items = prepare_items(texts)
+    packs = pack_items(items, settings.TEXT_BATCH_PACK_TOKENS, settings.TEXT_BATCH_PACK_ITEMS)
+    metrics.incr('text_ai.batch.items', len(items))
+    metrics.incr('text_ai.batch.packs', len(packs))
+
+    slots = asyncio.Semaphore(concurrency or settings.TEXT_BATCH_CONCURRENCY)
+    analyses, errors = {}, {}
+    for part_analyses, part_errors in await asyncio.gather(*(_analyze_pack(pack, deadline, slots) for pack in packs)):
+        analyses.update(part_analyses)
+        errors.update(part_errors)
+    return [analyses.get(item_id) or errors.get(item_id, (NO_ANALYSIS, 502)) for item_id, _, _ in items]
@@ -0,0 +1,18 @@
+"""Job handlers (see api/jobs.py)"""
+from django.conf import settings
+
+from api import jobs
+from .views import analyze_text_batch_data, analyze_text_data
+
+
+@jobs.handler('text_ai_detection')
+def run_text_job(payload):
+    response = analyze_text_data(payload)
+    return response.data, response.status_code
+
+
+@jobs.handler('text_ai_detection_batch')
+def run_text_batch_job(payload):
+    # Batches too large to finish within a request get the longer job deadline
+    response = analyze_text_batch_data(payload, deadline_seconds=settings.JOBS_ANALYZE_DEADLINE_SECONDS)
+    return response.data, response.status_code
@@ -0,0 +1,99 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import llm
+from api.resilience import Deadline
+from api.runtime import run_sync
+from text_ai_detection.batching import analyze_texts_async
+from text_ai_detection.views import detect_text
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / 'fixtures' / 'comments.txt'
+
+
+def load_texts(path, count):
+    """count texts from a file of one text per line, repeated (and numbered, so each is distinct) if short"""
+    lines = [line.strip() for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+    if not lines:
+        raise CommandError(f"No texts in {path}")
+    return [
+        lines[i % len(lines)] if i < len(lines) else f"{lines[i % len(lines)]} ({i // len(lines) + 1})"
+        for i in range(count)
+    ]
+
+
+def run_single(texts, concurrency):
+    """One analyze_text call per text, concurrency at a time"""
+    usage = llm.empty_usage()
+    failed = 0
+
+    def analyze(text):
+        try:
+            return detect_text(text)[1]
+        except llm.LLMError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for call_usage in pool.map(analyze, texts):
+            if call_usage is None:
+                failed += 1
+                continue
+            for key in usage:
+                usage[key] += call_usage.get(key, 0)
+    return usage, failed
+
+
+def run_packed(texts, concurrency):
+    """The batch endpoint's packed calls"""
+    deadline_seconds = settings.JOBS_ANALYZE_DEADLINE_SECONDS
+    with llm.track_usage() as usage:
+        outcomes = run_sync(
+            analyze_texts_async(texts, Deadline(deadline_seconds), concurrency),
+            timeout=deadline_seconds + llm.SYNC_GRACE_SECONDS,
+        )
+    return usage, sum(1 for outcome in outcomes if isinstance(outcome, tuple))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare packed batch text analysis against one call per text: wall time, LLM calls and tokens "
+        "per text. Calls the configured text_ai_detection route, so it spends real tokens."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', nargs='?', default=str(DEFAULT_CORPUS), help="Text file, one text per line")
+        parser.add_argument('--count', type=int, default=100, help="Texts to analyze in each mode")
+        parser.add_argument('--concurrency', type=int, default=settings.TEXT_BATCH_CONCURRENCY,
+                            help="LLM calls in flight in each mode")
+        parser.add_argument('--mode', choices=('both', 'single', 'packed'), default='both')
+
+    def handle(self, *args, **options):
+        path = Path(options['corpus'])
+        if not path.is_file():
+            raise CommandError(f"No such file: {path}")
+        texts = load_texts(path, max(1, options['count']))
+        concurrency = max(1, options['concurrency'])
+        modes = ('single', 'packed') if options['mode'] == 'both' else (options['mode'],)
+        runners = {'single': run_single, 'packed': run_packed}
+
+        self.stdout.write(
+            f"{len(texts)} texts, concurrency {concurrency}, packs of up to {settings.TEXT_BATCH_PACK_ITEMS} texts / "
+            f"{settings.TEXT_BATCH_PACK_TOKENS} tokens"
+        )
+        timings = {}
+        for mode in modes:
+            started = time.perf_counter()
+            usage, failed = runners[mode](texts, concurrency)
+            elapsed = time.perf_counter() - started
+            timings[mode] = elapsed
+            analysed = max(1, len(texts) - failed)
+            self.stdout.write(
+                f"{mode:6s} {elapsed:7.2f}s {len(texts) / elapsed:7.1f} texts/s  {usage['calls']:4d} calls  "
+                f"prompt {usage['prompt_tokens'] / analysed:7.1f} (cached {usage['cached_tokens'] / analysed:6.1f})  "
+                f"completion {usage['completion_tokens'] / analysed:6.1f} tokens/text  {failed} failed"
+            )
+        if len(timings) == 2 and timings['packed']:
+            self.stdout.write(f"packed is {timings['single'] / timings['packed']:.2f}x the throughput of one call per text")
@@ -1,3 +1,11 @@
 from django.db import models
 
-# Create your models here.
+from api.models import AnalysisResult
+
+
+class TextAnalysis(AnalysisResult):
+    """An AI-generation / misinformation analysis of pasted text"""
+    DETECTOR = 'text_ai_detection'
+
+    class Meta(AnalysisResult.Meta):
+        verbose_name_plural = 'text analyses'
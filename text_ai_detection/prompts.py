@@ -0,0 +1,58 @@
+"""
+Text AI / misinformation detection prompt (see api/prompts.py). The
+instructions are the static, cacheable prefix; the user's text follows.
+"""
+from api import prompts
+
+TEXT_ANALYSIS = prompts.register(
+    'text_ai_detection',
+    prefix="""
+Analyze the text in the user message for two things:
+1. Determine if it was likely generated by AI or written by a human
+2. Assess if the content contains misinformation, fake news, or misleading claims
+
+Provide your analysis in this exact JSON format:
+{
+    "ai_likelihood_percentage": <number between 0-100>,
+    "ai_reasoning": "<brief explanation of AI detection analysis>",
+    "ai_confidence": "<high/medium/low>",
+    "fake_news_likelihood_percentage": <number between 0-100>,
+    "fake_news_reasoning": "<brief explanation of fact-checking and credibility analysis>",
+    "fake_news_confidence": "<high/medium/low>",
+    "credibility_score": <number between 0-100>
+}
+""",
+    suffix="""
+Text to analyze:
+"{text}"
+""",
+)
+
+# Many short texts in one call (text_ai_detection/batching.py): same analysis, one object per id
+TEXT_BATCH_ANALYSIS = prompts.register(
+    'text_ai_detection_batch',
+    prefix="""
+The user message is a JSON list of texts, each with an "id". Analyze every text on its own, for two things:
+1. Determine if it was likely generated by AI or written by a human
+2. Assess if the content contains misinformation, fake news, or misleading claims
+
+Reply with only a JSON array holding one object per text, in the same order, in this exact format:
+[
+    {
+        "id": "<the text's id, unchanged>",
+        "ai_likelihood_percentage": <number between 0-100>,
+        "ai_reasoning": "<one short sentence>",
+        "ai_confidence": "<high/medium/low>",
+        "fake_news_likelihood_percentage": <number between 0-100>,
+        "fake_news_reasoning": "<one short sentence>",
+        "fake_news_confidence": "<high/medium/low>",
+        "credibility_score": <number between 0-100>
+    }
+]
+Do not skip or merge texts, even when they are very short or identical.
+""",
+    suffix="""
+Texts to analyze ({count}):
+{items}
+""",
+)
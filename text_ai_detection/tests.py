@@ -1,3 +1,147 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from api import jobs, llm, results
+from api.models import Job
+from api.resilience import Deadline
+from . import batching
+from .models import TextAnalysis
+
+STORED_TEXT = 'A comment that was analysed a few minutes ago.'
+STORED_RESULT = {
+    'text': STORED_TEXT,
+    'ai_likelihood_percentage': 20,
+    'fake_news_likelihood_percentage': 5,
+    'credibility_score': 90,
+    'model_used': 'OpenAI gpt-4o',
+}
+
+
+def run_job(kind, payload):
+    """Run a job the way a worker does, once it has claimed it"""
+    now = timezone.now()
+    job = Job.objects.create(
+        kind=kind, payload=payload, status=Job.RUNNING, attempts=1, started_at=now,
+        lease_until=now + timedelta(seconds=600), expires_at=now + timedelta(seconds=600),
+    )
+    jobs.execute(job)
+    job.refresh_from_db()
+    return job
+
+
+@override_settings(RESULTS_STORE_ENABLED=True, RESULTS_REUSE_TTL=3600)
+class StoredResultJobTests(TestCase):
+    def setUp(self):
+        self.row = TextAnalysis.objects.create(
+            detector=TextAnalysis.DETECTOR, input_hash=results.input_hash(STORED_TEXT), result=STORED_RESULT
+        )
+
+    def test_job_for_stored_text_finishes_with_the_stored_result(self):
+        job = run_job('text_ai_detection', {'text': f'  {STORED_TEXT}\n'})
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result['result_id'], str(self.row.id))
+        self.assertEqual(job.result['reused_result_from'], self.row.created_at.isoformat())
+        self.assertEqual(job.result['ai_likelihood_percentage'], 20)
+
+
+def packed_reply(prompt, answer=lambda item_id: True):
+    """A model reply analysing the pack's items for which answer(id) is true"""
+    ids = re.findall(r'"id": "(\d+)"', prompt.user)
+    return json.dumps([
+        {'id': item_id, 'ai_likelihood_percentage': 10 * int(item_id), 'fake_news_likelihood_percentage': 5}
+        for item_id in ids if answer(item_id)
+    ])
+
+
+@override_settings(
+    TEXT_BATCH_PACK_ITEMS=4, TEXT_BATCH_PACK_TOKENS=1000, TEXT_BATCH_RETRIES=1, TEXT_BATCH_CONCURRENCY=2,
+    TEXT_MAX_INPUT_TOKENS=1000,
+)
+class PackedBatchTests(SimpleTestCase):
+    def analyze(self, texts, reply, deadline=30):
+        """analyze_texts_async with the model answering reply(prompt, call number); returns (outcomes, pack sizes)"""
+        calls = []
+
+        async def chat(route, prompt, timeout, max_tokens):
+            calls.append(len(re.findall(r'"id": "', prompt.user)))
+            return llm.Reply(reply(prompt, len(calls)), llm.OPENAI, 'gpt-4o')
+
+        with mock.patch.object(batching.llm, 'chat_routed_async', chat):
+            return asyncio.run(batching.analyze_texts_async(texts, Deadline(deadline))), calls
+
+    def test_pack_items_respects_item_and_token_limits(self):
+        items = [('1', 'a', 300), ('2', 'b', 300), ('3', 'c', 2000), ('4', 'd', 10), ('5', 'e', 10)]
+        packs = batching.pack_items(items, max_tokens=700, max_items=2)
+        self.assertEqual([[item[0] for item in pack] for pack in packs], [['1', '2'], ['3'], ['4', '5']])
+
+    def test_texts_are_packed_and_answered_in_order(self):
+        outcomes, calls = self.analyze([f'Comment number {i}.' for i in range(1, 7)], lambda prompt, call: packed_reply(prompt))
+        self.assertEqual(sorted(calls), [2, 4])
+        self.assertEqual([outcome['ai_likelihood_percentage'] for outcome in outcomes], [10, 20, 30, 40, 50, 60])
+        self.assertTrue(all(outcome['model_used'] == 'OpenAI gpt-4o' for outcome in outcomes))
+
+    def test_items_left_out_are_retried(self):
+        def reply(prompt, call):
+            return packed_reply(prompt, lambda item_id: call > 1 or item_id != '2')
+
+        outcomes, calls = self.analyze(['One.', 'Two.', 'Three.'], reply)
+        self.assertEqual(calls, [3, 1])
+        self.assertEqual(outcomes[1]['ai_likelihood_percentage'], 20)
+
+    def test_items_still_missing_after_retries_get_an_error(self):
+        with self.assertLogs('text_ai_detection.batching', 'WARNING'):
+            outcomes, calls = self.analyze(
+                ['One.', 'Two.', 'Three.'], lambda prompt, call: packed_reply(prompt, lambda item_id: item_id != '2')
+            )
+        self.assertEqual(calls, [3, 1])
+        self.assertEqual(outcomes[1], (batching.NO_ANALYSIS, 502))
+        self.assertIsInstance(outcomes[0], dict)
+
+    def test_unusable_reply_splits_the_pack(self):
+        def reply(prompt, call):
+            return "I'm sorry, I can't help with that." if call == 1 else packed_reply(prompt)
+
+        outcomes, calls = self.analyze(['One.', 'Two.', 'Three.', 'Four.'], reply)
+        self.assertEqual(calls, [4, 2, 2])
+        self.assertTrue(all(isinstance(outcome, dict) for outcome in outcomes))
+
+    def test_failed_call_fails_its_items_with_the_gateway_status(self):
+        async def chat(route, prompt, timeout, max_tokens):
+            raise llm.LLMTimeoutError('timed out', provider=llm.OPENAI)
+
+        with mock.patch.object(batching.llm, 'chat_routed_async', chat), \
+                self.assertLogs('text_ai_detection.batching', 'WARNING'):
+            outcomes = asyncio.run(batching.analyze_texts_async(['One.', 'Two.'], Deadline(30)))
+        self.assertEqual(outcomes, [('timed out', 504), ('timed out', 504)])
+
+    def test_expired_deadline_makes_no_calls(self):
+        outcomes, calls = self.analyze(['One.', 'Two.'], lambda prompt, call: packed_reply(prompt), deadline=0)
+        self.assertEqual(calls, [])
+        self.assertEqual([outcome[1] for outcome in outcomes], [504, 504])
+
+
+@override_settings(RESULTS_STORE_ENABLED=True, RESULTS_REUSE_TTL=3600, TEXT_BATCH_PACK_ITEMS=10)
+class BatchJobTests(TestCase):
+    def test_batch_job_with_a_stored_text(self):
+        row = TextAnalysis.objects.create(
+            detector=TextAnalysis.DETECTOR, input_hash=results.input_hash(STORED_TEXT), result=STORED_RESULT
+        )
+
+        async def chat(route, prompt, timeout, max_tokens):
+            return llm.Reply(packed_reply(prompt), llm.OPENAI, 'gpt-4o')
+
+        with mock.patch.object(batching.llm, 'chat_routed_async', chat), \
+                mock.patch.object(results, 'save', return_value=None):
+            job = run_job('text_ai_detection_batch', {'texts': [STORED_TEXT, 'A comment nobody has analysed yet.']})
+
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        reused, analysed = job.result['results']
+        self.assertEqual(reused['reused_result_from'], row.created_at.isoformat())
+        self.assertEqual(analysed['ai_likelihood_percentage'], 10)
+        self.assertEqual(job.result['summary'], {'total': 2, 'analyzed': 1, 'reused': 1, 'failed': 0})
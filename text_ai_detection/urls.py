@@ -6,4 +6,5 @@ app_name = 'text_ai_detection'
 urlpatterns = [
     path('', views.text_ai_detection_view, name='text-ai-detection'),
     path('analyze/', views.analyze_text, name='analyze-text'),
+    path('analyze/batch/', views.analyze_text_batch, name='analyze-text-batch'),
 ]
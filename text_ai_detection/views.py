@@ -1,11 +1,22 @@
 from django.shortcuts import render
 from django.http import JsonResponse
+from django.conf import settings
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
-import requests
-import json
 import logging
+import re
+
+from api import llm, results
+from api.bulkhead import bulkhead
+from api.model_json import parse_model_json
+from api.resilience import Deadline
+from api.runtime import run_sync
+from api.singleflight import get_flight, idempotency_key, request_key
+from api.tokens import fit_prompt, shorten
+from .batching import analyze_texts_async
+from .models import TextAnalysis
+from .prompts import TEXT_ANALYSIS
 
 logger = logging.getLogger(__name__)
 
@@ -19,17 +30,88 @@ def text_ai_detection_view(request):
         'service': 'Text AI Detection',
         'description': 'Detects AI-generated text content',
         'endpoints': {
-            'analyze': '/text-ai-detection/analyze/ (POST)'
+            'analyze': '/text-ai-detection/analyze/ (POST)',
+            'analyze_batch': '/text-ai-detection/analyze/batch/ (POST, many short texts)'
         }
     })
 
 
+def detect_text(text):
+    """
+    Ask the model whether text is AI-generated and/or misinformation.
+    Returns the parsed analysis dict, the call's token usage and the model
+    that answered. Raises llm.LLMError if the call fails.
+    """
+    # Static instructions first (cached by the provider), then the user's text within its token budget
+    with llm.track_usage() as usage:
+        prompt = fit_prompt(TEXT_ANALYSIS, 'text', text, max_input_tokens=settings.TEXT_MAX_INPUT_TOKENS)
+        ai_content = llm.chat_routed('text_ai_detection', prompt, timeout=30)
+    
+    # Try to parse the AI response as JSON
+    try:
+        # Extract JSON from the response if it's wrapped in markdown or other text
+        analysis_data = parse_model_json(ai_content, 'text_ai_detection')
+    except ValueError:
+        # Fallback: parse manually or provide default analysis
+        logger.warning(f"Could not parse AI response as JSON: {ai_content}")
+        
+        # Try to extract percentages from text response
+        ai_percentage_match = re.search(r'AI.*?(\d+)%', ai_content, re.IGNORECASE)
+        fake_percentage_match = re.search(r'fake.*?(\d+)%', ai_content, re.IGNORECASE)
+        
+        ai_percentage = int(ai_percentage_match.group(1)) if ai_percentage_match else 50
+        fake_percentage = int(fake_percentage_match.group(1)) if fake_percentage_match else 30
+        
+        analysis_data = {
+            "ai_likelihood_percentage": ai_percentage,
+            "ai_reasoning": shorten(ai_content, 150),
+            "ai_confidence": "medium",
+            "fake_news_likelihood_percentage": fake_percentage,
+            "fake_news_reasoning": "Analysis based on content patterns and factual consistency",
+            "fake_news_confidence": "medium",
+            "credibility_score": 100 - fake_percentage
+        }
+    
+    return analysis_data, usage, ai_content.model_used
+
+
+def format_analysis(analysis_data):
+    """The analysis fields of an analyze_text response, with defaults for anything missing"""
+    return {
+        # AI Detection Results
+        'ai_likelihood_percentage': analysis_data.get('ai_likelihood_percentage', 50),
+        'ai_reasoning': analysis_data.get('ai_reasoning', 'AI detection analysis completed'),
+        'ai_confidence': analysis_data.get('ai_confidence', 'medium'),
+        'is_ai_generated': analysis_data.get('ai_likelihood_percentage', 50) > 50,
+        # Fake News Detection Results
+        'fake_news_likelihood_percentage': analysis_data.get('fake_news_likelihood_percentage', 30),
+        'fake_news_reasoning': analysis_data.get('fake_news_reasoning', 'Fact-checking analysis completed'),
+        'fake_news_confidence': analysis_data.get('fake_news_confidence', 'medium'),
+        'is_fake_news': analysis_data.get('fake_news_likelihood_percentage', 30) > 50,
+        'credibility_score': analysis_data.get('credibility_score', 70),
+    }
+
+
+ANALYSIS_FIELDS = tuple(format_analysis({}))
+
+
 @api_view(['POST'])
+@bulkhead('text_ai_detection')
 def analyze_text(request):
     """
-    Analyze text for AI generation detection using Hack Club AI API
+    Analyze text for AI generation detection with the text_ai_detection LLM route
     """
-    text = request.data.get('text', '')
+    return analyze_text_data(
+        request.data, idem_key=idempotency_key(request), timestamp=request.META.get('HTTP_DATE', '')
+    )
+
+
+def analyze_text_data(data, idem_key=None, timestamp=''):
+    """
+    analyze_text for a request body (also run by text_ai_detection jobs);
+    returns the DRF Response
+    """
+    text = data.get('text', '')
     
     if not text:
         return Response(
@@ -38,108 +120,45 @@ def analyze_text(request):
         )
     
     try:
-        # Create comprehensive prompt for both AI detection and fake news analysis
-        analysis_prompt = f"""
-Analyze the following text for two things:
-1. Determine if it was likely generated by AI or written by a human
-2. Assess if the content contains misinformation, fake news, or misleading claims
-
-Provide your analysis in this exact JSON format:
-{{
-    "ai_likelihood_percentage": <number between 0-100>,
-    "ai_reasoning": "<brief explanation of AI detection analysis>",
-    "ai_confidence": "<high/medium/low>",
-    "fake_news_likelihood_percentage": <number between 0-100>,
-    "fake_news_reasoning": "<brief explanation of fact-checking and credibility analysis>",
-    "fake_news_confidence": "<high/medium/low>",
-    "credibility_score": <number between 0-100>
-}}
-
-Text to analyze:
-"{text}"
-"""
+        # A text analysed recently is answered from the result store
+        normalized = ' '.join(text.split())
+        key = results.input_hash(normalized)
+        stored = results.lookup(TextAnalysis, key)
+        if stored is not None:
+            return Response(results.reused_body(stored))
         
-        # Make request to Hack Club AI API
-        api_url = "https://ai.hackclub.com/chat/completions"
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            "messages": [
-                {
-                    "role": "user", 
-                    "content": analysis_prompt
-                }
-            ]
-        }
-        
-        response = requests.post(api_url, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        
-        ai_response = response.json()
-        ai_content = ai_response.get('choices', [{}])[0].get('message', {}).get('content', '')
-        
-        # Try to parse the AI response as JSON
-        try:
-            # Extract JSON from the response if it's wrapped in markdown or other text
-            import re
-            json_match = re.search(r'\{[^}]*"ai_likelihood_percentage"[^}]*"credibility_score"[^}]*\}', ai_content)
-            if json_match:
-                analysis_data = json.loads(json_match.group())
-            else:
-                # Fallback parsing if JSON format is not found
-                raise ValueError("No valid JSON found in response")
-        except (json.JSONDecodeError, ValueError):
-            # Fallback: parse manually or provide default analysis
-            logger.warning(f"Could not parse AI response as JSON: {ai_content}")
-            
-            # Try to extract percentages from text response
-            ai_percentage_match = re.search(r'AI.*?(\d+)%', ai_content, re.IGNORECASE)
-            fake_percentage_match = re.search(r'fake.*?(\d+)%', ai_content, re.IGNORECASE)
-            
-            ai_percentage = int(ai_percentage_match.group(1)) if ai_percentage_match else 50
-            fake_percentage = int(fake_percentage_match.group(1)) if fake_percentage_match else 30
-            
-            analysis_data = {
-                "ai_likelihood_percentage": ai_percentage,
-                "ai_reasoning": ai_content[:150] + "..." if len(ai_content) > 150 else ai_content,
-                "ai_confidence": "medium",
-                "fake_news_likelihood_percentage": fake_percentage,
-                "fake_news_reasoning": "Analysis based on content patterns and factual consistency",
-                "fake_news_confidence": "medium",
-                "credibility_score": 100 - fake_percentage
-            }
+        # Identical texts already being analysed share that call instead of starting another
+        (analysis_data, usage, model_used), coalesced = get_flight('text_ai_detection').do(
+            request_key('text', normalized, idem_key),
+            lambda: detect_text(text),
+            timeout=30 + llm.SYNC_GRACE_SECONDS,
+            remember=bool(idem_key),
+        )
         
         # Format the comprehensive response
         result = {
             'text': text,
-            # AI Detection Results
-            'ai_likelihood_percentage': analysis_data.get('ai_likelihood_percentage', 50),
-            'ai_reasoning': analysis_data.get('ai_reasoning', 'AI detection analysis completed'),
-            'ai_confidence': analysis_data.get('ai_confidence', 'medium'),
-            'is_ai_generated': analysis_data.get('ai_likelihood_percentage', 50) > 50,
-            # Fake News Detection Results
-            'fake_news_likelihood_percentage': analysis_data.get('fake_news_likelihood_percentage', 30),
-            'fake_news_reasoning': analysis_data.get('fake_news_reasoning', 'Fact-checking analysis completed'),
-            'fake_news_confidence': analysis_data.get('fake_news_confidence', 'medium'),
-            'is_fake_news': analysis_data.get('fake_news_likelihood_percentage', 30) > 50,
-            'credibility_score': analysis_data.get('credibility_score', 70),
+            **format_analysis(analysis_data),
             # Metadata
-            'model_used': 'Hack Club AI Service',
-            'timestamp': request.META.get('HTTP_DATE', '')
+            'model_used': model_used,
+            'timestamp': timestamp,
+            # Tokens spent on this analysis (by the request it was shared with, if coalesced)
+            'token_usage': {**usage, 'coalesced': coalesced}
         }
+        # Stored in the background; the id opens it again at /api/results/<result_id>/
+        result['result_id'] = results.save(TextAnalysis, key, result)
         
         return Response(result)
         
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error calling Hack Club AI API: {str(e)}")
+    except llm.LLMError as e:
+        logger.error(f"Text analysis LLM call failed: {str(e)}")
         return Response(
             {
                 'error': 'Failed to analyze text - API service unavailable',
                 'details': str(e)
             }, 
-            status=status.HTTP_503_SERVICE_UNAVAILABLE
+            status=e.status_code,
+            headers=llm.error_headers(e)
         )
     except Exception as e:
         logger.error(f"Unexpected error in text analysis: {str(e)}")
@@ -150,3 +169,101 @@ Text to analyze:
             }, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['POST'])
+@bulkhead('text_ai_batch')
+def analyze_text_batch(request):
+    """
+    Analyze many short texts (e.g. a comment thread) with several texts packed into each LLM call
+
+    Expected request body:
+    {
+        "texts": ["first comment", "second comment"]  // or [{"id": "c1", "text": "..."}, ...]
+    }
+    """
+    return analyze_text_batch_data(request.data, timestamp=request.META.get('HTTP_DATE', ''))
+
+
+def analyze_text_batch_data(data, timestamp='', deadline_seconds=None):
+    """
+    analyze_text_batch for a request body (also run by text_ai_detection_batch
+    jobs, with their longer deadline); returns the DRF Response
+    """
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not texts:
+        return Response({'error': 'A non-empty list of texts is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(texts) > settings.TEXT_BATCH_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.TEXT_BATCH_MAX_ITEMS} texts can be analyzed per batch'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    entries = []
+    for index, entry in enumerate(texts):
+        item_id, text = (entry.get('id'), entry.get('text')) if isinstance(entry, dict) else (index, entry)
+        if not isinstance(text, str) or not text.strip():
+            return Response(
+                {'error': f'Text {index} is empty; every item must be a non-empty string or {{"id", "text"}}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        entries.append((str(index if item_id is None else item_id), text))
+    if len({item_id for item_id, _ in entries}) < len(entries):
+        return Response({'error': 'Item ids must be unique'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Texts analysed recently come from the result store; repeats within the batch are analysed once
+    keys = [results.input_hash(' '.join(text.split())) for _, text in entries]
+    stored = results.lookup_many(TextAnalysis, keys)
+    pending = {}
+    for (_, text), key in zip(entries, keys):
+        if key not in stored:
+            pending.setdefault(key, text)
+    
+    deadline_seconds = deadline_seconds or settings.ANALYZE_DEADLINE_SECONDS
+    with llm.track_usage() as usage:
+        outcomes = run_sync(
+            analyze_texts_async(list(pending.values()), Deadline(deadline_seconds)),
+            timeout=deadline_seconds + llm.SYNC_GRACE_SECONDS
+        ) if pending else []
+    analysed = dict(zip(pending, outcomes))
+    
+    items, result_ids = [], {}
+    summary = {'total': len(entries), 'analyzed': 0, 'reused': 0, 'failed': 0}
+    for (item_id, text), key in zip(entries, keys):
+        if key in stored:
+            row = stored[key]
+            fields = {field: row.result[field] for field in ANALYSIS_FIELDS + ('model_used',) if field in row.result}
+            items.append({
+                'id': item_id, **fields, 'result_id': str(row.id), 'reused_result_from': row.created_at.isoformat()
+            })
+            summary['reused'] += 1
+            continue
+        outcome = analysed[key]
+        if isinstance(outcome, tuple):
+            error, http_status = outcome
+            items.append({'id': item_id, 'error': error, 'http_status': http_status})
+            summary['failed'] += 1
+            continue
+        fields = {**format_analysis(outcome), 'model_used': outcome['model_used']}
+        if key not in result_ids:
+            # Stored like a single analysis, so /analyze/ and later batches can reuse it
+            result_ids[key] = results.save(TextAnalysis, key, {'text': text, **fields, 'timestamp': timestamp})
+        items.append({'id': item_id, **fields, 'result_id': result_ids[key]})
+        summary['analyzed'] += 1
+    
+    analysed_count = sum(1 for outcome in analysed.values() if not isinstance(outcome, tuple))
+    spent = usage['prompt_tokens'] + usage['completion_tokens']
+    response_data = {
+        'results': items,
+        'summary': summary,
+        # Packs may have been answered by different providers of the route
+        'model_used': ', '.join(sorted({item['model_used'] for item in items if item.get('model_used')})),
+        'timestamp': timestamp,
+        # Tokens of the whole batch, and per distinct text analysed
+        'token_usage': {**usage, 'tokens_per_item': round(spent / analysed_count) if analysed_count else 0},
+        'status': 'success'
+    }
+    # Only a batch where nothing could be analysed is an error (retried when run as a job)
+    if summary['failed'] == summary['total']:
+        return Response(response_data, status=items[0]['http_status'])
+    return Response(response_data)